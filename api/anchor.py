@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+
+from web3 import Web3
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+import jobs
+from deploy_queue import RECEIPT_TIMEOUT, cancel_nonce
+from merkle import MerkleTree, verify_proof
+from pagination import iter_pages
+
+ANCHOR_INTERVAL_SECONDS = float(os.getenv('ANCHOR_INTERVAL_SECONDS', '3600'))
+ANCHOR_BATCH_LIMIT = int(os.getenv('ANCHOR_BATCH_LIMIT', '10000'))
+ANCHOR_GAS = 30000
+
+logger = logging.getLogger(__name__)
+
+
+def anchor_leaf(order_id: int, merkle_root: str) -> str:
+    return f'{order_id}:{merkle_root}'
+
+
+def sign_root(client, nonce: int, root: bytes):
+    # A zero-value self transaction carrying the 32-byte root as calldata is the
+    # cheapest durable on-chain commitment; no contract is needed to read it back.
+    account = client.account
+    return account.sign_transaction({
+        'from': account.address,
+        'to': account.address,
+        'value': 0,
+        'data': root,
+        'chainId': client.chain_id,
+        'nonce': nonce,
+        'gas': ANCHOR_GAS,
+        'maxFeePerGas': 35000000000,
+        'maxPriorityFeePerGas': 35000000000,
+    })
+
+
+async def unanchored_orders(supabase):
+    # Paged, because PostgREST's max-rows would cap one select below ANCHOR_BATCH_LIMIT
+    orders = []
+    pages = iter_pages(lambda: (
+        supabase.table('orders')
+        .select('id, merkle_root')
+        .is_('anchor_id', 'null')
+        .not_.is_('merkle_root', 'null')
+    ))
+    async for rows in pages:
+        orders.extend(rows)
+        if len(orders) >= ANCHOR_BATCH_LIMIT:
+            break
+    return orders[:ANCHOR_BATCH_LIMIT]
+
+
+async def finish_anchor(supabase, client, nonces, anchor: dict, nonce: int = None):
+    # Waits for the anchor transaction, then stores every order's proof. The
+    # anchor row was written before the broadcast, so a run that dies anywhere
+    # in here is resumed from it instead of publishing a second root.
+    try:
+        await client.w3.eth.wait_for_transaction_receipt(anchor['tx_hash'], timeout=RECEIPT_TIMEOUT)
+    except TimeExhausted:
+        if nonce is not None:
+            await cancel_nonce(client, nonces, nonce)
+        raise
+    tree = MerkleTree([anchor_leaf(order['id'], order['merkle_root']) for order in anchor['orders']])
+    proofs = [
+        {'id': order['id'], 'merkle_root': order['merkle_root'], 'proof': tree.proof(i)}
+        for i, order in enumerate(anchor['orders'])
+    ]
+    anchored = (await supabase.rpc('apply_anchor_proofs', {'p_anchor_id': anchor['id'], 'p_proofs': proofs}).execute()).data
+    logger.info('Anchored %s order roots in %s', anchored, anchor['tx_hash'])
+    return {**{key: anchor[key] for key in ('id', 'root', 'tx_hash', 'order_count')}, 'anchored': anchored}
+
+
+async def resume_anchor(supabase, client, nonces):
+    # Returns the result of an anchor left unfinished by an earlier run, or None
+    # when there is none or its transaction never made it on chain
+    rows = (await supabase.table('merkle_anchors').select('*').is_('applied_at', 'null').order('id').limit(1).execute()).data
+    if not rows:
+        return None
+    anchor = rows[0]
+    try:
+        receipt = await client.w3.eth.get_transaction_receipt(anchor['tx_hash'])
+        mined = receipt.status == 1
+        nonce = None
+    except TransactionNotFound:
+        try:
+            nonce = (await client.w3.eth.get_transaction(anchor['tx_hash']))['nonce']
+            mined = True
+        except TransactionNotFound:
+            mined = False
+    if not mined:
+        # Nothing was published; its orders are still unanchored and go into a new batch
+        await supabase.table('merkle_anchors').delete().eq('id', anchor['id']).execute()
+        return None
+    logger.info('Resuming anchor %s (%s)', anchor['id'], anchor['tx_hash'])
+    return await finish_anchor(supabase, client, nonces, anchor, nonce)
+
+
+async def anchor_pending_roots(supabase, client, nonces):
+    resumed = await resume_anchor(supabase, client, nonces)
+    if resumed is not None:
+        return resumed
+    orders = await unanchored_orders(supabase)
+    if not orders:
+        return None
+
+    tree = MerkleTree([anchor_leaf(order['id'], order['merkle_root']) for order in orders])
+    nonce = await nonces.allocate()
+    signed_txn = sign_root(client, nonce, tree.root)
+    try:
+        anchor = (
+            await supabase.table('merkle_anchors')
+            .insert({'root': tree.root_hex, 'tx_hash': Web3.to_hex(signed_txn.hash), 'order_count': len(orders), 'orders': orders})
+            .execute()
+        ).data[0]
+        # If this fails the row stays, and the next run finds out whether the
+        # transaction got out
+        await client.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    except Exception:
+        await nonces.resync()
+        raise
+    return await finish_anchor(supabase, client, nonces, anchor, nonce)
+
+
+async def verify_order_anchor(order: dict, current_root: str, client=None):
+    anchor = order.get('merkle_anchors')
+    result = {
+        'order_root_matches': current_root == order['merkle_root'],
+        'anchored': anchor is not None,
+        'proof_valid': False,
+        'on_chain': None,
+    }
+    if anchor is None:
+        return result
+    leaf = anchor_leaf(order['id'], order['merkle_root'])
+    result['proof_valid'] = verify_proof(leaf, order['anchor_proof'], anchor['root'])
+    result['anchor'] = anchor
+    if client is not None:
+        transaction = await client.w3.eth.get_transaction(anchor['tx_hash'])
+        result['on_chain'] = Web3.to_hex(transaction['input']) == '0x' + anchor['root']
+    return result
+
+
+async def run_anchoring(interval: float = ANCHOR_INTERVAL_SECONDS):
+    # Runs go through the "anchor" job rather than calling anchor_pending_roots
+    # here: its key keeps one run at a time across the API, every worker process
+    # and /anchor_roots, so the same orders are never published twice
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await jobs.enqueue('anchor', 'anchor', rerun=True)
+        except Exception:
+            logger.exception('Queueing anchoring run failed')
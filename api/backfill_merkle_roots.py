@@ -0,0 +1,41 @@
+import asyncio
+import db
+from merkle import ORDER_FIELDS, build_merkle_roots, legacy_build_merkle_tree, order_leaves
+from pagination import iter_pages
+
+# One-off migration for roots stored by the old hex-concatenating tree:
+# rewrites them with the binary construction that /merkle_proof and
+# /verify_order_anchor now rebuild, so those orders verify again. Only rows
+# whose stored root matches the legacy root of their current fields are
+# touched; any other mismatch is left for verification to report. The
+# orders trigger clears their anchor, so the next anchor run re-anchors them.
+
+
+async def backfill_merkle_roots(supabase) -> int:
+    columns = ','.join(ORDER_FIELDS + ['merkle_root'])
+    updated = 0
+    async for orders in iter_pages(lambda: supabase.table('orders').select(columns).not_.is_('merkle_root', 'null')):
+        roots = build_merkle_roots([order_leaves(order) for order in orders])
+        stale = [
+            {'id': order['id'], 'merkle_root': root}
+            for order, root in zip(orders, roots)
+            if order['merkle_root'] != root
+            and order['merkle_root'] == legacy_build_merkle_tree(order_leaves(order))
+        ]
+        if stale:
+            await supabase.rpc('set_merkle_roots', {'p_roots': stale}).execute()
+            updated += len(stale)
+    return updated
+
+
+async def _main():
+    await db.open_client()
+    try:
+        updated = await backfill_merkle_roots(db.supabase)
+        print(f'Rewrote {updated} legacy merkle roots')
+    finally:
+        await db.close_client()
+
+
+if __name__ == '__main__':
+    asyncio.run(_main())
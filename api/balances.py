@@ -0,0 +1,50 @@
+import asyncio
+import logging
+import os
+
+from contract_functions import get_sellers_total_balances
+from pagination import iter_pages
+
+# 0 disables the periodic job; /recompute_pseudo_balances runs it on demand
+BALANCE_RECOMPUTE_INTERVAL_SECONDS = float(os.getenv('BALANCE_RECOMPUTE_INTERVAL_SECONDS', '0'))
+
+logger = logging.getLogger(__name__)
+
+
+async def recompute_all_seller_balances(supabase, cache=None):
+    # Every seller's balance = sum of getPseudoBalance(seller) over their escrows,
+    # read with batched multicalls and written back with one RPC. All pages are
+    # read before anything is written: a partial list would overwrite balances
+    # with partial totals.
+    escrows = []
+    pages = iter_pages(lambda: (
+        supabase.table('orders')
+        .select('id, seller_id, contract_address, seller:users!orders_seller_id_fkey(wallet_address)')
+        .not_.is_('contract_address', 'null')
+    ))
+    async for orders in pages:
+        escrows.extend(
+            (order['seller_id'], order['seller']['wallet_address'], order['contract_address'])
+            for order in orders
+            if order['seller'] and order['seller']['wallet_address']
+        )
+    totals, failed = await get_sellers_total_balances(escrows)
+    if failed:
+        # Their stored balance is kept until every escrow of theirs reads back
+        logger.warning('Skipped %s sellers whose escrow balance calls failed: %s', len(failed), sorted(failed))
+    if not totals:
+        return 0
+    payload = [{'id': seller_id, 'balance': total} for seller_id, total in totals.items()]
+    updated = (await supabase.rpc('set_pseudo_balances', {'p_balances': payload}).execute()).data
+    if cache is not None:
+        await cache.invalidate(*(f'pseudo_balance:{seller_id}' for seller_id in totals))
+    return updated
+
+
+async def run_balance_recompute(supabase, cache=None, interval: float = BALANCE_RECOMPUTE_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await recompute_all_seller_balances(supabase, cache)
+        except Exception:
+            logger.exception('Seller balance recompute failed')
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from bench.stats import percentiles
+
+# Concurrent read load against a running API to compare event-loop throughput,
+# e.g. before/after the async Supabase client, with SUPABASE_URL pointing at a
+# local PostgREST stand-in:
+#   fastapi run main.py &
+#   python -m bench.db_load --concurrency 50 --requests 2000
+
+API_URL = os.getenv('BENCH_API_URL', 'http://127.0.0.1:8000')
+PATHS = ['/get_seller_score?seller_id=1', '/get_wating_orders?buyer_id=1', '/get_all_sellers_product']
+
+
+async def worker(http, jobs, latencies, errors):
+    while True:
+        try:
+            path = jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            response = await http.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except httpx.HTTPError:
+            errors.append(path)
+
+
+async def run(concurrency: int, requests: int):
+    jobs = asyncio.Queue()
+    for i in range(requests):
+        jobs.put_nowait(PATHS[i % len(PATHS)])
+    latencies, errors = [], []
+    async with httpx.AsyncClient(base_url=API_URL, limits=httpx.Limits(max_connections=concurrency)) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(http, jobs, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    p50, p95, p99 = percentiles(latencies, 50, 95, 99)
+    print(f'{len(latencies)} ok, {len(errors)} errors in {elapsed:.2f}s -> {len(latencies) / elapsed:.1f} req/s')
+    print(f'p50 {p50:.1f} ms   p95 {p95:.1f} ms   p99 {p99:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.requests))
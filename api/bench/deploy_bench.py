@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from eth_account import Account
+
+from bench.stats import percentiles
+from chain_client import ChainClient
+from contract_artifact import contract_factory
+from deploy_factory import deploy_factory
+
+# Compares full Escrow deploys with EIP-1167 clones on a local dev chain.
+#   anvil &
+#   python -m bench.deploy_bench --runs 20
+
+BENCH_RPC_URL = os.getenv('BENCH_RPC_URL', 'http://127.0.0.1:8545')
+# anvil / hardhat default account #0
+BENCH_PRIVATE_KEY = os.getenv('BENCH_PRIVATE_KEY', '0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80')
+
+
+async def timed_deploy(client, call, gas: int):
+    start = time.perf_counter()
+    transaction = await call.build_transaction({
+        'from': client.account.address,
+        'chainId': client.chain_id,
+        'nonce': await client.w3.eth.get_transaction_count(client.account.address, 'pending'),
+        'gas': gas,
+    })
+    signed_txn = client.account.sign_transaction(transaction)
+    tx_hash = await client.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    receipt = await client.w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=0.01)
+    assert receipt.status == 1
+    return receipt.gasUsed, (time.perf_counter() - start) * 1000
+
+
+def summary(mode: str, results):
+    gas = [g for g, _ in results]
+    latency = [ms for _, ms in results]
+    p50, = percentiles(latency, 50)
+    return f'{mode:<6} gas avg {statistics.mean(gas):>10.0f}   latency p50 {p50:8.1f} ms   max {max(latency):8.1f} ms'
+
+
+async def main(runs: int):
+    client = await ChainClient(rpc_url=BENCH_RPC_URL, private_key=BENCH_PRIVATE_KEY).start()
+    try:
+        _, factory_address = await deploy_factory(client)
+        factory = contract_factory(client.w3, 'EscrowFactory')(address=factory_address)
+        full, clone = [], []
+        for _ in range(runs):
+            buyer, seller, arbiter = (Account.create().address for _ in range(3))
+            full.append(await timed_deploy(client, client.escrow.constructor(buyer, seller, arbiter), 2000000))
+            clone.append(await timed_deploy(client, factory.functions.createEscrow(buyer, seller, arbiter), 300000))
+        print(summary('full', full))
+        print(summary('clone', clone))
+    finally:
+        await client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    asyncio.run(main(parser.parse_args().runs))
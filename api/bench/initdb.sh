@@ -0,0 +1,14 @@
+#!/bin/sh
+# Runs once when the bench Postgres volume is created: base schema, then every
+# migration in order, then grants for the PostgREST anon role.
+set -e
+psql -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" -d "$POSTGRES_DB" -f /bench/schema.sql
+for migration in /migrations/*.sql; do
+    psql -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" -d "$POSTGRES_DB" -f "$migration"
+done
+psql -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" -d "$POSTGRES_DB" <<'SQL'
+grant usage on schema public to anon;
+grant all on all tables in schema public to anon;
+grant all on all sequences in schema public to anon;
+grant execute on all functions in schema public to anon;
+SQL
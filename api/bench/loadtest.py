@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import timeit
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from bench.stats import latency_summary
+from merkle import build_merkle_tree, order_leaves
+
+# End-to-end load test of the order lifecycle against a running API wired to the
+# local stand-ins (see README "Benchmarks"):
+#   docker compose -f bench/docker-compose.yml up -d
+#   python -m bench.standins explorer --port 8090 & python -m bench.standins chat --port 8091 &
+#   set -a; . bench/bench.env; set +a; fastapi run main.py &
+#   python -m bench.loadtest --orders 200 --concurrency 20
+# Results are compared with bench/baseline.json; a p95 more than --tolerance
+# slower (or rps that much lower) than the baseline fails the run with exit 1.
+# Record a baseline on the reference machine with --update-baseline.
+
+API_URL = os.getenv('BENCH_API_URL', 'http://127.0.0.1:8000')
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# Anvil account #1 and #2 act as buyer and seller wallets
+BUYER_WALLET = '0x70997970C51812dc3A010C7d01b50e0d17dc79C8'
+SELLER_WALLET = '0x3C44CdDDB6a900fa2b585dd299e03d12FA4293BC'
+PASSWORD = 'bench-password'
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, http, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, path, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.errors[path] += 1
+            return None
+        self.latencies[path].append((time.perf_counter() - start) * 1000)
+        body = response.json()
+        if isinstance(body, dict) and body.get('status') == 'error':
+            self.errors[path] += 1
+        return body
+
+    def report(self, elapsed: float):
+        results = {}
+        for path in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies[path]
+            results[path] = {
+                'count': len(latencies), 'errors': self.errors[path], 'rps': round(len(latencies) / elapsed, 2),
+                **latency_summary(latencies),
+            }
+        return results
+
+
+def rows(body):
+    # Endpoints return either a bare row list or the serialised PostgREST response
+    if isinstance(body, dict):
+        return body.get('data') or []
+    return body or []
+
+
+async def create_party(recorder: Recorder, http, role: str, wallet: str):
+    email = f'{role}-{uuid.uuid4().hex[:12]}@bench.local'
+    await recorder.call(http, 'POST', '/create_user', params={
+        'name': f'bench {role}', 'password': PASSWORD, 'email': email, 'mobile_number': '0000000000',
+        'type': role, 'wallet_address': wallet, 'pancard_number': 'BENCH0000X',
+    })
+    login = await recorder.call(http, 'POST', '/login', params={'email': email, 'password': PASSWORD})
+    return login['id']
+
+
+async def setup(recorder: Recorder, http, sellers: int, buyers: int, products: int):
+    seller_ids = [await create_party(recorder, http, 'seller', SELLER_WALLET) for _ in range(sellers)]
+    buyer_ids = [await create_party(recorder, http, 'buyer', BUYER_WALLET) for _ in range(buyers)]
+    items = []
+    for seller_id in seller_ids:
+        for i in range(products):
+            body = await recorder.call(http, 'POST', '/create_seller_products', params={
+                'seller_id': seller_id, 'product_name': f'bench product {i}',
+                'price': round(random.uniform(1, 500), 2), 'quantity': 10 ** 6,
+            })
+            items += [(seller_id, row['id']) for row in rows(body)]
+    return seller_ids, buyer_ids, items
+
+
+async def order_lifecycle(recorder: Recorder, http, buyer_id: int, seller_id: int, item_id: int):
+    created = rows(await recorder.call(http, 'POST', '/create_order', params={
+        'buyer_id': buyer_id, 'seller_id': seller_id, 'item_id': item_id, 'quantity': 1,
+    }))
+    if not created:
+        return
+    order_id = created[0]['id']
+    await recorder.call(http, 'POST', '/accept_order', params={'order_id': order_id})
+    await recorder.call(http, 'POST', '/update_shipment_details', params={
+        'order_id': order_id, 'tracking_id': order_id, 'shipment_company_name': 'bench',
+        'shipment_company_contact': '0000000000', 'shipment_expected_date': '2100-01-01T00:00:00Z',
+    })
+    await recorder.call(http, 'POST', '/order_delivered', params={'order_id': order_id})
+    await recorder.call(http, 'POST', '/received_shipment', params={'order_id': order_id})
+    await recorder.call(http, 'POST', '/paid_order', params={'order_id': order_id})
+    await recorder.call(http, 'GET', '/deployment_status', params={'order_id': order_id})
+
+
+async def browse(recorder: Recorder, http, buyer_id: int, seller_id: int):
+    await recorder.call(http, 'GET', '/get_all_sellers_product')
+    await recorder.call(http, 'GET', '/get_seller_score', params={'seller_id': seller_id})
+    await recorder.call(http, 'GET', '/get_seller_products', params={'seller_id': seller_id})
+    await recorder.call(http, 'GET', '/get_wating_orders', params={'buyer_id': buyer_id})
+    await recorder.call(http, 'GET', '/get_past_orders', params={'buyer_id': buyer_id})
+    await recorder.call(http, 'GET', '/pseudo_balance_seller', params={'seller_id': seller_id})
+
+
+async def chat(recorder: Recorder, http):
+    await recorder.call(http, 'POST', '/chatbot', json={'message': random.choice([
+        'How does escrow protect the buyer?', 'When is the seller paid?', 'What happens if delivery is late?',
+    ])})
+
+
+async def run_load(args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=API_URL, timeout=120, limits=limits) as http:
+        seller_ids, buyer_ids, items = await setup(recorder, http, args.sellers, args.buyers, args.products)
+        # Setup calls are not part of the measured run
+        recorder = Recorder()
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def session(i: int):
+            async with semaphore:
+                buyer_id = buyer_ids[i % len(buyer_ids)]
+                seller_id, item_id = random.choice(items)
+                await order_lifecycle(recorder, http, buyer_id, seller_id, item_id)
+                for _ in range(args.reads):
+                    await browse(recorder, http, buyer_id, seller_id)
+                if random.random() < args.chat_ratio:
+                    await chat(recorder, http)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session(i) for i in range(args.orders)))
+        elapsed = time.perf_counter() - start
+    return recorder.report(elapsed), elapsed
+
+
+def merkle_micro():
+    order = {
+        'id': 1, 'buyer_id': 2, 'seller_id': 3, 'item_id': 4, 'quantity': 5, 'cost': 6.5,
+        'accepted': True, 'delivered': False, 'paid': False,
+    }
+    leaves = order_leaves(order)
+    seconds = min(timeit.repeat(lambda: build_merkle_tree(leaves), number=2000, repeat=5)) / 2000
+    return {'build_merkle_tree_us': round(seconds * 1e6, 2)}
+
+
+def regressions(results: dict, micro: dict, baseline: dict, tolerance: float):
+    found = []
+    for path, stats in results.items():
+        reference = baseline.get('endpoints', {}).get(path)
+        if not reference:
+            continue
+        if stats['p95_ms'] > reference['p95_ms'] * (1 + tolerance):
+            found.append(f"{path}: p95 {stats['p95_ms']} ms vs baseline {reference['p95_ms']} ms")
+        if stats['rps'] < reference['rps'] * (1 - tolerance):
+            found.append(f"{path}: {stats['rps']} req/s vs baseline {reference['rps']} req/s")
+    for name, value in micro.items():
+        reference = baseline.get('micro', {}).get(name)
+        if reference and value > reference * (1 + tolerance):
+            found.append(f'{name}: {value} vs baseline {reference}')
+    return found
+
+
+def print_report(results: dict, micro: dict, elapsed: float):
+    print(f"{'endpoint':<36} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for path, s in results.items():
+        print(f"{path:<36} {s['count']:>6} {s['errors']:>6} {s['rps']:>8} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}")
+    for name, value in micro.items():
+        print(f'{name:<36} {value}')
+    print(f'total {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--sellers', type=int, default=5)
+    parser.add_argument('--buyers', type=int, default=20)
+    parser.add_argument('--products', type=int, default=10)
+    parser.add_argument('--reads', type=int, default=2, help='browse passes per order')
+    parser.add_argument('--chat-ratio', type=float, default=0.1)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results, elapsed = asyncio.run(run_load(args))
+    micro = merkle_micro()
+    print_report(results, micro, elapsed)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'endpoints': results, 'micro': micro}, f, indent=2, sort_keys=True)
+        print(f'baseline written to {args.baseline}')
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print('no baseline to compare against; run with --update-baseline first')
+        sys.exit(0)
+    with open(args.baseline) as f:
+        found = regressions(results, micro, json.load(f), args.tolerance)
+    for line in found:
+        print(f'REGRESSION {line}')
+    sys.exit(1 if found else 0)
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from bench.stats import percentiles
+
+# p99 of an unrelated endpoint while a login storm runs, to show bcrypt no
+# longer stalls the event loop. Needs an existing user:
+#   fastapi run main.py &
+#   python -m bench.login_bench --email a@b.c --password secret --logins 500
+
+API_URL = os.getenv('BENCH_API_URL', 'http://127.0.0.1:8000')
+PROBE_PATH = '/cache_stats'
+
+
+async def probe(http, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await http.get(PROBE_PATH)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def login_storm(http, email: str, password: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def login():
+        async with semaphore:
+            r = await http.post('/login', params={'email': email, 'password': password})
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses
+
+
+async def run(email: str, password: str, logins: int, concurrency: int):
+    async with httpx.AsyncClient(base_url=API_URL, timeout=120) as http:
+        idle = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(http, stop, idle))
+        await asyncio.sleep(2)
+        stop.set()
+        await task
+
+        loaded = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(http, stop, loaded))
+        start = time.perf_counter()
+        statuses = await login_storm(http, email, password, logins, concurrency)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+
+    print(f'{logins} logins in {elapsed:.2f}s ({logins / elapsed:.1f}/s), statuses {statuses}')
+    for label, latencies in (('idle:       ', idle), ('under login:', loaded)):
+        p50, p99 = percentiles(latencies, 50, 99)
+        print(f'{PROBE_PATH} {label} p50 {p50:7.1f} ms  p99 {p99:7.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--logins', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.email, args.password, args.logins, args.concurrency))
@@ -0,0 +1,45 @@
+import argparse
+import random
+import timeit
+
+from merkle import MerkleTree, build_merkle_roots, build_merkle_tree, legacy_build_merkle_tree, order_leaves
+
+# Micro-benchmarks for merkle.py against the original hex implementation.
+#   python -m bench.merkle_bench --orders 5000
+
+
+def random_order(order_id: int):
+    return {
+        'id': order_id, 'buyer_id': random.randint(1, 500), 'seller_id': random.randint(1, 500),
+        'item_id': random.randint(1, 5000), 'quantity': random.randint(1, 50), 'cost': round(random.uniform(1, 5000), 2),
+        'accepted': random.random() < 0.5, 'delivered': random.random() < 0.5, 'paid': random.random() < 0.5,
+    }
+
+
+def bench(name: str, fn, number: int, per: int):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f'{name:<34} {seconds * 1e6 / per:9.2f} us/op')
+    return seconds
+
+
+def run(orders: int):
+    rows = [order_leaves(random_order(i)) for i in range(orders)]
+    wide = [str(i) for i in range(1024)]
+
+    legacy = bench('legacy, one order', lambda: legacy_build_merkle_tree(rows[0]), 2000, 1)
+    binary = bench('binary, one order', lambda: build_merkle_tree(rows[0]), 2000, 1)
+    bench('legacy, per-order loop', lambda: [legacy_build_merkle_tree(r) for r in rows], 3, orders)
+    bulk = bench('bulk build_merkle_roots', lambda: build_merkle_roots(rows), 3, orders)
+    bench('legacy, 1024 leaves', lambda: legacy_build_merkle_tree(wide), 20, 1)
+    bench('binary, 1024 leaves', lambda: build_merkle_tree(wide), 20, 1)
+
+    tree = MerkleTree(wide)
+    bench('update one leaf of 1024', lambda: tree.update(17, 'x'), 5000, 1)
+    bench('proof for one leaf of 1024', lambda: tree.proof(17), 5000, 1)
+    print(f'single-order speedup x{legacy / binary:.2f}, bulk {bulk * 1e6 / orders:.2f} us/order')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=2000)
+    run(parser.parse_args().orders)
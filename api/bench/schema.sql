@@ -0,0 +1,53 @@
+-- Base tables the API expects, for the local Postgres stand-in only. The
+-- production schema lives in Supabase; migrations/ are applied on top.
+
+create role anon nologin;
+create role authenticator noinherit login password 'postgres';
+grant anon to authenticator;
+
+create table users (
+    id bigint generated by default as identity primary key,
+    name text not null,
+    password text not null,
+    type text not null,
+    email_id text not null unique,
+    mobile_number text,
+    wallet_address text,
+    pancard_number text,
+    score integer not null default 100,
+    pseudo_balance numeric not null default 0,
+    created_at timestamptz not null default now()
+);
+
+create table seller_items (
+    id bigint generated by default as identity primary key,
+    seller_id bigint not null references users (id),
+    product_name text not null,
+    price numeric not null,
+    quantity integer not null,
+    created_at timestamptz not null default now()
+);
+
+create table orders (
+    id bigint generated by default as identity primary key,
+    buyer_id bigint not null references users (id),
+    seller_id bigint not null references users (id),
+    item_id bigint not null references seller_items (id) on delete cascade,
+    quantity integer not null,
+    cost numeric not null,
+    accepted boolean not null default false,
+    shipped boolean not null default false,
+    delivered boolean not null default false,
+    received boolean not null default false,
+    paid boolean not null default false,
+    contract_address text,
+    merkle_root text,
+    tracking_id bigint,
+    shipment_company_name text,
+    shipment_company_contact text,
+    shipment_expected_date timestamptz,
+    accepted_at timestamptz,
+    paid_at timestamptz,
+    delivered_at timestamptz,
+    created_at timestamptz not null default now()
+);
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Fake third-party APIs for load tests, so a run measures our code rather than
+# PolygonScan rate limits or model latency:
+#   python -m bench.standins explorer --port 8090
+#   python -m bench.standins chat --port 8091
+# Latency is simulated with STANDIN_LATENCY_MS (default 50) plus up to 20% jitter.
+
+LATENCY_MS = float(os.getenv('STANDIN_LATENCY_MS', '50'))
+TXLIST_SIZE = int(os.getenv('STANDIN_TXLIST_SIZE', '20'))
+CHAT_TOKENS = int(os.getenv('STANDIN_CHAT_TOKENS', '40'))
+
+
+async def simulated_latency(scale: float = 1.0):
+    await asyncio.sleep(LATENCY_MS * scale * (1 + random.random() / 5) / 1000)
+
+
+def fake_transaction(address: str, block: int):
+    return {
+        'hash': '0x' + uuid.uuid4().hex * 2,
+        'blockNumber': str(block),
+        'timeStamp': str(int(time.time())),
+        'from': '0x' + uuid.uuid4().hex[:40].ljust(40, '0'),
+        'to': address,
+        'value': str(random.randint(0, 10 ** 18)),
+    }
+
+
+def explorer_app():
+    app = FastAPI()
+
+    @app.get('/api')
+    async def api(action: str, address: str, startblock: int = 0, page: int = 1):
+        await simulated_latency()
+        if action != 'txlist' or page > 1:
+            return {'status': '0', 'message': 'No transactions found', 'result': []}
+        result = [fake_transaction(address, startblock + i) for i in range(TXLIST_SIZE)]
+        return {'status': '1', 'message': 'OK', 'result': result}
+
+    return app
+
+
+def completion_chunk(model: str, content: str = None, finish_reason: str = None):
+    delta = {'content': content} if content is not None else {}
+    return {
+        'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+
+
+def chat_app():
+    app = FastAPI()
+
+    @app.post('/v1/chat/completions')
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get('model', 'bench')
+        words = [f'word{i}' for i in range(CHAT_TOKENS)]
+        if body.get('stream'):
+            async def chunks():
+                await simulated_latency()
+                for word in words:
+                    yield f'data: {json.dumps(completion_chunk(model, word + " "))}\n\n'
+                    await simulated_latency(0.05)
+                yield f'data: {json.dumps(completion_chunk(model, finish_reason="stop"))}\n\n'
+                yield 'data: [DONE]\n\n'
+            return StreamingResponse(chunks(), media_type='text/event-stream')
+        await simulated_latency(1 + CHAT_TOKENS * 0.05)
+        return {
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ' '.join(words)}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': CHAT_TOKENS, 'total_tokens': 10 + CHAT_TOKENS},
+        }
+
+    return app
+
+
+APPS = {'explorer': explorer_app, 'chat': chat_app}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('service', choices=sorted(APPS))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    args = parser.parse_args()
+    uvicorn.run(APPS[args.service](), host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,172 @@
+import argparse
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# Cold-start time and per-process memory of the API, optionally compared with
+# an older commit checked out into a temporary worktree. Uses the same
+# environment as the API (e.g. bench/bench.env with the stand-ins running):
+#   python -m bench.startup_bench --mode import
+#   python -m bench.startup_bench --mode gunicorn --workers 4 --ref HEAD~6
+# import:   time and RSS of `import main` in a fresh interpreter
+# uvicorn:  one uvicorn process, time until the first request succeeds
+# gunicorn: gunicorn.conf.py profile (preload), RSS and PSS per process
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE_PATH = '/cache_stats'
+IMPORT_PROBE = (
+    'import resource, time; start = time.perf_counter(); import main; '
+    'print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid: int):
+    # Linux only. PSS splits pages shared after fork between the processes
+    # using them, so summing it over workers gives real memory use.
+    rss = pss = None
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def children(pid: int):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the command name may contain spaces, so split after its closing paren
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return sorted(found)
+
+
+def measure_import(cwd: str, runs: int):
+    seconds, rss = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=cwd, capture_output=True, text=True, check=True).stdout
+        elapsed, maxrss = output.split()[-2:]
+        seconds.append(float(elapsed))
+        rss.append(int(maxrss))
+    return {'import_s': statistics.median(seconds), 'import_max_rss_mb': statistics.median(rss) / 1024}
+
+
+def wait_ready(port: int, process, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}{PROBE_PATH}', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f'server not ready after {timeout}s')
+
+
+def measure_server(cwd: str, mode: str, workers: int, timeout: float):
+    port = free_port()
+    if mode == 'uvicorn':
+        command = [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port)]
+    else:
+        # Explicit flags so a ref without gunicorn.conf.py runs the same profile
+        command = [
+            sys.executable, '-m', 'gunicorn', 'main:app', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--worker-class', 'uvicorn.workers.UvicornWorker', '--preload',
+        ]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, process, timeout)
+        ready = time.perf_counter() - start
+        if mode == 'gunicorn':
+            # The probe reached one worker; give the rest time to finish their lifespan
+            time.sleep(2)
+        pids = [process.pid] + children(process.pid)
+        memory = [memory_kb(pid) for pid in pids]
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(30)
+    result = {'ready_s': ready, 'processes': len(pids)}
+    for label, (rss, pss) in zip(['master'] + [f'worker{i}' for i in range(1, len(pids))], memory):
+        result[f'{label}_rss_mb'] = rss / 1024
+        if pss is not None:
+            result[f'{label}_pss_mb'] = pss / 1024
+    pss_values = [pss for _, pss in memory if pss is not None]
+    if pss_values:
+        result['total_pss_mb'] = sum(pss_values) / 1024
+    return result
+
+
+def measure(cwd: str, args):
+    if args.mode == 'import':
+        return measure_import(cwd, args.runs)
+    runs = [measure_server(cwd, args.mode, args.workers, args.timeout) for _ in range(args.runs)]
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0] if all(key in run for run in runs)}
+
+
+def checkout(ref: str):
+    # Detached worktree of ref, with a copy of the artifact cache so neither side compiles
+    root = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=API_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    path = tempfile.mkdtemp(prefix='startup-bench-')
+    subprocess.run(['git', 'worktree', 'add', '--detach', path, ref], cwd=root, capture_output=True, check=True)
+    artifacts = os.path.join(API_DIR, '.artifacts')
+    if os.path.isdir(artifacts):
+        shutil.copytree(artifacts, os.path.join(path, 'api', '.artifacts'), dirs_exist_ok=True)
+    return root, path
+
+
+def report(results: dict):
+    names = list(results)
+    keys = list(dict.fromkeys(key for result in results.values() for key in result))
+    print(f"{'':<20}" + ''.join(f'{name:>16}' for name in names))
+    for key in keys:
+        print(f'{key:<20}' + ''.join(
+            f'{results[name][key]:>16.3f}' if key in results[name] else f"{'-':>16}" for name in names
+        ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['import', 'uvicorn', 'gunicorn'], default='import')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--ref', help='git ref to compare against, e.g. HEAD~1')
+    args = parser.parse_args()
+
+    results = {}
+    if args.ref:
+        root, path = checkout(args.ref)
+        try:
+            results[args.ref] = measure(os.path.join(path, 'api'), args)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', path], cwd=root, capture_output=True)
+    results['working tree'] = measure(API_DIR, args)
+    report(results)
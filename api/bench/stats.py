@@ -0,0 +1,19 @@
+import statistics
+
+# Latency percentiles shared by the bench scripts, all in milliseconds
+
+
+def percentiles(latencies, *qs):
+    # One value per requested percentile (1-99). A single sample stands for
+    # every percentile and no samples read as 0.0, so reports and the
+    # loadtest baseline always get numbers.
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+        return [cuts[q - 1] for q in qs]
+    return [latencies[0] if latencies else 0.0 for _ in qs]
+
+
+def latency_summary(latencies):
+    # The p50/p95/p99 columns of a loadtest report and bench/baseline.json
+    p50, p95, p99 = percentiles(latencies, 50, 95, 99)
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
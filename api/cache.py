@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '60'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+
+class MemoryBackend:
+    # Per-process; invalidation only reaches the current worker
+
+    def __init__(self):
+        self._entries = {}
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RedisBackend:
+    # Shared by every worker; takes any redis.asyncio-compatible client
+    # (e.g. fakeredis.aioredis.FakeRedis in tests)
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, key: str):
+        value = await self.client.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value, ttl: float):
+        await self.client.set(key, json.dumps(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+
+class Cache:
+    def __init__(self, backend=None, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        # namespace (key prefix before ':') -> hits/misses/invalidations
+        self.stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'invalidations': 0})
+        self._loading = {}
+
+    async def get_or_load(self, key: str, loader, ttl: float = None):
+        stats = self.stats[key.split(':')[0]]
+        value = await self.backend.get(key)
+        if value is not None:
+            stats['hits'] += 1
+            return value
+        stats['misses'] += 1
+        # Concurrent misses on one key share a single load
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl or self.ttl))
+            self._loading[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader, ttl: float):
+        try:
+            value = await loader()
+            await self.backend.set(key, value, ttl)
+            return value
+        finally:
+            self._loading.pop(key, None)
+
+    async def invalidate(self, *keys: str):
+        for key in keys:
+            self.stats[key.split(':')[0]]['invalidations'] += 1
+        await self.backend.delete(*keys)
+
+    def snapshot(self):
+        result = {}
+        for namespace, stats in sorted(self.stats.items()):
+            lookups = stats['hits'] + stats['misses']
+            result[namespace] = {**stats, 'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else 0.0}
+        return result
+
+
+def etag_for(value) -> str:
+    body = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+
+
+def create_cache():
+    if CACHE_REDIS_URL:
+        import redis.asyncio as redis
+        return Cache(RedisBackend(redis.from_url(CACHE_REDIS_URL)))
+    return Cache()
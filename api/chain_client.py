@@ -0,0 +1,138 @@
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from dotenv import load_dotenv
+from eth_account import Account
+from web3 import AsyncWeb3
+from web3.middleware import ExtraDataToPOAMiddleware, Web3Middleware
+from web3.providers import AsyncHTTPProvider
+
+from contract_artifact import contract_factory
+import tracing
+
+load_dotenv()
+
+AMOY_RPC_URL = os.getenv('AMOY_RPC_URL', 'https://rpc-amoy.polygon.technology')
+AMOY_CHAIN_ID = '0x13882'
+AMOY_CONTRACT_URL = 'https://amoy.polygonscan.com/'
+AMOY_NAME = 'Amoy'
+AMOY_SYMBOL = 'POL'
+AMOY_CHAIN_NAME = 'Polygon Amoy'
+METAMASK_WALLET_PRIVATE_KEY = os.getenv('METAMASK_WALLET_PRIVATE_KEY')
+RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', '20'))
+RPC_TIMEOUT = float(os.getenv('RPC_TIMEOUT', '30'))
+
+# Set per request by main.py so RPC latency can be attributed to an endpoint
+current_endpoint: ContextVar[str] = ContextVar('current_endpoint', default='-')
+
+# (endpoint, rpc method) -> counters
+rpc_stats = defaultdict(lambda: {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+
+
+def record_rpc(method: str, elapsed: float, error: bool = False):
+    stats = rpc_stats[(current_endpoint.get(), method)]
+    elapsed_ms = elapsed * 1000
+    stats['count'] += 1
+    stats['errors'] += int(error)
+    stats['total_ms'] += elapsed_ms
+    stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    tracing.record_span('rpc', method, elapsed, error)
+
+
+def rpc_stats_snapshot():
+    return [
+        {
+            'endpoint': endpoint,
+            'method': method,
+            'count': stats['count'],
+            'errors': stats['errors'],
+            'avg_ms': round(stats['total_ms'] / stats['count'], 3) if stats['count'] else 0.0,
+            'max_ms': round(stats['max_ms'], 3),
+        }
+        for (endpoint, method), stats in sorted(rpc_stats.items())
+    ]
+
+
+class RPCTimingMiddleware(Web3Middleware):
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            start = time.perf_counter()
+            error = True
+            try:
+                response = make_request(method, params)
+                error = 'error' in response
+                return response
+            finally:
+                record_rpc(method, time.perf_counter() - start, error)
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            start = time.perf_counter()
+            error = True
+            try:
+                response = await make_request(method, params)
+                error = 'error' in response
+                return response
+            finally:
+                record_rpc(method, time.perf_counter() - start, error)
+        return middleware
+
+
+class ChainClient:
+    # One AsyncWeb3 over a keep-alive connection pool, plus the arbiter
+    # account and escrow contract factory, shared by every request.
+
+    def __init__(self, rpc_url: str = AMOY_RPC_URL, private_key: str = METAMASK_WALLET_PRIVATE_KEY, pool_size: int = RPC_POOL_SIZE):
+        self.rpc_url = rpc_url
+        self.pool_size = pool_size
+        self.account = Account.from_key(private_key) if private_key else None
+        self.w3 = None
+        self.escrow = None
+        self.chain_id = None
+        self._session = None
+
+    async def start(self):
+        self._session = ClientSession(
+            connector=TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            timeout=ClientTimeout(total=RPC_TIMEOUT),
+        )
+        provider = AsyncHTTPProvider(self.rpc_url)
+        await provider.cache_async_session(self._session)
+        self.w3 = AsyncWeb3(provider)
+        self.w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+        self.w3.middleware_onion.add(RPCTimingMiddleware, name='rpc_timing')
+        self.escrow = contract_factory(self.w3)
+        self.chain_id = await self.w3.eth.chain_id
+        return self
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+_client = None
+
+
+async def open_client(**kwargs):
+    global _client
+    if _client is None:
+        _client = await ChainClient(**kwargs).start()
+    return _client
+
+
+def get_client():
+    if _client is None:
+        raise RuntimeError('Chain client is not started, call open_client() first')
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -1,39 +1,147 @@
 from dotenv import load_dotenv
-import requests
+import asyncio
 import os
+import re
+import time
+import uuid
+from collections import OrderedDict
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from pydantic import SecretStr
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, MessagesState, StateGraph
+import tracing
 
 load_dotenv()
 
 API_TOKEN = os.getenv("OPENAI_API_KEY")
-MODEL = "gpt-4o"
-headers = {"Authorization": f"Bearer {API_TOKEN}"}
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+MODEL = os.getenv("CHAT_MODEL", "gpt-4o-2024-08-06")
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "512"))
+# History is dropped for threads beyond the most recent CHAT_MAX_THREADS or idle
+# for CHAT_THREAD_TTL_SECONDS; clients that send no thread_id start one per call
+CHAT_MAX_THREADS = int(os.getenv("CHAT_MAX_THREADS", "1000"))
+CHAT_THREAD_TTL_SECONDS = float(os.getenv("CHAT_THREAD_TTL_SECONDS", "3600"))
+SYSTEM_PROMPT = "You are a disaster information and help chatbot now and will respond like one."
 
-workflow = StateGraph(state_schema=MessagesState)
+_client = None
+
+
+def get_client():
+    # One client (and HTTP pool) for the whole app
+    global _client
+    if _client is None:
+        _client = ChatOpenAI(api_key=SecretStr(str(API_TOKEN)), base_url=OPENAI_BASE_URL, model=MODEL, streaming=True)
+    return _client
+
+
+class AnswerCache:
+    # LRU of first-turn answers; later turns depend on history so are never cached
+
+    def __init__(self, max_size: int = CHAT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._answers = OrderedDict()
+
+    @staticmethod
+    def key(question: str):
+        return re.sub(r"\s+", " ", question.strip().lower().rstrip("?!. "))
+
+    def get(self, question: str):
+        key = self.key(question)
+        answer = self._answers.get(key)
+        if answer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._answers.move_to_end(key)
+        return answer
+
+    def put(self, question: str, answer: str):
+        self._answers[self.key(question)] = answer
+        self._answers.move_to_end(self.key(question))
+        if len(self._answers) > self.max_size:
+            self._answers.popitem(last=False)
+
+
+class ThreadLRU:
+    # Last use of each thread; evicted threads have their checkpoints deleted so
+    # MemorySaver stays bounded
+
+    def __init__(self, saver, max_threads: int = CHAT_MAX_THREADS, ttl: float = CHAT_THREAD_TTL_SECONDS):
+        self.saver = saver
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._last_used = OrderedDict()
+
+    def touch(self, thread_id: str):
+        now = time.monotonic()
+        self._last_used[thread_id] = now
+        self._last_used.move_to_end(thread_id)
+        while self._last_used:
+            oldest, used = next(iter(self._last_used.items()))
+            if len(self._last_used) <= self.max_threads and now - used <= self.ttl:
+                break
+            del self._last_used[oldest]
+            self.saver.delete_thread(oldest)
 
-def chatbot_test(arr):
-    MODEL = 'gpt-4o-2024-08-06' 
-    history_context = ''.join(arr[:-1])
-    current_context = arr[-1]
-    messages = [
-    HumanMessage(content=f'You are a disaster information and help chatbot now and will respond like one. This is the chat history of the user with the chatbot: {history_context}. The question that the user asked is: {current_context}')
-]
-    client = ChatOpenAI(api_key=SecretStr(str(API_TOKEN)), base_url='https://api.openai.com/v1' ,model=MODEL)
-    llm_response = client.invoke(messages)
-    return llm_response.content
+    def __len__(self):
+        return len(self._last_used)
 
+
+async def call_model(state: MessagesState):
+    with tracing.span("llm", MODEL):
+        response = await get_client().ainvoke([SystemMessage(content=SYSTEM_PROMPT)] + state["messages"])
+    return {"messages": [response]}
+
+
+workflow = StateGraph(state_schema=MessagesState)
 workflow.add_edge(START, "model")
-workflow.add_node("model", chatbot_test)
+workflow.add_node("model", call_model)
 
-# Add memory
+# Conversation history lives server side, keyed by thread id
 memory = MemorySaver()
 app = workflow.compile(checkpointer=memory)
+answers = AnswerCache()
+threads = ThreadLRU(memory)
+
+
+def new_thread_id():
+    return uuid.uuid4().hex
+
+
+async def stream_reply(message: str, thread_id: str):
+    # Yields the answer token by token as the model produces it
+    config = {"configurable": {"thread_id": thread_id}}
+    threads.touch(thread_id)
+    first_turn = not (await app.aget_state(config)).values.get("messages")
+    if first_turn:
+        cached = answers.get(message)
+        if cached is not None:
+            await app.aupdate_state(config, {"messages": [HumanMessage(content=message), AIMessage(content=cached)]}, as_node="model")
+            yield cached
+            return
+
+    parts = []
+    async for chunk, metadata in app.astream({"messages": [HumanMessage(content=message)]}, config, stream_mode="messages"):
+        if chunk.content and metadata.get("langgraph_node") == "model":
+            parts.append(chunk.content)
+            yield chunk.content
+    if first_turn:
+        answers.put(message, "".join(parts))
+
+
+async def reply(message: str, thread_id: str):
+    return "".join([token async for token in stream_reply(message, thread_id)])
+
+
+async def _main():
+    thread_id = new_thread_id()
+    for question in ["what are stocks in finance", "ok so in which stock should i apply for", "tell some famous stocks of india"]:
+        async for token in stream_reply(question, thread_id):
+            print(token, end="", flush=True)
+        print()
 
 if __name__ == '__main__':
-    input_conversations = ["what are stocks in finance", "ok so in which stock should i apply for" , "tell some famous stocks of india"]
-    print(chatbot_test(input_conversations))
-    # print(fetch_financial_tips())
+    asyncio.run(_main())
@@ -1,16 +1,9 @@
-from solcx import compile_standard, install_solc
+from contract_artifact import CONTRACT_SOURCE, SOLC_VERSION, artifact_path, load_contracts
 
-install_solc('0.8.26')
+# Offline build step: compiles escrowContract.sol once and fills the artifact
+# cache so the API never spawns solc while serving requests.
+#   python compile_contract.py
 
-with open('escrowContract.sol', 'r') as file:
-    contract_file = file.read()
-
-compiled_sol = compile_standard(
-    {
-        "language": "Solidity",
-        "sources": {"escrowContract.sol": {"content": contract_file}},
-    },
-    solc_version='0.8.26'
-)
-
-abi =  compiled_sol['contracts']['escrowContract.sol']['Escrow']['abi']
\ No newline at end of file
+if __name__ == '__main__':
+    contracts = load_contracts(CONTRACT_SOURCE, SOLC_VERSION)
+    print(f'{", ".join(contracts)} -> {artifact_path(CONTRACT_SOURCE, SOLC_VERSION)}')
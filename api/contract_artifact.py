@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+SOLC_VERSION = os.getenv('SOLC_VERSION', '0.8.26')
+CONTRACT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'escrowContract.sol')
+ARTIFACT_DIR = os.getenv('CONTRACT_ARTIFACT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.artifacts'))
+CONTRACT_NAME = 'Escrow'
+
+# (source sha256, solc version) -> {contract name: {'abi': ..., 'bin': ...}}
+_artifacts = {}
+_sources = {}
+_factories = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _read_source(source_path: str):
+    # Only re-hash the source when it changes on disk
+    mtime = os.stat(source_path).st_mtime_ns
+    cached = _sources.get(source_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    with open(source_path, 'rb') as file:
+        source = file.read()
+    source_hash = hashlib.sha256(source).hexdigest()
+    _sources[source_path] = (mtime, source.decode('utf-8'), source_hash)
+    return source.decode('utf-8'), source_hash
+
+
+def _artifact_file(source_hash: str, solc_version: str):
+    return os.path.join(ARTIFACT_DIR, f'{source_hash}-{solc_version}.json')
+
+
+def artifact_path(source_path: str = CONTRACT_SOURCE, solc_version: str = SOLC_VERSION):
+    _, source_hash = _read_source(source_path)
+    return _artifact_file(source_hash, solc_version)
+
+
+def _compile(source: str, solc_version: str):
+    # solcx is only needed when the artifact cache is cold
+    from solcx import compile_source, get_installed_solc_versions, install_solc
+
+    if solc_version not in {str(v) for v in get_installed_solc_versions()}:
+        install_solc(solc_version)
+    compiled_sol = compile_source(source, output_values=['abi', 'bin'], solc_version=solc_version)
+    # compile_source keys contracts as '<stdin>:Name'
+    return {
+        key.split(':')[-1]: {'abi': value['abi'], 'bin': value['bin']}
+        for key, value in compiled_sol.items()
+    }
+
+
+def _write_artifact(path: str, contracts: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(contracts, file)
+    os.replace(tmp_path, path)
+
+
+def load_contracts(source_path: str = CONTRACT_SOURCE, solc_version: str = SOLC_VERSION, compile_missing: bool = True):
+    source, source_hash = _read_source(source_path)
+    key = (source_hash, solc_version)
+    contracts = _artifacts.get(key)
+    if contracts is not None:
+        return contracts
+
+    with _lock:
+        contracts = _artifacts.get(key)
+        if contracts is not None:
+            return contracts
+        path = _artifact_file(source_hash, solc_version)
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                contracts = json.load(file)
+        elif compile_missing:
+            contracts = _compile(source, solc_version)
+            _write_artifact(path, contracts)
+        else:
+            raise FileNotFoundError(f'No compiled artifact for {source_path} at {path}, run compile_contract.py')
+        _artifacts[key] = contracts
+    return contracts
+
+
+def load_artifact(contract_name: str = CONTRACT_NAME, source_path: str = CONTRACT_SOURCE):
+    return load_contracts(source_path)[contract_name]
+
+
+def contract_factory(w3, contract_name: str = CONTRACT_NAME):
+    # Contract classes are bound to a Web3 instance, so keep one per provider
+    factories = _factories.setdefault(w3, {})
+    factory = factories.get(contract_name)
+    if factory is None:
+        artifact = load_artifact(contract_name)
+        factory = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bin'])
+        factories[contract_name] = factory
+    return factory
@@ -1,32 +1,98 @@
+import asyncio
 import os
-from dotenv import load_dotenv
+from collections import defaultdict
 from web3 import Web3
-from solcx import compile_source
-
-load_dotenv()
-
-AMOY_RPC_URL = 'https://rpc-amoy.polygon.technology'
-AMOY_CHAIN_ID = '0x13882'
-AMOY_CONTRACT_URL = 'https://amoy.polygonscan.com/'
-AMOY_NAME = 'Amoy'
-AMOY_SYMBOL = 'POL'
-AMOY_CHAIN_NAME = 'Polygon Amoy'
-ARBITAR_ADRESS=os.getenv('ARBITAR_ADRESS')
-METAMASK_WALLET_PRIVATE_KEY=os.getenv('METAMASK_WALLET_PRIVATE_KEY')
-
-
-def get_pseudo_balance(contract_address: str, user_address: str):
-    with open('escrowContract.sol', 'r') as file:
-        contract_file = file.read()
-    compiled_sol = compile_source(contract_file,output_values=['abi','bin'])
-    _, contract_interface = compiled_sol.popitem()
-    abi = contract_interface['abi']
-    w3 = Web3(Web3.HTTPProvider(AMOY_RPC_URL))
-    contract = w3.eth.contract(address=contract_address, abi=abi)
-    balance = contract.functions.getPseudoBalance(user_address).call()
+from chain_client import get_client, open_client, close_client
+
+# Multicall3 is deployed at the same address on Amoy and most EVM chains
+MULTICALL3_ADDRESS = os.getenv('MULTICALL3_ADDRESS', '0xcA11bde05977b3631167028862bE2a173976CA11')
+MULTICALL_BATCH = int(os.getenv('MULTICALL_BATCH', '200'))
+MULTICALL3_ABI = [{
+    "inputs": [{"components": [
+        {"internalType": "address", "name": "target", "type": "address"},
+        {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+        {"internalType": "bytes", "name": "callData", "type": "bytes"},
+    ], "internalType": "struct Multicall3.Call3[]", "name": "calls", "type": "tuple[]"}],
+    "name": "aggregate3",
+    "outputs": [{"components": [
+        {"internalType": "bool", "name": "success", "type": "bool"},
+        {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+    ], "internalType": "struct Multicall3.Result[]", "name": "returnData", "type": "tuple[]"}],
+    "stateMutability": "payable",
+    "type": "function",
+}]
+
+
+async def get_pseudo_balance(contract_address: str, user_address: str):
+    contract = get_client().escrow(address=Web3.to_checksum_address(contract_address))
+    balance = await contract.functions.getPseudoBalance(Web3.to_checksum_address(user_address)).call()
     return balance
 
 
+async def multicall(calls):
+    # calls: [(target, calldata)] -> [return data or None], one eth_call per batch
+    client = get_client()
+    aggregator = client.w3.eth.contract(address=Web3.to_checksum_address(MULTICALL3_ADDRESS), abi=MULTICALL3_ABI)
+    batches = [calls[i:i + MULTICALL_BATCH] for i in range(0, len(calls), MULTICALL_BATCH)]
+    results = await asyncio.gather(*(
+        aggregator.functions.aggregate3([(Web3.to_checksum_address(target), True, data) for target, data in batch]).call()
+        for batch in batches
+    ))
+    return [data if success else None for batch in results for success, data in batch]
+
+
+def balance_calldata(user_address: str):
+    return get_client().escrow.encode_abi('getPseudoBalance', args=[Web3.to_checksum_address(user_address)])
+
+
+def decode_uint(data):
+    # A failed call (None) stays None: reading it as 0 would understate balances
+    return None if data is None else int.from_bytes(data[:32], 'big')
+
+
+async def get_pseudo_balances(contract_addresses, user_address: str):
+    # One balance per contract, None where the call failed
+    calldata = balance_calldata(user_address)
+    results = await multicall([(address, calldata) for address in contract_addresses])
+    return [decode_uint(data) for data in results]
+
+
+async def get_total_pseudo_balance(contract_addresses, user_address: str):
+    balances = await get_pseudo_balances(contract_addresses, user_address)
+    failed = [address for address, balance in zip(contract_addresses, balances) if balance is None]
+    if failed:
+        raise RuntimeError(f'getPseudoBalance failed for {", ".join(failed)}')
+    return sum(balances)
+
+
+async def get_sellers_total_balances(escrows):
+    # escrows: [(seller_id, seller_wallet, contract_address)] -> ({seller_id: total}, {failed seller_id}).
+    # A seller with any failed call gets no total, so callers never write a
+    # partial sum over their balance.
+    calldata = {}
+    calls = []
+    for _, wallet, contract_address in escrows:
+        if wallet not in calldata:
+            calldata[wallet] = balance_calldata(wallet)
+        calls.append((contract_address, calldata[wallet]))
+    totals = defaultdict(int)
+    failed = set()
+    for (seller_id, _, _), data in zip(escrows, await multicall(calls)):
+        balance = decode_uint(data)
+        if balance is None:
+            failed.add(seller_id)
+        else:
+            totals[seller_id] += balance
+    return {seller_id: total for seller_id, total in totals.items() if seller_id not in failed}, failed
+
+
+async def _main():
+    await open_client()
+    try:
+        print(await get_pseudo_balance('0xCd58b162aFeA188BAF5BA82a7a35802593570F20','0xeba481C85a80CF3a6C335C4855E6716Cdb13D414'))
+    finally:
+        await close_client()
+
 
 if __name__ == '__main__':
-    print(get_pseudo_balance('0xCd58b162aFeA188BAF5BA82a7a35802593570F20','0xeba481C85a80CF3a6C335C4855E6716Cdb13D414'))
\ No newline at end of file
+    asyncio.run(_main())
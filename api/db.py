@@ -0,0 +1,81 @@
+import os
+import httpx
+from tracing import TracingTransport
+from dotenv import load_dotenv
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+
+load_dotenv()
+
+url: str = os.getenv("SUPABASE_URL")
+key: str = os.getenv("SUPABASE_KEY")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "30"))
+
+# Created once per worker by the FastAPI lifespan (open_client)
+supabase: AsyncClient = None
+_http: httpx.AsyncClient = None
+
+# An order with both parties' wallets and its item, in one embedded select
+ORDER_WITH_PARTIES = (
+    "*, "
+    "buyer:users!orders_buyer_id_fkey(wallet_address), "
+    "seller:users!orders_seller_id_fkey(wallet_address), "
+    "item:seller_items!orders_item_id_fkey(id, product_name, price, quantity)"
+)
+
+
+def query_span_name(request):
+    # /rest/v1/orders -> 'GET orders', /rest/v1/rpc/accept_order -> 'POST rpc/accept_order'
+    return f"{request.method} {request.url.path.split('/rest/v1/', 1)[-1]}"
+
+
+async def open_client():
+    global supabase, _http
+    if supabase is None:
+        # One keep-alive pool shared by every PostgREST request of this worker
+        _http = httpx.AsyncClient(
+            transport=TracingTransport(
+                "db", name=query_span_name,
+                limits=httpx.Limits(max_connections=DB_POOL_SIZE, max_keepalive_connections=DB_POOL_SIZE),
+            ),
+            timeout=DB_TIMEOUT,
+        )
+        supabase = await acreate_client(url, key, options=AsyncClientOptions(httpx_client=_http))
+    return supabase
+
+
+async def close_client():
+    global supabase, _http
+    if _http is not None:
+        await _http.aclose()
+    supabase = None
+    _http = None
+
+
+async def get_order_with_parties(order_id: int):
+    rows = (await supabase.table("orders").select(ORDER_WITH_PARTIES).eq("id", order_id).execute()).data
+    return rows[0] if rows else None
+
+
+async def update_order(order_id: int, values: dict):
+    # PostgREST returns the updated row, so no follow-up select is needed
+    rows = (await supabase.table("orders").update(values).eq("id", order_id).execute()).data
+    return rows[0] if rows else None
+
+
+async def accept_order(order_id: int):
+    rows = (await supabase.rpc("accept_order", {"p_order_id": order_id}).execute()).data
+    return rows[0] if rows else None
+
+
+async def penalize_late_delivery(order_id: int, amount: int = 1):
+    # The seller's new score, or None if this order was already penalized
+    return (await supabase.rpc("penalize_late_delivery", {"p_order_id": order_id, "p_amount": amount}).execute()).data
+
+
+async def reserve_order_ids(count: int):
+    return (await supabase.rpc("reserve_order_ids", {"p_count": count}).execute()).data
+
+
+async def update_listings(seller_id: int, items: list):
+    return (await supabase.rpc("update_listings", {"p_seller_id": seller_id, "p_items": items}).execute()).data
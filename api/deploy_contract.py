@@ -1,57 +1,62 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 from web3 import Web3
-from solcx import compile_source
-from web3.middleware import ExtraDataToPOAMiddleware  
+from chain_client import get_client, open_client, close_client
+from contract_artifact import contract_factory
+from deploy_queue import get_queue, start_queue, stop_queue
 
 load_dotenv()
 
-AMOY_RPC_URL = 'https://rpc-amoy.polygon.technology'
-AMOY_CHAIN_ID = '0x13882'
-AMOY_CONTRACT_URL = 'https://amoy.polygonscan.com/'
-AMOY_NAME = 'Amoy'
-AMOY_SYMBOL = 'POL'
-AMOY_CHAIN_NAME = 'Polygon Amoy'
 ARBITAR_ADRESS=os.getenv('ARBITAR_ADRESS')
-METAMASK_WALLET_PRIVATE_KEY=os.getenv('METAMASK_WALLET_PRIVATE_KEY')
-
-def deploy_contract(buyer_address: str, seller_address: str):
-    with open('escrowContract.sol', 'r') as file:
-        contract_file = file.read()
-
-    compiled_sol = compile_source(contract_file,output_values=['abi','bin'])
-    
-    _, contract_interface = compiled_sol.popitem()
-
-    bytecode = contract_interface['bin']
-
-    abi = contract_interface['abi']
-
-    w3 = Web3(Web3.HTTPProvider(AMOY_RPC_URL))
-    w3.middleware_onion.inject(ExtraDataToPOAMiddleware,layer=0)
-
-    account = w3.eth.account.from_key(METAMASK_WALLET_PRIVATE_KEY)
-
-
-    Greeter = w3.eth.contract(abi=abi, bytecode=bytecode)
-
-    args = [buyer_address,seller_address,ARBITAR_ADRESS]
-    nonce = w3.eth.get_transaction_count(account.address)
-    transaction = Greeter.constructor(*args).build_transaction({
-        'from': account.address,
+# 'full' deploys the whole Escrow bytecode per order, 'clone' asks
+# ESCROW_FACTORY_ADDRESS for an EIP-1167 clone (see deploy_factory.py)
+ESCROW_DEPLOY_MODE=os.getenv('ESCROW_DEPLOY_MODE', 'full')
+ESCROW_FACTORY_ADDRESS=os.getenv('ESCROW_FACTORY_ADDRESS')
+FULL_DEPLOY_GAS=int(os.getenv('FULL_DEPLOY_GAS', '2000000'))
+CLONE_DEPLOY_GAS=int(os.getenv('CLONE_DEPLOY_GAS', '300000'))
+
+def escrow_factory(client=None):
+    client = client or get_client()
+    return contract_factory(client.w3, 'EscrowFactory')(address=Web3.to_checksum_address(ESCROW_FACTORY_ADDRESS))
+
+async def build_deploy_transaction(buyer_address: str, seller_address: str, nonce: int, mode: str = None, client=None):
+    client = client or get_client()
+    mode = mode or ESCROW_DEPLOY_MODE
+    args = [Web3.to_checksum_address(buyer_address),Web3.to_checksum_address(seller_address),ARBITAR_ADRESS]
+    # chainId and gas are given up front so building the tx needs no RPC round trip
+    params = {
+        'from': client.account.address,
+        'chainId': client.chain_id,
         'nonce': nonce,
-        'gas': 2000000,
         'maxFeePerGas': 35000000000,  # Very low gas fee for testnet
         'maxPriorityFeePerGas': 35000000000  # Very low priority fee for testnet
-    })
-
-    signed_txn = w3.eth.account.sign_transaction(transaction, private_key=METAMASK_WALLET_PRIVATE_KEY)
-    tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-
-    address=tx_receipt.contractAddress
-
-    return address
+    }
+    if mode == 'clone':
+        return await escrow_factory(client).functions.createEscrow(*args).build_transaction({**params, 'gas': CLONE_DEPLOY_GAS})
+    if mode != 'full':
+        raise ValueError(f'Unknown ESCROW_DEPLOY_MODE: {mode}')
+    Greeter = client.escrow
+    return await Greeter.constructor(*args).build_transaction({**params, 'gas': FULL_DEPLOY_GAS})
+
+def deployed_address(receipt, client=None):
+    # Full deploys create the contract directly; clones are announced by the factory
+    if receipt.contractAddress:
+        return receipt.contractAddress
+    events = escrow_factory(client).events.EscrowCreated().process_receipt(receipt)
+    return events[0]['args']['escrow']
+
+async def deploy_contract(buyer_address: str, seller_address: str, order_id: int = None):
+    # Queued through the shared nonce allocator; resolves once the receipt is mined
+    return await get_queue().submit(order_id, buyer_address, seller_address)
+
+async def _main():
+    start_queue(await open_client(), build_deploy_transaction, address_from_receipt=deployed_address)
+    try:
+        print(await deploy_contract('0x5f351FBf5Dea981A6C06DfcadA464b84b5e5F871','0xeba481C85a80CF3a6C335C4855E6716Cdb13D414'))
+    finally:
+        await stop_queue()
+        await close_client()
 
 if __name__ == '__main__':
-    print(deploy_contract('0x5f351FBf5Dea981A6C06DfcadA464b84b5e5F871','0xeba481C85a80CF3a6C335C4855E6716Cdb13D414'))
\ No newline at end of file
+    asyncio.run(_main())
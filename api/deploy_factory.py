@@ -0,0 +1,41 @@
+import asyncio
+from chain_client import open_client, close_client
+from contract_artifact import contract_factory
+
+# One-off setup for ESCROW_DEPLOY_MODE=clone: deploys the EscrowClone master
+# copy and the EscrowFactory that clones it, then prints the factory address
+# to put in ESCROW_FACTORY_ADDRESS.
+
+
+async def deploy(client, contract_name: str, *args):
+    w3 = client.w3
+    account = client.account
+    transaction = await contract_factory(w3, contract_name).constructor(*args).build_transaction({
+        'from': account.address,
+        'chainId': client.chain_id,
+        'nonce': await w3.eth.get_transaction_count(account.address, 'pending'),
+    })
+    signed_txn = account.sign_transaction(transaction)
+    tx_hash = await w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+    return receipt.contractAddress
+
+
+async def deploy_factory(client):
+    implementation = await deploy(client, 'EscrowClone')
+    factory = await deploy(client, 'EscrowFactory', implementation)
+    return implementation, factory
+
+
+async def _main():
+    client = await open_client()
+    try:
+        implementation, factory = await deploy_factory(client)
+        print(f'EscrowClone master: {implementation}')
+        print(f'ESCROW_FACTORY_ADDRESS={factory}')
+    finally:
+        await close_client()
+
+
+if __name__ == '__main__':
+    asyncio.run(_main())
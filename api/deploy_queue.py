@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import time
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+DEPLOY_BATCH_SIZE = int(os.getenv('DEPLOY_BATCH_SIZE', '25'))
+RECEIPT_POLL_INTERVAL = float(os.getenv('RECEIPT_POLL_INTERVAL', '2'))
+RECEIPT_TIMEOUT = float(os.getenv('RECEIPT_TIMEOUT', '600'))
+CANCEL_GAS = 21000
+
+logger = logging.getLogger(__name__)
+
+
+class NonceAllocator:
+    # Hands out nonces for one sender locally so concurrent deploys never
+    # race on eth_getTransactionCount.
+
+    def __init__(self, w3, address: str):
+        self.w3 = w3
+        self.address = address
+        self._next = None
+        self._lock = asyncio.Lock()
+
+    async def allocate(self):
+        async with self._lock:
+            if self._next is None:
+                self._next = await self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    async def resync(self):
+        # A broadcast failed, so the allocated nonce may be unused; re-read it from the node
+        async with self._lock:
+            self._next = None
+
+
+async def cancel_nonce(client, nonces, nonce: int):
+    # A transaction that never got mined leaves its nonce unused, and every
+    # later transaction from the account waits behind it. Fill it with a
+    # zero-value self transaction priced to replace the stuck one, then re-read
+    # the next nonce from the node.
+    account = client.account
+    fee = 2 * await client.w3.eth.gas_price
+    signed_txn = account.sign_transaction({
+        'from': account.address,
+        'to': account.address,
+        'value': 0,
+        'chainId': client.chain_id,
+        'nonce': nonce,
+        'gas': CANCEL_GAS,
+        'maxFeePerGas': fee,
+        'maxPriorityFeePerGas': fee,
+    })
+    try:
+        await client.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    except Exception:
+        # Typically "nonce too low": the original was mined after all
+        logger.warning('Cancelling nonce %s failed', nonce, exc_info=True)
+    await nonces.resync()
+
+
+class DeployQueue:
+    # Signs and broadcasts escrow deployments back to back, then a background
+    # poller collects receipts and reports each contract address via on_deployed.
+    # on_signed gets each tx hash before it is broadcast, so a deploy can be
+    # picked up again with resume() after a restart.
+
+    def __init__(self, client, build_transaction, on_deployed=None, address_from_receipt=None, on_signed=None, batch_size: int = DEPLOY_BATCH_SIZE, poll_interval: float = RECEIPT_POLL_INTERVAL):
+        self.client = client
+        self.build_transaction = build_transaction
+        self.on_deployed = on_deployed
+        self.address_from_receipt = address_from_receipt or (lambda receipt: receipt.contractAddress)
+        self.on_signed = on_signed
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.nonces = NonceAllocator(client.w3, client.account.address)
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._broadcast_loop()),
+            asyncio.create_task(self._receipt_loop()),
+        ]
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, order_id: int, buyer_address: str, seller_address: str):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((order_id, buyer_address, seller_address, future))
+        return future
+
+    async def resume(self, order_id: int, tx_hash: str):
+        # Waits for a deploy broadcast before a restart. Returns None when that
+        # transaction cannot create the escrow any more (never sent, dropped or
+        # reverted) and the order has to be deployed again.
+        tx_hash = Web3.to_bytes(hexstr=tx_hash)
+        nonce = None
+        try:
+            receipt = await self.client.w3.eth.get_transaction_receipt(tx_hash)
+            if receipt.status != 1:
+                return None
+        except TransactionNotFound:
+            try:
+                nonce = (await self.client.w3.eth.get_transaction(tx_hash))['nonce']
+            except TransactionNotFound:
+                return None
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tx_hash] = (order_id, future, time.monotonic(), nonce)
+        return future
+
+    async def _broadcast_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for job in batch:
+                await self._broadcast(*job)
+
+    async def _broadcast(self, order_id, buyer_address, seller_address, future):
+        try:
+            nonce = await self.nonces.allocate()
+            transaction = await self.build_transaction(buyer_address, seller_address, nonce)
+            signed_txn = self.client.account.sign_transaction(transaction)
+            if self.on_signed is not None:
+                await self.on_signed(order_id, Web3.to_hex(signed_txn.hash))
+            tx_hash = await self.client.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        except Exception as e:
+            logger.exception('Deploy broadcast failed for order %s', order_id)
+            await self.nonces.resync()
+            self._fail(order_id, future, e)
+            return
+        self._pending[tx_hash] = (order_id, future, time.monotonic(), nonce)
+
+    async def _receipt_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._pending:
+                continue
+            tx_hashes = list(self._pending)
+            receipts = await asyncio.gather(
+                *(self.client.w3.eth.get_transaction_receipt(tx_hash) for tx_hash in tx_hashes),
+                return_exceptions=True,
+            )
+            for tx_hash, receipt in zip(tx_hashes, receipts):
+                await self._handle_receipt(tx_hash, receipt)
+
+    async def _handle_receipt(self, tx_hash, receipt):
+        order_id, future, sent_at, nonce = self._pending[tx_hash]
+        if isinstance(receipt, TransactionNotFound):
+            if time.monotonic() - sent_at > RECEIPT_TIMEOUT:
+                del self._pending[tx_hash]
+                if nonce is not None:
+                    await cancel_nonce(self.client, self.nonces, nonce)
+                self._fail(order_id, future, TimeoutError(f'No receipt for {tx_hash.hex()}'))
+            return
+        if isinstance(receipt, Exception):
+            # Transient RPC error, retry on the next poll
+            return
+        del self._pending[tx_hash]
+        if receipt.status != 1:
+            self._fail(order_id, future, RuntimeError(f'Deployment reverted: {tx_hash.hex()}'))
+            return
+        try:
+            address = self.address_from_receipt(receipt)
+            if self.on_deployed is not None:
+                await self.on_deployed(order_id, address)
+        except Exception as e:
+            logger.exception('Recording contract address failed for order %s', order_id)
+            self._fail(order_id, future, e)
+            return
+        if not future.done():
+            future.set_result(address)
+
+    def _fail(self, order_id, future, error):
+        if not future.done():
+            future.set_exception(error)
+            # Nobody may be awaiting the future; mark the exception as retrieved
+            future.exception()
+
+
+_queue = None
+
+
+def start_queue(client, build_transaction, on_deployed=None, address_from_receipt=None, on_signed=None):
+    global _queue
+    if _queue is None:
+        _queue = DeployQueue(client, build_transaction, on_deployed, address_from_receipt, on_signed).start()
+    return _queue
+
+
+def get_queue():
+    if _queue is None:
+        raise RuntimeError('Deploy queue is not started, call start_queue() first')
+    return _queue
+
+
+async def stop_queue():
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
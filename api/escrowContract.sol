@@ -1,7 +1,7 @@
 // SPDX-License-Identifier: MIT
 pragma solidity ^0.8.26;
 
-contract Escrow {
+abstract contract EscrowBase {
     address public buyer;
     address payable public seller;
     address payable public arbiter;
@@ -45,7 +45,7 @@ contract Escrow {
         uint timestamp
     );
 
-    constructor(address _buyer, address payable _seller, address payable _arbiter) {
+    function _initialize(address _buyer, address payable _seller, address payable _arbiter) internal {
         require(_buyer != address(0) && _seller != address(0) && _arbiter != address(0), "Invalid address");
         require(_buyer != _seller && _buyer != _arbiter && _seller != _arbiter, "Addresses must be different");
         
@@ -122,4 +122,62 @@ contract Escrow {
     function getEscrowAmount() public view returns (uint) {
         return amount;
     }
-}
\ No newline at end of file
+}
+
+contract Escrow is EscrowBase {
+    constructor(address _buyer, address payable _seller, address payable _arbiter) {
+        _initialize(_buyer, _seller, _arbiter);
+    }
+}
+
+// Master copy for EIP-1167 clones: same ABI as Escrow, but set up through
+// initialize() since clones never run a constructor.
+contract EscrowClone is EscrowBase {
+    bool private initialized;
+
+    constructor() {
+        // Lock the master copy itself
+        initialized = true;
+    }
+
+    function initialize(address _buyer, address payable _seller, address payable _arbiter) external {
+        require(!initialized, "Already initialized");
+        initialized = true;
+        _initialize(_buyer, _seller, _arbiter);
+    }
+}
+
+contract EscrowFactory {
+    address public immutable implementation;
+    address public immutable owner;
+
+    event EscrowCreated(
+        address indexed escrow,
+        address indexed buyer,
+        address indexed seller,
+        uint timestamp
+    );
+
+    constructor(address _implementation) {
+        require(_implementation != address(0), "Invalid address");
+        implementation = _implementation;
+        owner = msg.sender;
+    }
+
+    function createEscrow(address _buyer, address payable _seller, address payable _arbiter) external returns (address instance) {
+        require(msg.sender == owner, "Not Authorized");
+        instance = _clone(implementation);
+        EscrowClone(instance).initialize(_buyer, _seller, _arbiter);
+        emit EscrowCreated(instance, _buyer, _seller, block.timestamp);
+    }
+
+    // EIP-1167 minimal proxy delegating every call to implementation
+    function _clone(address _implementation) internal returns (address instance) {
+        assembly {
+            mstore(0x00, or(shr(0xe8, shl(0x60, _implementation)), 0x3d602d80600a3d3981f3363d3d373d3d3d363d73000000))
+            mstore(0x20, or(shl(0x78, _implementation), 0x5af43d82803e903d91602b57fd5bf3))
+            instance := create(0, 0x09, 0x37)
+        }
+        require(instance != address(0), "Clone failed");
+    }
+}
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+
+from web3 import Web3
+
+from order_jobs import refresh_merkle_root
+from pagination import iter_pages
+
+INDEXER_NAME = 'escrow_events'
+INDEXER_INTERVAL_SECONDS = float(os.getenv('INDEXER_INTERVAL_SECONDS', '15'))
+# Without a checkpoint, start here (defaults to the current head)
+INDEXER_START_BLOCK = os.getenv('INDEXER_START_BLOCK')
+BLOCK_BATCH = int(os.getenv('INDEXER_BLOCK_BATCH', '2000'))
+ADDRESS_BATCH = 500
+CONFIRMATIONS = int(os.getenv('INDEXER_CONFIRMATIONS', '5'))
+TRACKED_EVENTS = ['AmountDeposited', 'DeliveryConfirmed', 'AmountTransferred', 'BalanceAdded']
+# Events that set paid/delivered in apply_escrow_events, changing the order's merkle root
+STATE_EVENTS = {'AmountDeposited', 'DeliveryConfirmed'}
+ESCROW_OVERLAP = 100
+
+logger = logging.getLogger(__name__)
+
+# Escrows known to this process (migrations/013_escrows.sql), grown incrementally
+_escrows = set()
+_last_escrow_id = 0
+
+
+def event_topics(escrow):
+    # topic0 -> event class, from the cached Escrow ABI
+    topics = {}
+    for entry in escrow.abi:
+        if entry['type'] == 'event' and entry['name'] in TRACKED_EVENTS:
+            signature = f"{entry['name']}({','.join(i['type'] for i in entry['inputs'])})"
+            topics[Web3.keccak(text=signature)] = escrow.events[entry['name']]
+    return topics
+
+
+def decode_logs(topics: dict, logs):
+    events = []
+    for log in logs:
+        event = topics.get(bytes(log['topics'][0])) if log['topics'] else None
+        if event is None:
+            continue
+        decoded = event().process_log(log)
+        events.append({
+            'tx_hash': Web3.to_hex(log['transactionHash']),
+            'log_index': log['logIndex'],
+            'block_number': log['blockNumber'],
+            'contract_address': log['address'],
+            'event': decoded['event'],
+            # uint256 amounts can exceed JSON number precision, keep them as strings
+            'args': {k: str(v) if isinstance(v, int) and not isinstance(v, bool) else v for k, v in decoded['args'].items()},
+        })
+    return events
+
+
+async def get_checkpoint(supabase):
+    rows = (await supabase.table('indexer_checkpoints').select('last_block').eq('name', INDEXER_NAME).execute()).data
+    return rows[0]['last_block'] if rows else None
+
+
+async def save_checkpoint(supabase, block: int):
+    await supabase.table('indexer_checkpoints').upsert({'name': INDEXER_NAME, 'last_block': block, 'updated_at': 'now()'}).execute()
+
+
+async def escrow_addresses(supabase):
+    # Only escrows added since the last run are read. The last ESCROW_OVERLAP
+    # ids are read again, in case a lower id committed after a higher one.
+    global _last_escrow_id
+    rows = iter_pages(lambda: supabase.table('escrows').select('id, contract_address'), max(_last_escrow_id - ESCROW_OVERLAP, 0))
+    async for batch in rows:
+        _escrows.update(Web3.to_checksum_address(row['contract_address']) for row in batch)
+        _last_escrow_id = max(_last_escrow_id, batch[-1]['id'])
+    return sorted(_escrows)
+
+
+async def refresh_changed_roots(supabase, events):
+    contracts = sorted({e['contract_address'].lower() for e in events if e['event'] in STATE_EVENTS})
+    if not contracts:
+        return
+    rows = (await supabase.table('escrows').select('order_id').in_('contract_address', contracts).execute()).data
+    for row in rows:
+        await refresh_merkle_root(row['order_id'])
+
+
+async def index_once(supabase, client):
+    # Pulls logs for every escrow in block-range batches up to head - CONFIRMATIONS
+    w3 = client.w3
+    head = await w3.eth.block_number - CONFIRMATIONS
+    checkpoint = await get_checkpoint(supabase)
+    if checkpoint is None:
+        checkpoint = int(INDEXER_START_BLOCK) - 1 if INDEXER_START_BLOCK else head
+        await save_checkpoint(supabase, checkpoint)
+
+    addresses = await escrow_addresses(supabase)
+    topics = event_topics(client.escrow)
+    applied = 0
+    from_block = checkpoint + 1
+    while from_block <= head:
+        to_block = min(from_block + BLOCK_BATCH - 1, head)
+        if addresses:
+            batches = await asyncio.gather(*(
+                w3.eth.get_logs({'address': addresses[i:i + ADDRESS_BATCH], 'fromBlock': from_block, 'toBlock': to_block})
+                for i in range(0, len(addresses), ADDRESS_BATCH)
+            ))
+            events = decode_logs(topics, [log for batch in batches for log in batch])
+            if events:
+                events.sort(key=lambda e: (e['block_number'], e['log_index']))
+                applied += (await supabase.rpc('apply_escrow_events', {'p_events': events}).execute()).data
+                await refresh_changed_roots(supabase, events)
+        await save_checkpoint(supabase, to_block)
+        from_block = to_block + 1
+    return applied
+
+
+async def run_indexer(supabase, client, interval: float = INDEXER_INTERVAL_SECONDS):
+    while True:
+        try:
+            applied = await index_once(supabase, client)
+            if applied:
+                logger.info('Applied %s escrow events', applied)
+        except Exception:
+            logger.exception('Escrow event indexing failed')
+        await asyncio.sleep(interval)
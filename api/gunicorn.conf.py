@@ -0,0 +1,43 @@
+import multiprocessing
+import os
+
+# Production profile, read automatically by gunicorn from this directory:
+#   gunicorn main:app
+# and run the background worker next to it:
+#   python worker.py
+# The master imports main once (preload_app) and forks the web workers. Each
+# worker then runs the lifespan, which opens its own pools and warms the caches.
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+preload_app = True
+# Uvicorn workers are async, so this is a liveness heartbeat, not a request
+# limit; SSE and WebSocket subscriptions stay open past it.
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound slow memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '20000'))
+max_requests_jitter = max_requests // 10
+
+# Deploys, anchoring and scans must run once, not once per web worker: the
+# deployer's nonces live in one process
+os.environ.setdefault('JOB_WORKER', 'external')
+# The chatbot stack is ~80 MB of private memory per worker even when imported
+# in the master, so workers load it on the first /chatbot call unless
+# CHATBOT_WARMUP=1 is set explicitly
+os.environ.setdefault('CHATBOT_WARMUP', '0')
+
+
+def on_starting(server):
+    # Compile the escrow artifact (if missing) once in the master, before any
+    # worker exists, instead of every worker racing to run solc
+    from contract_artifact import load_contracts
+    load_contracts()
+    # With the chatbot warmed, import LangChain/LangGraph here too, so the
+    # workers share the master's pages instead of each importing its own copy
+    # after the fork. Only the import; each worker still creates its own model
+    # client in the lifespan.
+    if os.getenv('CHATBOT_WARMUP') == '1':
+        import chatbot  # noqa: F401
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+# Durable, retrying background jobs. Endpoints enqueue work under an
+# idempotency key (e.g. deploy:{order_id}) and return; a Worker, either inside
+# the API process (JOB_WORKER=embedded) or in `python worker.py`, claims due
+# jobs, runs the handler registered for their kind and retries failures with
+# exponential backoff. Handlers run at least once, so they must be idempotent.
+#
+# Jobs live in Postgres (migrations/008_jobs.sql) unless JOB_STORE_URL is a
+# sqlite:///path URL, which is meant for local runs and tests.
+
+JOB_STORE_URL = os.getenv('JOB_STORE_URL')
+JOB_WORKER = os.getenv('JOB_WORKER', 'embedded')
+JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', '50'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+# Longer than a deploy can wait for its receipt (RECEIPT_TIMEOUT)
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '900'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '8'))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', '2'))
+JOB_STATUS_COLUMNS = 'id, kind, key, order_id, status, attempts, run_at, last_error, result, rerun_requested, created_at, updated_at'
+
+logger = logging.getLogger(__name__)
+
+# kind -> async handler(payload) returning a JSON-serialisable result
+handlers = {}
+
+
+def handler(kind: str):
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+    return register
+
+
+def retry_delay(attempts: int):
+    return JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1) + random.random()
+
+
+class SupabaseJobStore:
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    async def _rpc(self, name: str, params: dict):
+        return (await self.supabase.rpc(name, params).execute()).data
+
+    async def enqueue(self, kind: str, key: str, payload: dict = None, order_id: int = None, rerun: bool = False):
+        rows = await self._rpc('enqueue_job', {
+            'p_kind': kind, 'p_key': key, 'p_payload': payload or {}, 'p_order_id': order_id, 'p_rerun': rerun,
+        })
+        return rows[0]
+
+    async def claim(self, worker: str, limit: int, lease: float):
+        return await self._rpc('claim_jobs', {'p_worker': worker, 'p_limit': limit, 'p_lease_seconds': lease})
+
+    async def complete(self, job_id: int, worker: str, result=None):
+        return await self._rpc('complete_job', {'p_id': job_id, 'p_worker': worker, 'p_result': result})
+
+    async def fail(self, job_id: int, worker: str, error: str, retry_in: float = None):
+        return await self._rpc('fail_job', {'p_id': job_id, 'p_worker': worker, 'p_error': error, 'p_retry_in': retry_in})
+
+    async def for_order(self, order_id: int):
+        return (await self.supabase.table('jobs').select(JOB_STATUS_COLUMNS).eq('order_id', order_id).order('id').execute()).data
+
+    async def get(self, key: str):
+        rows = (await self.supabase.table('jobs').select(JOB_STATUS_COLUMNS).eq('key', key).execute()).data
+        return rows[0] if rows else None
+
+
+class SQLiteJobStore:
+    # Same semantics as the Postgres functions; shared between processes through
+    # the database file. Times are unix seconds.
+
+    SCHEMA = '''
+        create table if not exists jobs (
+            id integer primary key autoincrement,
+            kind text not null,
+            key text not null unique,
+            order_id integer,
+            payload text not null default '{}',
+            status text not null default 'pending',
+            attempts integer not null default 0,
+            run_at real not null,
+            locked_by text,
+            locked_until real,
+            last_error text,
+            result text,
+            rerun_requested integer not null default 0,
+            created_at real not null,
+            updated_at real not null
+        );
+        create index if not exists jobs_due_idx on jobs (status, run_at);
+        create index if not exists jobs_order_idx on jobs (order_id);
+    '''
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('pragma journal_mode=wal')
+        self.connection.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def _row(self, row):
+        job = dict(row)
+        for column in ('payload', 'result'):
+            if job.get(column) is not None:
+                job[column] = json.loads(job[column])
+        return job
+
+    def _transaction(self, fn):
+        with self._lock:
+            self.connection.execute('begin immediate')
+            try:
+                result = fn(self.connection)
+            except BaseException:
+                self.connection.execute('rollback')
+                raise
+            self.connection.execute('commit')
+            return result
+
+    async def _run(self, fn):
+        return await asyncio.to_thread(self._transaction, fn)
+
+    async def enqueue(self, kind: str, key: str, payload: dict = None, order_id: int = None, rerun: bool = False):
+        def enqueue(db):
+            now = time.time()
+            inserted = db.execute(
+                'insert into jobs (kind, key, payload, order_id, run_at, created_at, updated_at) values (?, ?, ?, ?, ?, ?, ?) '
+                'on conflict (key) do nothing',
+                (kind, key, json.dumps(payload or {}), order_id, now, now, now),
+            ).rowcount
+            if rerun and not inserted:
+                # A running job keeps its lease and is requeued when that run ends
+                db.execute(
+                    "update jobs set rerun_requested = 1, payload = ?, updated_at = ? where key = ? and status = 'running'",
+                    (json.dumps(payload or {}), now, key),
+                )
+                db.execute(
+                    "update jobs set status = 'pending', payload = ?, attempts = 0, run_at = ?, last_error = null, "
+                    "result = null, updated_at = ? where key = ? and status != 'running'",
+                    (json.dumps(payload or {}), now, now, key),
+                )
+            return self._row(db.execute('select * from jobs where key = ?', (key,)).fetchone())
+        return await self._run(enqueue)
+
+    async def claim(self, worker: str, limit: int, lease: float):
+        def claim(db):
+            now = time.time()
+            ids = [row['id'] for row in db.execute(
+                "select id from jobs where (status = 'pending' and run_at <= ?) or (status = 'running' and locked_until < ?) "
+                'order by run_at limit ?',
+                (now, now, limit),
+            )]
+            db.executemany(
+                "update jobs set status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?, rerun_requested = 0, "
+                'updated_at = ? where id = ?',
+                [(worker, now + lease, now, job_id) for job_id in ids],
+            )
+            return [self._row(row) for row in db.execute(
+                f"select * from jobs where id in ({','.join('?' * len(ids))})", ids,
+            )] if ids else []
+        return await self._run(claim)
+
+    async def complete(self, job_id: int, worker: str, result=None):
+        def complete(db):
+            now = time.time()
+            return db.execute(
+                "update jobs set status = case when rerun_requested then 'pending' else 'done' end, "
+                'run_at = case when rerun_requested then ? else run_at end, '
+                'attempts = case when rerun_requested then 0 else attempts end, rerun_requested = 0, '
+                'result = ?, last_error = null, locked_by = null, locked_until = null, updated_at = ? '
+                "where id = ? and locked_by = ? and status = 'running'",
+                (now, json.dumps(result), now, job_id, worker),
+            ).rowcount == 1
+        return await self._run(complete)
+
+    async def fail(self, job_id: int, worker: str, error: str, retry_in: float = None):
+        def fail(db):
+            now = time.time()
+            status, run_at = ('failed', now) if retry_in is None else ('pending', now + retry_in)
+            return db.execute(
+                "update jobs set status = case when rerun_requested then 'pending' else ? end, "
+                'run_at = case when rerun_requested then ? else ? end, '
+                'attempts = case when rerun_requested then 0 else attempts end, rerun_requested = 0, '
+                'last_error = ?, locked_by = null, locked_until = null, updated_at = ? '
+                "where id = ? and locked_by = ? and status = 'running'",
+                (status, now, run_at, error, now, job_id, worker),
+            ).rowcount == 1
+        return await self._run(fail)
+
+    async def for_order(self, order_id: int):
+        def for_order(db):
+            return [self._row(row) for row in db.execute(f'select {JOB_STATUS_COLUMNS} from jobs where order_id = ? order by id', (order_id,))]
+        return await self._run(for_order)
+
+    async def get(self, key: str):
+        def get(db):
+            row = db.execute(f'select {JOB_STATUS_COLUMNS} from jobs where key = ?', (key,)).fetchone()
+            return self._row(row) if row else None
+        return await self._run(get)
+
+
+class Worker:
+    def __init__(self, store, concurrency: int = JOB_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL, lease: float = JOB_LEASE_SECONDS):
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._running = set()
+
+    async def run(self):
+        # Deploy jobs mostly wait on receipts, so many run at once and the
+        # DeployQueue still batches their broadcasts.
+        try:
+            while True:
+                free = self.concurrency - len(self._running)
+                claimed = []
+                if free > 0:
+                    try:
+                        claimed = await self.store.claim(self.id, free, self.lease)
+                    except Exception:
+                        logger.exception('Claiming jobs failed')
+                for job in claimed:
+                    task = asyncio.create_task(self._execute(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+                if len(claimed) < free or free <= 0:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            # Unfinished jobs keep their lease and are reclaimed once it expires
+            for task in self._running:
+                task.cancel()
+
+    async def _execute(self, job: dict):
+        fn = handlers.get(job['kind'])
+        try:
+            if fn is None:
+                raise LookupError(f"No handler for job kind {job['kind']!r}")
+            result = await fn(job['payload'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            final = job['attempts'] >= JOB_MAX_ATTEMPTS or isinstance(e, LookupError)
+            logger.warning('Job %s (%s) attempt %s failed: %s', job['key'], job['kind'], job['attempts'], e)
+            await self.store.fail(job['id'], self.id, f'{type(e).__name__}: {e}', None if final else retry_delay(job['attempts']))
+            return
+        await self.store.complete(job['id'], self.id, result)
+
+    def start(self):
+        return asyncio.create_task(self.run())
+
+
+_store = None
+
+
+def open_store(supabase=None):
+    global _store
+    if _store is None:
+        if JOB_STORE_URL and JOB_STORE_URL.startswith('sqlite:///'):
+            _store = SQLiteJobStore(JOB_STORE_URL[len('sqlite:///'):])
+        else:
+            _store = SupabaseJobStore(supabase)
+    return _store
+
+
+def get_store():
+    if _store is None:
+        raise RuntimeError('Job store is not open, call open_store() first')
+    return _store
+
+
+def close_store():
+    global _store
+    if isinstance(_store, SQLiteJobStore):
+        _store.connection.close()
+    _store = None
+
+
+async def enqueue(kind: str, key: str, payload: dict = None, order_id: int = None, rerun: bool = False):
+    return await get_store().enqueue(kind, key, payload, order_id, rerun)
@@ -1,27 +1,127 @@
-from fastapi import FastAPI, Request
-import os
-from supabase import create_client , Client
 from dotenv import load_dotenv
-import bcrypt
-from deploy_contract import deploy_contract
-from chatbot import chatbot_test
-from contract_functions import get_pseudo_balance
-from sus_detector import detect_sus
-from merkle import build_merkle_tree
-
+# Before the local imports, which read their settings from the environment
 load_dotenv()
 
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
-app = FastAPI()
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from typing import List, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+import os
+from postgrest.exceptions import APIError
+import passwords
+from deploy_queue import stop_queue
+from contract_functions import get_pseudo_balance, get_total_pseudo_balance
+import balances
+import sus_detector
+import event_indexer
+import jobs
+import order_events
+import order_jobs
+import seller_stats
+from merkle import ORDER_FIELDS, MerkleStore, build_merkle_roots, order_leaves, verify_proof
+from contract_artifact import load_contracts
+import chain_client
+import tracing
+import db
+import anchor
+from cache import create_cache, etag_for
+from pagination import ITEM_COLUMNS, ORDER_COLUMNS, iter_pages, paginated_response, wants_ndjson
+
+# LangChain/LangGraph are the heaviest imports in the app, so the chatbot is
+# imported on first use, or during startup with CHATBOT_WARMUP=1 (the default,
+# except under gunicorn.conf.py)
+CHATBOT_WARMUP = os.getenv("CHATBOT_WARMUP", "1") == "1"
+
+order_trees = MerkleStore()
+cache = create_cache()
+explorer: sus_detector.ExplorerClient = None
+
+# Strong references for fire-and-forget tasks until they finish
+background_tasks = set()
+
+def chat():
+    import chatbot
+    return chatbot
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm everything once per worker so the first requests don't pay for it:
+    # the escrow artifact, the DB/RPC/explorer pools and (optionally) the model client
+    load_contracts()
+    if CHATBOT_WARMUP:
+        chat().get_client()
+    await db.open_client()
+    client = await chain_client.open_client()
+    jobs.open_store(db.supabase)
+    global explorer
+    explorer = sus_detector.ExplorerClient()
+    # Deploys, anchoring and scans run in the worker; in-process unless a
+    # separate `python worker.py` is running (JOB_WORKER=external)
+    background = []
+    if jobs.JOB_WORKER == "embedded":
+        import worker
+        background = worker.start_worker(client, cache, explorer)
+    if order_events.ORDER_EVENTS_DATABASE_URL:
+        background.append(asyncio.create_task(order_events.listen()))
+    yield
+    for task in background:
+        task.cancel()
+    await explorer.close()
+    await stop_queue()
+    jobs.close_store()
+    await chain_client.close_client()
+    await db.close_client()
+    passwords.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(tracing.trace_requests)
+
+@app.middleware("http")
+async def tag_rpc_endpoint(request: Request, call_next):
+    token = chain_client.current_endpoint.set(request.url.path)
+    try:
+        return await call_next(request)
+    finally:
+        chain_client.current_endpoint.reset(token)
+
+async def invalidate_catalogue():
+    await cache.invalidate("catalogue")
+
+@app.get("/cache_stats")
+async def cache_stats():
+    stats = cache.snapshot()
+    if "chatbot" in sys.modules:
+        stats["chatbot_answers"] = {"hits": chat().answers.hits, "misses": chat().answers.misses}
+        stats["chatbot_threads"] = len(chat().threads)
+    return stats
+
+@app.get("/metrics")
+async def metrics():
+    body = tracing.render_prometheus() + tracing.render_counters("cache", "namespace", cache.snapshot())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/rpc_stats")
+async def rpc_stats():
+    return chain_client.rpc_stats_snapshot()
 
 @app.post("/create_user")
 async def create_user(name: str, password: str , email: str, mobile_number: str, type: str,wallet_address: str,pancard_number: str):
-    password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    response = (
-        supabase.table("users")
+    try:
+        password = await passwords.hash_password(password)
+    except passwords.PasswordPoolBusy:
+        return JSONResponse({"status": "error", "message": "Server busy, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+    response = await (
+        db.supabase.table("users")
         .insert({"name": name , "password": password , "type": type, "email_id": email , "mobile_number": mobile_number, "wallet_address": wallet_address, "pancard_number": pancard_number})
         .execute()
     )
@@ -29,320 +129,569 @@ async def create_user(name: str, password: str , email: str, mobile_number: str,
 #https://en.wikipedia.org/wiki/Merkle_tree
 @app.post("/create_merkle_root_for_order")
 async def create_merkle_root_for_order(order_id: int):
-    order = supabase.table("orders").select("*").eq("id", order_id).execute().data[0]
-    leaves = [
-        str(order["id"]),
-        str(order["buyer_id"]),
-        str(order["seller_id"]),
-        str(order["item_id"]),
-        str(order["quantity"]),
-        str(order["cost"]),
-        str(order["accepted"]),
-        str(order["delivered"]),
-        str(order["paid"])
-    ]
-    merkle_root = build_merkle_tree(leaves)
-    response = (
-        supabase.table("orders")
+    order = (await db.supabase.table("orders").select(",".join(ORDER_FIELDS)).eq("id", order_id).execute()).data[0]
+    # Only the leaves that changed since the last call are re-hashed
+    merkle_root = order_trees.tree(order_id, order_leaves(order)).root_hex
+    response = await (
+        db.supabase.table("orders")
         .update({"merkle_root": merkle_root})
         .eq("id", order_id)
         .execute()
     )
     return response.data
 
+@app.post("/create_merkle_roots")
+async def create_merkle_roots(order_ids: List[int]):
+    orders = (await db.supabase.table("orders").select(",".join(ORDER_FIELDS)).in_("id", order_ids).execute()).data
+    roots = build_merkle_roots([order_leaves(order) for order in orders])
+    # Writes merkle_root only; upserting the rows read above would undo any
+    # accept or payment that landed in between
+    return (await db.supabase.rpc("set_merkle_roots", {"p_roots": [
+        {"id": order["id"], "merkle_root": root} for order, root in zip(orders, roots)
+    ]}).execute()).data
+
+@app.get("/merkle_proof")
+async def merkle_proof(order_id: int, field: str):
+    if field not in ORDER_FIELDS:
+        return {"status": "error", "message": f"field must be one of {ORDER_FIELDS}"}
+    order = (await db.supabase.table("orders").select(",".join(ORDER_FIELDS)).eq("id", order_id).execute()).data[0]
+    tree = order_trees.tree(order_id, order_leaves(order))
+    index = ORDER_FIELDS.index(field)
+    return {"leaf": tree.leaves[index], "proof": tree.proof(index), "root": tree.root_hex}
+
+class MerkleProofCheck(BaseModel):
+    leaf: str
+    proof: List[Tuple[str, str]]
+    root: str
+
+@app.post("/verify_merkle_proof")
+async def verify_merkle_proof(check: MerkleProofCheck):
+    if any(side not in ("left", "right") for _, side in check.proof):
+        raise HTTPException(status_code=400, detail="proof sides must be 'left' or 'right'")
+    try:
+        return {"valid": verify_proof(check.leaf, check.proof, check.root)}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="proof hashes must be hex strings")
+
+
+@app.post("/anchor_roots")
+async def anchor_roots():
+    # Coalesces with an anchor run that is already queued
+    return await jobs.enqueue("anchor", "anchor", rerun=True)
+
+@app.get("/verify_order_anchor")
+async def verify_order_anchor(order_id: int):
+    order = (await db.supabase.table("orders").select(
+        f"{','.join(ORDER_FIELDS)}, merkle_root, anchor_proof, merkle_anchors(root, tx_hash, created_at)"
+    ).eq("id", order_id).execute()).data[0]
+    current_root = order_trees.tree(order_id, order_leaves(order)).root_hex
+    return await anchor.verify_order_anchor(order, current_root, chain_client.get_client())
+
 
 @app.post("/create_order")
 async def create_order(buyer_id: int, seller_id: int, item_id: int, quantity: int):
-    cost = supabase.table("seller_items").select("price").eq("id", item_id).execute().data[0]["price"] * quantity
-    response = (
-        supabase.table("orders")
+    cost = (await db.supabase.table("seller_items").select("price").eq("id", item_id).execute()).data[0]["price"] * quantity
+    response = await (
+        db.supabase.table("orders")
         .insert({"buyer_id": buyer_id , "seller_id": seller_id , "item_id": item_id , "quantity": quantity,"cost":cost,"accepted": False, "delivered": False, "paid": False})
         .execute()
     )
-    await create_merkle_root_for_order(response.data[0]["id"])
+    order_events.publish(response.data)
+    await order_jobs.refresh_merkle_root(response.data[0]["id"])
     return response
 
+class OrderLine(BaseModel):
+    item_id: int
+    quantity: int
+
+@app.post("/create_orders")
+async def create_orders(buyer_id: int, lines: List[OrderLine]):
+    # One price lookup, one id reservation and one insert for the whole cart.
+    # Results come back in request order, one per line.
+    item_ids = list({line.item_id for line in lines})
+    items = {item["id"]: item for item in (await db.supabase.table("seller_items").select("id, seller_id, price, quantity").in_("id", item_ids).execute()).data} if item_ids else {}
+    results = [None] * len(lines)
+    accepted = []
+    for i, line in enumerate(lines):
+        item = items.get(line.item_id)
+        if item is None:
+            results[i] = {"status": "error", "item_id": line.item_id, "message": "Item not found"}
+        elif line.quantity <= 0:
+            results[i] = {"status": "error", "item_id": line.item_id, "message": "Quantity must be positive"}
+        elif line.quantity > item["quantity"]:
+            results[i] = {"status": "error", "item_id": line.item_id, "message": "Insufficient stock"}
+        else:
+            accepted.append(i)
+    if not accepted:
+        return results
+
+    order_ids = await db.reserve_order_ids(len(accepted))
+    orders = []
+    for order_id, i in zip(order_ids, accepted):
+        item = items[lines[i].item_id]
+        orders.append({
+            "id": order_id, "buyer_id": buyer_id, "seller_id": item["seller_id"], "item_id": item["id"],
+            "quantity": lines[i].quantity, "cost": item["price"] * lines[i].quantity,
+            "accepted": False, "delivered": False, "paid": False,
+        })
+    roots = build_merkle_roots([order_leaves(order) for order in orders])
+    inserted = (await db.supabase.table("orders").insert([{**order, "merkle_root": root} for order, root in zip(orders, roots)]).execute()).data
+    order_events.publish(inserted)
+    by_id = {order["id"]: order for order in inserted}
+    for order_id, i in zip(order_ids, accepted):
+        results[i] = {"status": "success", "data": by_id[order_id]}
+    return results
+
+# Spread embed flattens product_name into each row inside PostgREST
+CONFIRMED_ORDER_FIELDS = {
+    **{column: column for column in ["id", "quantity", "accepted", "delivered", "paid", "cost", "seller_id", "buyer_id", "item_id", "contract_address", "accepted_at", "paid_at"]},
+    "product_name": "...seller_items!orders_item_id_fkey(product_name)",
+}
+
 @app.get("/get_confirmed_orders")
-async def get_confirmed_orders(buyer_id: int):
-    response = supabase.table("orders").select(
-        "*, seller_items!orders_item_id_fkey(product_name:product_name)"
-    ).eq("buyer_id", buyer_id).eq("accepted", True).eq("paid",False).execute()
-    transformed_data = [{
-        "id": order["id"],
-        "quantity": order["quantity"],
-        "accepted": order["accepted"],
-        "delivered": order["delivered"],
-        "paid": order["paid"],
-        "cost": order["cost"],
-        "seller_id": order["seller_id"],
-        "buyer_id": order["buyer_id"],
-        "item_id": order["item_id"],
-        "contract_address": order["contract_address"],
-        "accepted_at": order["accepted_at"],
-        "paid_at": order["paid_at"],
-        "product_name": order["seller_items"]["product_name"]
-    } for order in response.data]
-    return transformed_data
+async def get_confirmed_orders(request: Request, buyer_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("buyer_id", buyer_id).eq("accepted", True).eq("paid",False),
+        fields, CONFIRMED_ORDER_FIELDS, cursor, limit, default=",".join(CONFIRMED_ORDER_FIELDS.values()),
+    )
 
 @app.get("/get_seller_score")
 async def get_seller_score(seller_id: int):
-    response = supabase.table("users").select("score").eq("id", seller_id).execute()
-    return response.data
+    async def load():
+        return (await db.supabase.table("users").select("score").eq("id", seller_id).execute()).data
+    return await cache.get_or_load(f"seller_score:{seller_id}", load)
 
 @app.post("/remove_listing")
 async def remove_listing(seller_id: int, item_id: int):
-    response = (
-        supabase.table("seller_items")
+    response = await (
+        db.supabase.table("seller_items")
         .delete()
         .eq("seller_id", seller_id)
         .eq("id", item_id)
         .execute()
     )
+    await invalidate_catalogue()
     return response.data
 
 @app.post("/update_listing")
 async def update_listing(seller_id: int, item_id: int, product_name: str, price: float, quantity: int):
-    response = (
-        supabase.table("seller_items")
+    response = await (
+        db.supabase.table("seller_items")
         .update({"product_name": product_name, "price": price, "quantity": quantity})
         .eq("seller_id", seller_id)
         .eq("id", item_id)
         .execute()
     )
+    await invalidate_catalogue()
     return response.data
 
+class Listing(BaseModel):
+    product_name: str
+    price: float
+    quantity: int
+
+class ListingUpdate(Listing):
+    item_id: int
+
+@app.post("/update_listings")
+async def update_listings(seller_id: int, listings: List[ListingUpdate]):
+    updated = await db.update_listings(seller_id, [
+        {"id": listing.item_id, "product_name": listing.product_name, "price": listing.price, "quantity": listing.quantity}
+        for listing in listings
+    ])
+    await invalidate_catalogue()
+    by_id = {item["id"]: item for item in updated}
+    return [
+        {"status": "success", "data": by_id[listing.item_id]} if listing.item_id in by_id
+        else {"status": "error", "item_id": listing.item_id, "message": "Item not found"}
+        for listing in listings
+    ]
+
 @app.post("/order_delivered")
 async def order_delivered(order_id: int):
-    response = (
-        supabase.table("orders")
-        .update({"delivered": True , "delivered_at": "now()"})
-        .eq("id", order_id)
-        .execute()
-    )
-    shipment_expected_date = supabase.table("orders").select("shipment_expected_date").eq("id", order_id).execute().data[0]["shipment_expected_date"]
-    delivery_data = supabase.table("orders").select("delivered_at").eq("id", order_id).execute().data[0]["delivered_at"]
-    seller_id = supabase.table("orders").select("seller_id").eq("id", order_id).execute().data[0]["seller_id"]
-    if delivery_data > shipment_expected_date:
-        current_score = supabase.table("users").select("score").eq("id", seller_id).execute().data[0]["score"]
-        response_ = (
-            supabase.table("users")
-            .update({"score": current_score - 1})
-            .eq("id", seller_id)
-            .execute()
-        )
-    return response.data
+    order = await db.update_order(order_id, {"delivered": True , "delivered_at": "now()"})
+    if not order:
+        return []
+    order_events.publish([order])
+    await order_jobs.refresh_merkle_root(order_id)
+    shipment_expected_date = order["shipment_expected_date"]
+    if shipment_expected_date and order["delivered_at"] > shipment_expected_date:
+        await jobs.enqueue("rescore", f"rescore:{order_id}", {"order_id": order_id, "seller_id": order["seller_id"]}, order_id=order_id)
+    return [order]
+
+async def chat_message(request: Request):
+    # {"message": "..."} body, or the app's JSON array (body or `chat` header) whose last entry is the question
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if body is None and request.headers.get('chat'):
+        try:
+            body = json.loads(request.headers['chat'])
+        except ValueError:
+            body = [request.headers['chat']]
+    if isinstance(body, dict):
+        return body.get("message")
+    if isinstance(body, list) and body:
+        return str(body[-1])
+    return None
 
 @app.post("/chatbot")
-async def chatbot(request: Request):
-    arr = request.headers.get('chat')
-    if not arr:
+async def chatbot(request: Request, thread_id: str = None):
+    message = await chat_message(request)
+    if not message:
         return {"status": "error", "message": "Empty array"}
-    chatbot_response = chatbot_test(arr)
-    return {"status": "success", "message": chatbot_response}
+    thread_id = thread_id or chat().new_thread_id()
+    if "text/event-stream" in request.headers.get("accept", ""):
+        async def events():
+            async for token in chat().stream_reply(message, thread_id):
+                yield f"data: {json.dumps(token)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"X-Thread-Id": thread_id, "Cache-Control": "no-cache"})
+    chatbot_response = await chat().reply(message, thread_id)
+    return {"status": "success", "message": chatbot_response, "thread_id": thread_id}
 
 @app.post("/update_shipment_details")
 async def update_shipment_details(order_id: int, tracking_id: int , shipment_company_name: str, shipment_company_contact: str, shipment_expected_date: str):
-    response = (
-        supabase.table("orders")
+    response = await (
+        db.supabase.table("orders")
         .update({"tracking_id": tracking_id, "shipment_company_name": shipment_company_name, "shipment_company_contact": shipment_company_contact, "shipment_expected_date": shipment_expected_date , "shipped": True})
         .eq("id", order_id)
         .execute()
     )
+    order_events.publish(response.data)
     return response.data
 @app.post("/received_shipment")
 async def received_shipment(order_id: int):
-    response = (
-        supabase.table("orders")
+    response = await (
+        db.supabase.table("orders")
         .update({"received": True})
         .eq("id", order_id)
         .execute()
     )
+    order_events.publish(response.data)
     return response.data
 
 
 @app.get("/get_past_orders")
-async def get_past_orders(buyer_id: int):
-    response = supabase.table("orders").select("*").eq("buyer_id", buyer_id).eq("delivered", True).eq("received",True).execute()
-    return response.data
-
+async def get_past_orders(request: Request, buyer_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("buyer_id", buyer_id).eq("delivered", True).eq("received",True),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.get("/get_active_orders_payment_not_done")
 async def get_active_orders_payment_not_done(order_id: int):
-    response = supabase.table("orders").select("*").eq("id", order_id).eq("accepted", True).eq("paid", False).execute()
+    response = await db.supabase.table("orders").select("*").eq("id", order_id).eq("accepted", True).eq("paid", False).execute()
     return response.data
 
 @app.get("/get_active_orders_payment_confirmed")
-async def get_active_orders_payment_confirmed(buyer_id: int):
-    response = supabase.table("orders").select("*").eq("buyer_id", buyer_id).eq("accepted", True).eq("paid", True).eq("received",False).execute()
-    return response.data
+async def get_active_orders_payment_confirmed(request: Request, buyer_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("buyer_id", buyer_id).eq("accepted", True).eq("paid", True).eq("received",False),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.get("/get_wating_orders")
-async def get_wating_orders(buyer_id: int):
-    response = supabase.table("orders").select("*").eq("buyer_id", buyer_id).eq("accepted", False).execute()
-    return response.data
+async def get_wating_orders(request: Request, buyer_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("buyer_id", buyer_id).eq("accepted", False),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.post("/payment_confirmed")
 async def payment_confirmed(order_id: int):
-    response = (
-        supabase.table("orders")
+    response = await (
+        db.supabase.table("orders")
         .update({"paid": True , "paid_at": "now()"})
         .eq("id", order_id)
         .execute()
     )
+    order_events.publish(response.data)
+    if response.data:
+        await order_jobs.refresh_merkle_root(order_id)
     return response
 
 @app.post("/reject_order")
 async def reject_order(order_id: int):
-    response = (
-        supabase.table("orders")
+    response = await (
+        db.supabase.table("orders")
         .delete()
         .eq("id", order_id)
         .execute()
     )
+    order_trees.discard(order_id)
+    order_events.publish_removed(response.data)
     return response
 
 @app.post("/accept_order")
 async def accept_order(order_id: int):
-    order = supabase.table("orders").select("*").eq("id", order_id).execute()
-    buyer_adress = supabase.table("users").select("wallet_address").eq("id", order.data[0]["buyer_id"]).execute().data[0]["wallet_address"]
-    seller_adress = supabase.table("users").select("wallet_address").eq("id", order.data[0]["seller_id"]).execute().data[0]["wallet_address"]
-
-    contract_adress = deploy_contract(buyer_adress,seller_adress)
-
-    supabase.table("orders").update({"contract_address": contract_adress}).eq("id", order_id).execute()
-
-    if not order.data:
-        return {"status": "error", "message": "Order not found"}
-    
-    item_id = order.data[0]["item_id"]
-    order_quantity = order.data[0]["quantity"]
-    
-    supabase.table("seller_items")\
-        .update({"quantity": supabase.table("seller_items")\
-            .select("quantity")\
-            .eq("id", item_id)\
-            .execute()\
-            .data[0]["quantity"] - order_quantity})\
-        .eq("id", item_id)\
-        .execute()
-    
-    response = (
-        supabase.table("orders")
-        .update({"accepted": True, "accepted_at": "now()"})
-        .eq("id", order_id)
-        .execute()
+    # Claims the order and decrements stock atomically in Postgres
+    try:
+        accepted = await db.accept_order(order_id)
+    except APIError as e:
+        return {"status": "error", "message": e.message}
+    if not accepted:
+        return {"status": "error", "message": "Order not found or already accepted"}
+    order_events.publish([accepted])
+    await invalidate_catalogue()
+    await order_jobs.refresh_merkle_root(order_id)
+
+    # Deployed by the job worker; contract_address is written when the receipt arrives
+    await jobs.enqueue("deploy", order_jobs.deploy_key(order_id), {"order_id": order_id}, order_id=order_id)
+
+    return {"status": "pending", "data": [accepted]}
+
+@app.get("/deployment_status")
+async def deployment_status(order_id: int):
+    job, rows = await asyncio.gather(
+        jobs.get_store().get(order_jobs.deploy_key(order_id)),
+        db.supabase.table("orders").select("contract_address").eq("id", order_id).execute(),
     )
-    return response.data
+    contract_address = rows.data[0]["contract_address"] if rows.data else None
+    if contract_address:
+        status = "deployed"
+    elif job:
+        status = {"pending": "queued", "running": "deploying"}.get(job["status"], job["status"])
+    else:
+        status = "unknown"
+    return {"status": status, "contract_address": contract_address, "attempts": job and job["attempts"], "error": job and job["last_error"]}
+
+@app.get("/order_jobs")
+async def order_jobs_status(order_id: int):
+    return await jobs.get_store().for_order(order_id)
+
+@app.get("/order_events")
+async def order_events_stream(role: str, user_id: int, snapshot: bool = True):
+    # SSE feed of order state changes for one buyer or seller; replaces polling the order lists
+    if role not in order_events.ROLES:
+        return {"status": "error", "message": f"role must be one of {sorted(order_events.ROLES)}"}
+    async def events():
+        async for event in order_events.subscription(db.supabase, role, user_id, snapshot):
+            yield ": keepalive\n\n" if event is None else f"data: {json.dumps(event, default=str)}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/ws/order_events")
+async def order_events_socket(websocket: WebSocket, role: str, user_id: int, snapshot: bool = True):
+    if role not in order_events.ROLES:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        async for event in order_events.subscription(db.supabase, role, user_id, snapshot):
+            await websocket.send_text(json.dumps(event or {"type": "heartbeat"}, default=str))
+    except WebSocketDisconnect:
+        pass
 
 @app.post("/paid_order")
 async def paid_order(order_id: int):
-    response = (
-        supabase.table("orders")
+    response = await (
+        db.supabase.table("orders")
         .update({"paid": True,"paid_at": "now()"})
         .eq("id", order_id)
         .execute()
     )
+    order_events.publish(response.data)
+    if response.data:
+        await order_jobs.refresh_merkle_root(order_id)
     return response
 
 @app.post("/check_sellers_orders")
-async def check_sellers_orders(seller_id: int):
-    response = supabase.table("orders").select("*").eq("seller_id", seller_id).execute()
-    return response.data
+async def check_sellers_orders(request: Request, seller_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("seller_id", seller_id),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.get("/get_accepted_orders")
-async def get_accepted_orders(seller_id: int):
-    response = supabase.table("orders").select("*").eq("seller_id", seller_id).eq("accepted", True).eq("delivered",False).execute()
-    return response.data
-
+async def get_accepted_orders(request: Request, seller_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("seller_id", seller_id).eq("accepted", True).eq("delivered",False),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.get("/not_accepted_orders")
-async def not_accepted_orders(seller_id: int):
-    response = supabase.table("orders").select("*").eq("seller_id", seller_id).eq("accepted", False).eq("delivered",False).execute()
-    return response.data
+async def not_accepted_orders(request: Request, seller_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("seller_id", seller_id).eq("accepted", False).eq("delivered",False),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.get("/get_seller_past_orders")
-async def get_seller_past_orders(seller_id: int):
-    response = supabase.table("orders").select("*").eq("seller_id", seller_id).eq("accepted",True).eq("delivered", True).execute()
-    return response.data
+async def get_seller_past_orders(request: Request, seller_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("orders").select(columns).eq("seller_id", seller_id).eq("accepted",True).eq("delivered", True),
+        fields, ORDER_COLUMNS, cursor, limit,
+    )
 
 @app.get("/check_suspecious_transactions")
 async def check_suspecious_transactions(order_id: int):
-    contract_address = supabase.table("orders").select("contract_address").eq("id", order_id).execute().data[0]["contract_address"]
-    buyer_address = supabase.table("users").select("wallet_address").eq("id", supabase.table("orders").select("buyer_id").eq("id", order_id).execute().data[0]["buyer_id"]).execute().data[0]["wallet_address"]
-    seller_address = supabase.table("users").select("wallet_address").eq("id", supabase.table("orders").select("seller_id").eq("id", order_id).execute().data[0]["seller_id"]).execute().data[0]["wallet_address"]
-    return detect_sus(contract_address, buyer_address, seller_address)
+    order = await db.get_order_with_parties(order_id)
+    return await sus_detector.detect_sus(db.supabase, order["contract_address"], order["buyer"]["wallet_address"], order["seller"]["wallet_address"], explorer)
+
+@app.post("/index_escrow_events")
+async def index_escrow_events():
+    return {"applied": await event_indexer.index_once(db.supabase, chain_client.get_client())}
+
+@app.post("/scan_transactions")
+async def scan_transactions():
+    return await jobs.enqueue("scan", "scan", rerun=True)
 
 
 @app.post("/login")
 async def login_user(email: str, password: str):
     response = (
-        supabase.table("users").select("*").eq("email_id", email).execute()
+        await db.supabase.table("users").select("id, type, password").eq("email_id", email).execute()
     )
     
     if not response.data:
         return {"status": "error", "message": "User not found"}
-    stored_password = response.data[0]["password"]
-    if bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8')):
-        return {"status": "success", "type": response.data[0]["type"] , "id": response.data[0]["id"]}
+    user = response.data[0]
+    try:
+        valid = await passwords.verify_password(password, user["password"])
+    except passwords.PasswordPoolBusy:
+        return JSONResponse({"status": "error", "message": "Server busy, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+    if valid:
+        if passwords.needs_rehash(user["password"]):
+            spawn(rehash_password(user["id"], password))
+        return {"status": "success", "type": user["type"] , "id": user["id"]}
     else:
         return {"status": "error", "message": "Invalid password"}
 
+async def rehash_password(user_id: int, password: str):
+    # Upgrade the stored hash to the current BCRYPT_ROUNDS after a successful login
+    try:
+        hashed = await passwords.hash_password(password)
+    except passwords.PasswordPoolBusy:
+        return
+    await db.supabase.table("users").update({"password": hashed}).eq("id", user_id).execute()
+
+@app.get("/seller_dashboard")
+async def seller_dashboard(seller_id: int):
+    # Precomputed by the orders trigger; replaces assembling the full order lists
+    dashboard = await seller_stats.get_dashboard(db.supabase, seller_id)
+    return dashboard or {"status": "error", "message": "Seller not found"}
+
+@app.post("/rebuild_seller_stats")
+async def rebuild_seller_stats():
+    return await jobs.enqueue("rebuild_seller_stats", "rebuild_seller_stats", rerun=True)
+
 @app.get("/pseudo_balance_seller")
 async def pseudo_balance_seller(seller_id: int):
-    response = supabase.table("users").select("pseudo_balance").eq("id", seller_id).execute()
-    return response.data
+    async def load():
+        return (await db.supabase.table("users").select("pseudo_balance").eq("id", seller_id).execute()).data
+    return await cache.get_or_load(f"pseudo_balance:{seller_id}", load)
 
 @app.post("/add_pseudo_balance")
 async def add_pseudo_balance(seller_id: int , contract_address: str):
-    current_pseudo_balance = supabase.table("users").select("pseudo_balance").eq("id", seller_id).execute().data[0]["pseudo_balance"]
-    new_pseudo_balance = current_pseudo_balance + get_pseudo_balance(contract_address, seller_id)
-    response = (
-        supabase.table("users")
-        .update({"pseudo_balance": new_pseudo_balance})
-        .eq("id", seller_id)
-        .execute()
+    wallet_address = (await db.supabase.table("users").select("wallet_address").eq("id", seller_id).execute()).data[0]["wallet_address"]
+    contract_balance = await get_pseudo_balance(contract_address, wallet_address)
+    new_pseudo_balance = (await db.supabase.rpc("increment_pseudo_balance", {"p_user_id": seller_id, "p_amount": contract_balance}).execute()).data
+    await cache.invalidate(f"pseudo_balance:{seller_id}")
+    return [{"pseudo_balance": new_pseudo_balance}]
+
+@app.get("/seller_onchain_balance")
+async def seller_onchain_balance(seller_id: int):
+    # One multicall over every escrow the seller is party to
+    seller, orders = await asyncio.gather(
+        db.supabase.table("users").select("wallet_address").eq("id", seller_id).execute(),
+        db.supabase.table("orders").select("contract_address").eq("seller_id", seller_id).not_.is_("contract_address", "null").execute(),
     )
-    return response.data
+    contracts = [order["contract_address"] for order in orders.data]
+    try:
+        total = await get_total_pseudo_balance(contracts, seller.data[0]["wallet_address"])
+    except RuntimeError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=502)
+    return {"seller_id": seller_id, "contracts": len(contracts), "pseudo_balance": total}
+
+@app.post("/recompute_pseudo_balances")
+async def recompute_pseudo_balances():
+    return {"updated": await balances.recompute_all_seller_balances(db.supabase, cache)}
 
 @app.post("/create_seller_products")
 async def create_seller_products(seller_id: int, product_name: str, price: float, quantity: int):
-    response = (
-        supabase.table("seller_items")
+    response = await (
+        db.supabase.table("seller_items")
         .insert({"seller_id": seller_id , "product_name": product_name , "price": price , "quantity": quantity})
         .execute()
     )
+    await invalidate_catalogue()
     return response
 
 @app.get("/get_seller_products")
-async def get_seller_products(seller_id: int):
-    response = supabase.table("seller_items").select("*").eq("seller_id", seller_id).execute()
-    return response.data
+async def get_seller_products(request: Request, seller_id: int, cursor: int = None, limit: int = None, fields: str = None):
+    return await paginated_response(
+        request,
+        lambda columns: db.supabase.table("seller_items").select(columns).eq("seller_id", seller_id),
+        fields, ITEM_COLUMNS, cursor, limit,
+    )
 
 @app.get("/get_seller_product")
 async def get_seller_product(seller_id: int, product_id: int):
-    response = supabase.table("seller_items").select("*").eq("seller_id", seller_id).eq("id", product_id).execute()
+    response = await db.supabase.table("seller_items").select("*").eq("seller_id", seller_id).eq("id", product_id).execute()
     return response.data
 
 @app.post("/create_seller_product")
 async def create_seller_product(seller_id: int, product_name: str, price: float, quantity: int):
-    response = (
-        supabase.table("seller_items")
+    response = await (
+        db.supabase.table("seller_items")
         .insert({"seller_id": seller_id , "product_name": product_name , "price": price , "quantity": quantity})
         .execute()
     )
+    await invalidate_catalogue()
     return {'status': 'success'}
 
+@app.post("/create_seller_products_bulk")
+async def create_seller_products_bulk(seller_id: int, listings: List[Listing]):
+    if not listings:
+        return []
+    response = await (
+        db.supabase.table("seller_items")
+        .insert([{"seller_id": seller_id, "product_name": listing.product_name, "price": listing.price, "quantity": listing.quantity} for listing in listings])
+        .execute()
+    )
+    await invalidate_catalogue()
+    return [{"status": "success", "data": item} for item in response.data]
+
+CATALOGUE_FIELDS = {
+    **{column: column for column in ["id", "product_name", "quantity", "price", "seller_id"]},
+    "seller_name": "...users!seller_items_seller_id_fkey(seller_name:name)",
+}
+CATALOGUE_COLUMNS = ",".join(CATALOGUE_FIELDS.values())
+
+def catalogue_query(columns: str, min_price: float = None, max_price: float = None, name: str = None):
+    query = db.supabase.table("seller_items").select(columns)
+    if min_price is not None:
+        query = query.gte("price", min_price)
+    if max_price is not None:
+        query = query.lte("price", max_price)
+    if name:
+        query = query.ilike("product_name", f"%{name}%")
+    return query
+
+async def load_catalogue():
+    rows = [row async for rows in iter_pages(lambda: catalogue_query(CATALOGUE_COLUMNS)) for row in rows]
+    return {"etag": etag_for(rows), "data": rows}
+
 @app.get("/get_all_sellers_product")
-async def get_all_sellers_product():
-    response = supabase.table("seller_items").select(
-        "*, users!seller_items_seller_id_fkey(name:name)"
-    ).execute()
-    transformed_data = [{
-        "id": item["id"],
-        "product_name": item["product_name"],
-        "quantity": item["quantity"],
-        "price": item["price"],
-        "seller_name": item["users"]["name"],
-        "seller_id": item["seller_id"]
-    } for item in response.data]
-    return transformed_data
+async def get_all_sellers_product(request: Request, cursor: int = None, limit: int = None, fields: str = None, min_price: float = None, max_price: float = None, name: str = None):
+    if cursor is not None or limit is not None or fields or min_price is not None or max_price is not None or name or wants_ndjson(request):
+        return await paginated_response(
+            request,
+            lambda columns: catalogue_query(columns, min_price, max_price, name),
+            fields, CATALOGUE_FIELDS, cursor, limit, default=CATALOGUE_COLUMNS,
+        )
+    # The unfiltered catalogue is what the app loads on open: cached, with ETag
+    catalogue = await cache.get_or_load("catalogue", load_catalogue)
+    headers = {"ETag": catalogue["etag"], "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == catalogue["etag"]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(catalogue["data"], headers=headers)
@@ -1,31 +1,155 @@
 import hashlib
-from typing import List
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
 
-def hash_leaf(value: str) -> str:
-    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+_sha256 = hashlib.sha256
 
-def hash_nodes(left: str, right: str) -> str:
-    combined = left + right
-    return hashlib.sha256(combined.encode('utf-8')).hexdigest()
+# Order columns committed to by an order's merkle_root, in leaf order
+ORDER_FIELDS = ['id', 'buyer_id', 'seller_id', 'item_id', 'quantity', 'cost', 'accepted', 'delivered', 'paid']
 
-def build_merkle_tree(leaves: List[str]) -> List[str]:
+def hash_leaf(value: str) -> bytes:
+    return _sha256(value.encode('utf-8')).digest()
+
+def hash_nodes(left: bytes, right: bytes) -> bytes:
+    return _sha256(left + right).digest()
+
+def _next_level(level: List[bytes]) -> List[bytes]:
+    # An odd node out is paired with itself
+    if len(level) % 2:
+        level = level + level[-1:]
+    return [_sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+
+
+class MerkleTree:
+    # Keeps every level as raw digests so a single leaf change re-hashes only
+    # its path to the root. Hex is produced only for roots and proofs.
+
+    def __init__(self, leaves: Sequence[str]):
+        self.leaves = [str(leaf) for leaf in leaves]
+        self.levels = [[hash_leaf(leaf) for leaf in self.leaves]]
+        while len(self.levels[-1]) > 1:
+            self.levels.append(_next_level(self.levels[-1]))
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0] if self.leaves else b''
+
+    @property
+    def root_hex(self) -> str:
+        return self.root.hex()
+
+    def update(self, index: int, value: str):
+        self.leaves[index] = str(value)
+        self.levels[0][index] = hash_leaf(self.leaves[index])
+        for depth in range(1, len(self.levels)):
+            level = self.levels[depth - 1]
+            left = index & ~1
+            right = left + 1 if left + 1 < len(level) else left
+            index >>= 1
+            self.levels[depth][index] = hash_nodes(level[left], level[right])
+
+    def set_leaves(self, leaves: Sequence[str]) -> int:
+        # Applies only the leaves that differ; returns how many changed
+        leaves = [str(leaf) for leaf in leaves]
+        if len(leaves) != len(self.leaves):
+            self.__init__(leaves)
+            return len(leaves)
+        changed = [i for i, (old, new) in enumerate(zip(self.leaves, leaves)) if old != new]
+        for i in changed:
+            self.update(i, leaves[i])
+        return len(changed)
+
+    def proof(self, index: int) -> List[Tuple[str, str]]:
+        # (sibling hash hex, side of the sibling) from leaf level up to the root
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling >= len(level):
+                sibling = index
+            path.append((level[sibling].hex(), 'left' if sibling < index else 'right'))
+            index >>= 1
+        return path
+
+
+def verify_proof(leaf: str, proof: Sequence[Tuple[str, str]], root: str) -> bool:
+    node = hash_leaf(str(leaf))
+    for sibling_hex, side in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = hash_nodes(sibling, node) if side == 'left' else hash_nodes(node, sibling)
+    return node.hex() == root
+
+def build_merkle_tree(leaves: List[str]) -> str:
+    if not leaves:
+        return ''
+    level = [_sha256(leaf.encode('utf-8')).digest() for leaf in leaves]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+def build_merkle_roots(leaf_rows: Sequence[Sequence[str]]) -> List[str]:
+    # Bulk mode: trees of the same width are hashed level by level across the
+    # whole batch, so each level is one comprehension instead of one per tree.
+    roots = [''] * len(leaf_rows)
+    by_width: Dict[int, List[int]] = {}
+    for i, row in enumerate(leaf_rows):
+        if row:
+            by_width.setdefault(len(row), []).append(i)
+    for width, rows in by_width.items():
+        levels = [[_sha256(str(leaf).encode('utf-8')).digest() for leaf in leaf_rows[i]] for i in rows]
+        while width > 1:
+            if width % 2:
+                levels = [level + level[-1:] for level in levels]
+                width += 1
+            levels = [[_sha256(level[j] + level[j + 1]).digest() for j in range(0, width, 2)] for level in levels]
+            width //= 2
+        for i, level in zip(rows, levels):
+            roots[i] = level[0].hex()
+    return roots
+
+def order_leaves(order: dict) -> List[str]:
+    return [str(order[field]) for field in ORDER_FIELDS]
+
+
+class MerkleStore:
+    # Bounded LRU of per-key trees so recomputing a root after one field
+    # flips (e.g. paid) costs O(log n) hashes instead of a full rebuild.
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._trees: 'OrderedDict[object, MerkleTree]' = OrderedDict()
+
+    def tree(self, key, leaves: Sequence[str]) -> MerkleTree:
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = MerkleTree(leaves)
+            self._trees[key] = tree
+            if len(self._trees) > self.max_size:
+                self._trees.popitem(last=False)
+        else:
+            tree.set_leaves(leaves)
+            self._trees.move_to_end(key)
+        return tree
+
+    def discard(self, key):
+        self._trees.pop(key, None)
+
+
+def legacy_build_merkle_tree(leaves: List[str]) -> str:
+    # Original hex-concatenating construction. backfill_merkle_roots uses it
+    # to find roots stored before the binary path; also benchmarked.
     if not leaves:
-        return ['']
-    
-    current_level = [hash_leaf(leaf) for leaf in leaves]
-    
+        return ''
+    current_level = [hashlib.sha256(leaf.encode('utf-8')).hexdigest() for leaf in leaves]
     while len(current_level) > 1:
         next_level = []
         for i in range(0, len(current_level), 2):
             left = current_level[i]
             right = current_level[i + 1] if i + 1 < len(current_level) else current_level[i]
-            parent_hash = hash_nodes(left, right)
-            next_level.append(parent_hash)
+            next_level.append(hashlib.sha256((left + right).encode('utf-8')).hexdigest())
         current_level = next_level
-    
-    return current_level[0]  
+    return current_level[0]
 
 
 if __name__ == '__main__':
     leaves = ['a', 'b', 'c', 'd']
-    print(build_merkle_tree(leaves))
\ No newline at end of file
+    print(build_merkle_tree(leaves))
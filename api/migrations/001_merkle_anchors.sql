@@ -0,0 +1,48 @@
+-- Periodic on-chain anchoring of order merkle roots (anchor.py)
+
+create table if not exists merkle_anchors (
+    id bigint generated always as identity primary key,
+    root text not null,
+    tx_hash text not null,
+    order_count integer not null,
+    created_at timestamptz not null default now()
+);
+
+alter table orders add column if not exists anchor_id bigint references merkle_anchors (id);
+alter table orders add column if not exists anchor_proof jsonb;
+
+create index if not exists orders_unanchored_idx
+    on orders (id)
+    where anchor_id is null and merkle_root is not null;
+
+-- A new merkle_root invalidates the order's previous anchor
+create or replace function orders_reset_anchor() returns trigger
+language plpgsql as $$
+begin
+    if new.merkle_root is distinct from old.merkle_root then
+        new.anchor_id := null;
+        new.anchor_proof := null;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists orders_reset_anchor on orders;
+create trigger orders_reset_anchor
+    before update of merkle_root on orders
+    for each row execute function orders_reset_anchor();
+
+-- Stores every order's inclusion proof for one anchor in a single round trip.
+-- Rows whose merkle_root changed after the anchor was built are skipped.
+create or replace function apply_anchor_proofs(p_anchor_id bigint, p_proofs jsonb)
+returns integer
+language sql as $$
+    with updated as (
+        update orders o
+        set anchor_id = p_anchor_id, anchor_proof = p.proof
+        from jsonb_to_recordset(p_proofs) as p (id bigint, merkle_root text, proof jsonb)
+        where o.id = p.id and o.merkle_root = p.merkle_root
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;
@@ -0,0 +1,38 @@
+-- Atomic replacements for the read-modify-write updates in main.py (db.py)
+
+create or replace function decrement_item_stock(p_item_id bigint, p_amount integer)
+returns integer
+language plpgsql as $$
+declare
+    remaining integer;
+begin
+    update seller_items
+    set quantity = quantity - p_amount
+    where id = p_item_id and quantity >= p_amount
+    returning quantity into remaining;
+    if not found then
+        raise exception 'Insufficient stock for item %', p_item_id;
+    end if;
+    return remaining;
+end;
+$$;
+
+-- Claims the order and takes its stock in one transaction; returns no row if
+-- the order was already accepted, and rolls back if stock is insufficient.
+create or replace function accept_order(p_order_id bigint)
+returns setof orders
+language plpgsql as $$
+declare
+    accepted_order orders;
+begin
+    update orders
+    set accepted = true, accepted_at = now()
+    where id = p_order_id and accepted = false
+    returning * into accepted_order;
+    if not found then
+        return;
+    end if;
+    perform decrement_item_stock(accepted_order.item_id, accepted_order.quantity);
+    return next accepted_order;
+end;
+$$;
@@ -0,0 +1,23 @@
+-- Composite indexes for the filtered, id-ordered list endpoints (pagination.py)
+
+create extension if not exists pg_trgm;
+
+-- Buyer views: waiting, confirmed, payment confirmed, past
+create index if not exists orders_buyer_state_idx
+    on orders (buyer_id, accepted, paid, received, id);
+create index if not exists orders_buyer_delivered_idx
+    on orders (buyer_id, delivered, received, id);
+
+-- Seller views: all, accepted, not accepted, past
+create index if not exists orders_seller_idx
+    on orders (seller_id, id);
+create index if not exists orders_seller_state_idx
+    on orders (seller_id, accepted, delivered, id);
+
+-- Catalogue: seller listings, price range and name search
+create index if not exists seller_items_seller_idx
+    on seller_items (seller_id, id);
+create index if not exists seller_items_price_idx
+    on seller_items (price, id);
+create index if not exists seller_items_name_trgm_idx
+    on seller_items using gin (product_name gin_trgm_ops);
@@ -0,0 +1,20 @@
+-- Local index of explorer transactions per escrow contract (sus_detector.py)
+
+create table if not exists scanned_contracts (
+    contract_address text primary key,
+    last_block bigint not null default 0,
+    scanned_at timestamptz not null default now()
+);
+
+create table if not exists indexed_transactions (
+    hash text primary key,
+    contract_address text not null,
+    block_number bigint not null,
+    from_address text not null,
+    to_address text not null,
+    value numeric not null,
+    timestamp bigint not null
+);
+
+create index if not exists indexed_transactions_contract_idx
+    on indexed_transactions (contract_address, block_number);
@@ -0,0 +1,60 @@
+-- On-chain escrow event ingest (event_indexer.py)
+
+create table if not exists indexer_checkpoints (
+    name text primary key,
+    last_block bigint not null,
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists escrow_events (
+    tx_hash text not null,
+    log_index integer not null,
+    block_number bigint not null,
+    contract_address text not null,
+    event text not null,
+    args jsonb not null,
+    primary key (tx_hash, log_index)
+);
+
+create index if not exists escrow_events_contract_idx
+    on escrow_events (contract_address, block_number);
+
+create index if not exists orders_contract_address_lower_idx
+    on orders (lower(contract_address));
+
+-- Records decoded logs and applies each one's order state effect exactly once,
+-- so replaying a block range after a restart is harmless.
+create or replace function apply_escrow_events(p_events jsonb)
+returns integer
+language plpgsql as $$
+declare
+    e record;
+    applied integer := 0;
+begin
+    for e in
+        insert into escrow_events (tx_hash, log_index, block_number, contract_address, event, args)
+        select x.tx_hash, x.log_index, x.block_number, lower(x.contract_address), x.event, x.args
+        from jsonb_to_recordset(p_events)
+            as x (tx_hash text, log_index integer, block_number bigint, contract_address text, event text, args jsonb)
+        on conflict do nothing
+        returning *
+    loop
+        applied := applied + 1;
+        if e.event = 'AmountDeposited' then
+            update orders
+            set paid = true, paid_at = coalesce(paid_at, now())
+            where lower(contract_address) = e.contract_address;
+        elsif e.event = 'DeliveryConfirmed'
+            and (e.args ->> 'isBuyerConfirmed')::boolean
+            and (e.args ->> 'isSellerConfirmed')::boolean then
+            update orders
+            set delivered = true, delivered_at = coalesce(delivered_at, now())
+            where lower(contract_address) = e.contract_address;
+        end if;
+        -- AmountTransferred is only recorded: users.pseudo_balance is written by
+        -- /add_pseudo_balance and the on-chain recompute (balances.py), and a
+        -- third writer here would credit the same transfer twice
+    end loop;
+    return applied;
+end;
+$$;
@@ -0,0 +1,24 @@
+-- Atomic pseudo balance writes (contract_functions.py, main.py)
+
+create or replace function increment_pseudo_balance(p_user_id bigint, p_amount numeric)
+returns numeric
+language sql as $$
+    update users
+    set pseudo_balance = coalesce(pseudo_balance, 0) + p_amount
+    where id = p_user_id
+    returning pseudo_balance;
+$$;
+
+-- Bulk reconciliation: sets each seller's balance to its on-chain total
+create or replace function set_pseudo_balances(p_balances jsonb)
+returns integer
+language sql as $$
+    with updated as (
+        update users u
+        set pseudo_balance = b.balance
+        from jsonb_to_recordset(p_balances) as b (id bigint, balance numeric)
+        where u.id = b.id
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;
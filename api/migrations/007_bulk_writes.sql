@@ -0,0 +1,22 @@
+-- Bulk order and listing writes (main.py /create_orders, /update_listings)
+
+-- Hands out order ids up front so merkle roots, which hash the id, can be
+-- computed before the batch insert instead of read back and updated per row.
+create or replace function reserve_order_ids(p_count integer)
+returns bigint[]
+language sql as $$
+    select coalesce(array_agg(nextval(pg_get_serial_sequence('orders', 'id'))), '{}')
+    from generate_series(1, p_count);
+$$;
+
+-- Updates many of one seller's listings in a single statement; items owned by
+-- another seller are left untouched and simply not returned.
+create or replace function update_listings(p_seller_id bigint, p_items jsonb)
+returns setof seller_items
+language sql as $$
+    update seller_items s
+    set product_name = i.product_name, price = i.price, quantity = i.quantity
+    from jsonb_to_recordset(p_items) as i (id bigint, product_name text, price numeric, quantity integer)
+    where s.id = i.id and s.seller_id = p_seller_id
+    returning s.*;
+$$;
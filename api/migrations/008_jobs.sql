@@ -0,0 +1,120 @@
+-- Durable background jobs (jobs.py, worker.py)
+
+create table if not exists jobs (
+    id bigint generated always as identity primary key,
+    kind text not null,
+    key text not null unique,
+    order_id bigint,
+    payload jsonb not null default '{}',
+    status text not null default 'pending' check (status in ('pending', 'running', 'done', 'failed')),
+    attempts integer not null default 0,
+    run_at timestamptz not null default now(),
+    locked_by text,
+    locked_until timestamptz,
+    last_error text,
+    result jsonb,
+    -- enqueue_job(p_rerun) on a running job: queue it again once this run ends
+    rerun_requested boolean not null default false,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists jobs_due_idx
+    on jobs (run_at)
+    where status in ('pending', 'running');
+create index if not exists jobs_order_idx
+    on jobs (order_id)
+    where order_id is not null;
+
+-- Idempotent on key: an existing job is returned unchanged, unless p_rerun is
+-- set, in which case it is queued again. A running job is never reset under
+-- its worker; it is flagged instead, and complete_job/fail_job put it back to
+-- pending when that run ends, so two runs of one key never overlap.
+create or replace function enqueue_job(p_kind text, p_key text, p_payload jsonb, p_order_id bigint default null, p_rerun boolean default false)
+returns setof jobs
+language plpgsql as $$
+begin
+    return query
+        insert into jobs (kind, key, payload, order_id)
+        values (p_kind, p_key, coalesce(p_payload, '{}'), p_order_id)
+        on conflict (key) do nothing
+        returning *;
+    if found then
+        return;
+    end if;
+    if p_rerun then
+        return query
+            update jobs
+            set rerun_requested = status = 'running',
+                status = case when status = 'running' then status else 'pending' end,
+                payload = coalesce(p_payload, '{}'),
+                attempts = case when status = 'running' then attempts else 0 end,
+                run_at = case when status = 'running' then run_at else now() end,
+                last_error = case when status = 'running' then last_error end,
+                result = case when status = 'running' then result end,
+                updated_at = now()
+            where key = p_key
+            returning *;
+        return;
+    end if;
+    return query select * from jobs where key = p_key;
+end;
+$$;
+
+-- Leases due jobs to one worker. Jobs whose lease expired (worker died) are
+-- picked up again, which also satisfies a rerun requested during the lost run;
+-- skip locked lets several workers poll concurrently.
+create or replace function claim_jobs(p_worker text, p_limit integer, p_lease_seconds double precision)
+returns setof jobs
+language sql as $$
+    update jobs j
+    set status = 'running', attempts = j.attempts + 1, locked_by = p_worker, rerun_requested = false,
+        locked_until = now() + make_interval(secs => p_lease_seconds), updated_at = now()
+    from (
+        select id from jobs
+        where (status = 'pending' and run_at <= now()) or (status = 'running' and locked_until < now())
+        order by run_at
+        limit p_limit
+        for update skip locked
+    ) due
+    where j.id = due.id
+    returning j.*;
+$$;
+
+create or replace function complete_job(p_id bigint, p_worker text, p_result jsonb)
+returns boolean
+language sql as $$
+    with updated as (
+        update jobs
+        set status = case when rerun_requested then 'pending' else 'done' end,
+            run_at = case when rerun_requested then now() else run_at end,
+            attempts = case when rerun_requested then 0 else attempts end,
+            rerun_requested = false,
+            result = p_result, last_error = null, locked_by = null, locked_until = null, updated_at = now()
+        where id = p_id and locked_by = p_worker and status = 'running'
+        returning 1
+    )
+    select exists (select 1 from updated);
+$$;
+
+-- p_retry_in null marks the job failed for good; otherwise it is retried then.
+-- A requested rerun starts over right away either way.
+create or replace function fail_job(p_id bigint, p_worker text, p_error text, p_retry_in double precision)
+returns boolean
+language sql as $$
+    with updated as (
+        update jobs
+        set status = case when rerun_requested then 'pending' when p_retry_in is null then 'failed' else 'pending' end,
+            run_at = case
+                when rerun_requested then now()
+                when p_retry_in is null then run_at
+                else now() + make_interval(secs => p_retry_in)
+            end,
+            attempts = case when rerun_requested then 0 else attempts end,
+            rerun_requested = false,
+            last_error = p_error, locked_by = null, locked_until = null, updated_at = now()
+        where id = p_id and locked_by = p_worker and status = 'running'
+        returning 1
+    )
+    select exists (select 1 from updated);
+$$;
@@ -0,0 +1,38 @@
+-- Order state changes published on the order_events channel (order_events.py).
+-- Only used when the API runs with ORDER_EVENTS_DATABASE_URL.
+
+create or replace function notify_order_event() returns trigger
+language plpgsql as $$
+begin
+    if tg_op = 'DELETE' then
+        perform pg_notify('order_events', json_build_object(
+            'op', 'delete', 'id', old.id, 'buyer_id', old.buyer_id, 'seller_id', old.seller_id
+        )::text);
+        return old;
+    end if;
+    if tg_op = 'UPDATE' and (
+        new.accepted, new.shipped, new.delivered, new.received, new.paid, new.contract_address, new.tracking_id,
+        new.shipment_company_name, new.shipment_expected_date, new.accepted_at, new.delivered_at, new.paid_at
+    ) is not distinct from (
+        old.accepted, old.shipped, old.delivered, old.received, old.paid, old.contract_address, old.tracking_id,
+        old.shipment_company_name, old.shipment_expected_date, old.accepted_at, old.delivered_at, old.paid_at
+    ) then
+        -- merkle_root, anchor and score-only writes are not state changes
+        return new;
+    end if;
+    perform pg_notify('order_events', json_build_object(
+        'op', lower(tg_op), 'id', new.id, 'buyer_id', new.buyer_id, 'seller_id', new.seller_id,
+        'accepted', new.accepted, 'shipped', new.shipped, 'delivered', new.delivered,
+        'received', new.received, 'paid', new.paid, 'contract_address', new.contract_address,
+        'tracking_id', new.tracking_id, 'shipment_company_name', new.shipment_company_name,
+        'shipment_expected_date', new.shipment_expected_date, 'accepted_at', new.accepted_at,
+        'delivered_at', new.delivered_at, 'paid_at', new.paid_at
+    )::text);
+    return new;
+end;
+$$;
+
+drop trigger if exists orders_notify on orders;
+create trigger orders_notify
+    after insert or update or delete on orders
+    for each row execute function notify_order_event();
@@ -0,0 +1,134 @@
+-- Per-seller dashboard aggregates kept current by an orders trigger
+-- (seller_stats.py). rebuild_seller_stats() recomputes them from scratch.
+
+create table if not exists seller_stats (
+    seller_id bigint primary key references users (id) on delete cascade,
+    total_orders integer not null default 0,
+    pending_orders integer not null default 0,
+    in_progress_orders integer not null default 0,
+    delivered_orders integer not null default 0,
+    received_orders integer not null default 0,
+    paid_orders integer not null default 0,
+    on_time_deliveries integer not null default 0,
+    late_deliveries integer not null default 0,
+    revenue numeric not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+-- Adds (p_sign = 1) or removes (p_sign = -1) one order's contribution.
+-- Late means delivered after shipment_expected_date, as in /order_delivered.
+create or replace function seller_stats_apply(p_order orders, p_sign integer)
+returns void
+language sql as $$
+    insert into seller_stats as s (
+        seller_id, total_orders, pending_orders, in_progress_orders, delivered_orders, received_orders,
+        paid_orders, on_time_deliveries, late_deliveries, revenue
+    )
+    values (
+        p_order.seller_id,
+        p_sign,
+        p_sign * (not p_order.accepted)::integer,
+        p_sign * (p_order.accepted and not p_order.delivered)::integer,
+        p_sign * p_order.delivered::integer,
+        p_sign * p_order.received::integer,
+        p_sign * p_order.paid::integer,
+        p_sign * (p_order.delivered and not coalesce(p_order.delivered_at > p_order.shipment_expected_date, false))::integer,
+        p_sign * (p_order.delivered and coalesce(p_order.delivered_at > p_order.shipment_expected_date, false))::integer,
+        p_sign * case when p_order.paid then p_order.cost else 0 end
+    )
+    on conflict (seller_id) do update set
+        total_orders = s.total_orders + excluded.total_orders,
+        pending_orders = s.pending_orders + excluded.pending_orders,
+        in_progress_orders = s.in_progress_orders + excluded.in_progress_orders,
+        delivered_orders = s.delivered_orders + excluded.delivered_orders,
+        received_orders = s.received_orders + excluded.received_orders,
+        paid_orders = s.paid_orders + excluded.paid_orders,
+        on_time_deliveries = s.on_time_deliveries + excluded.on_time_deliveries,
+        late_deliveries = s.late_deliveries + excluded.late_deliveries,
+        revenue = s.revenue + excluded.revenue,
+        updated_at = now();
+$$;
+
+create or replace function seller_stats_maintain() returns trigger
+language plpgsql as $$
+begin
+    if tg_op = 'UPDATE' and (
+        new.seller_id, new.accepted, new.delivered, new.received, new.paid, new.cost, new.delivered_at, new.shipment_expected_date
+    ) is not distinct from (
+        old.seller_id, old.accepted, old.delivered, old.received, old.paid, old.cost, old.delivered_at, old.shipment_expected_date
+    ) then
+        return new;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform seller_stats_apply(old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform seller_stats_apply(new, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists orders_seller_stats on orders;
+create trigger orders_seller_stats
+    after insert or update or delete on orders
+    for each row execute function seller_stats_maintain();
+
+-- Reconciliation: recomputes every seller from orders and returns how many
+-- rows had drifted. The exclusive lock makes concurrent order writes wait at
+-- their trigger, so their deltas apply on top of the rebuilt values.
+create or replace function rebuild_seller_stats()
+returns integer
+language plpgsql as $$
+declare
+    drifted integer;
+begin
+    lock table seller_stats in exclusive mode;
+    with fresh as (
+        select
+            u.id as seller_id,
+            count(o.id)::integer as total_orders,
+            count(o.id) filter (where not o.accepted)::integer as pending_orders,
+            count(o.id) filter (where o.accepted and not o.delivered)::integer as in_progress_orders,
+            count(o.id) filter (where o.delivered)::integer as delivered_orders,
+            count(o.id) filter (where o.received)::integer as received_orders,
+            count(o.id) filter (where o.paid)::integer as paid_orders,
+            count(o.id) filter (where o.delivered and not coalesce(o.delivered_at > o.shipment_expected_date, false))::integer as on_time_deliveries,
+            count(o.id) filter (where o.delivered and coalesce(o.delivered_at > o.shipment_expected_date, false))::integer as late_deliveries,
+            coalesce(sum(o.cost) filter (where o.paid), 0) as revenue
+        from users u
+        left join orders o on o.seller_id = u.id
+        where u.id in (select seller_id from orders union select seller_id from seller_stats)
+        group by u.id
+    ),
+    updated as (
+        insert into seller_stats as s (
+            seller_id, total_orders, pending_orders, in_progress_orders, delivered_orders, received_orders,
+            paid_orders, on_time_deliveries, late_deliveries, revenue
+        )
+        select * from fresh
+        on conflict (seller_id) do update set
+            total_orders = excluded.total_orders,
+            pending_orders = excluded.pending_orders,
+            in_progress_orders = excluded.in_progress_orders,
+            delivered_orders = excluded.delivered_orders,
+            received_orders = excluded.received_orders,
+            paid_orders = excluded.paid_orders,
+            on_time_deliveries = excluded.on_time_deliveries,
+            late_deliveries = excluded.late_deliveries,
+            revenue = excluded.revenue,
+            updated_at = now()
+        where (s.total_orders, s.pending_orders, s.in_progress_orders, s.delivered_orders, s.received_orders,
+               s.paid_orders, s.on_time_deliveries, s.late_deliveries, s.revenue)
+            is distinct from
+              (excluded.total_orders, excluded.pending_orders, excluded.in_progress_orders, excluded.delivered_orders,
+               excluded.received_orders, excluded.paid_orders, excluded.on_time_deliveries, excluded.late_deliveries,
+               excluded.revenue)
+        returning 1
+    )
+    select count(*)::integer into drifted from updated;
+    return drifted;
+end;
+$$;
+
+select rebuild_seller_stats();
@@ -0,0 +1,13 @@
+-- Bulk merkle_root write for /create_merkle_roots. Only merkle_root is
+-- touched, so a concurrent accept or payment is never overwritten with the
+-- values read before the roots were computed.
+
+create or replace function set_merkle_roots(p_roots jsonb)
+returns table (id bigint, merkle_root text)
+language sql as $$
+    update orders o
+    set merkle_root = r.merkle_root
+    from jsonb_to_recordset(p_roots) as r (id bigint, merkle_root text)
+    where o.id = r.id
+    returning o.id, o.merkle_root;
+$$;
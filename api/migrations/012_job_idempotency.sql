@@ -0,0 +1,28 @@
+-- Per-order markers that let the deploy and rescore jobs (order_jobs.py) run
+-- again after a crash without repeating their side effect.
+
+-- Hash of the signed escrow deploy, stored before it is broadcast, so a rerun
+-- waits for that transaction instead of sending a second escrow
+alter table orders add column if not exists deploy_tx_hash text;
+alter table orders add column if not exists late_penalized boolean not null default false;
+
+-- Takes the late-delivery point at most once per order: the flag and the score
+-- change commit together, and a second call returns no row
+create or replace function penalize_late_delivery(p_order_id bigint, p_amount integer default 1)
+returns integer
+language sql as $$
+    with flagged as (
+        update orders
+        set late_penalized = true
+        where id = p_order_id and not late_penalized
+        returning seller_id
+    )
+    update users u
+    set score = u.score - p_amount
+    from flagged
+    where u.id = flagged.seller_id
+    returning u.score;
+$$;
+
+-- Replaced by penalize_late_delivery; dropped where an earlier 002 created it
+drop function if exists decrement_seller_score(bigint, integer);
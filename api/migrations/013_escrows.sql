@@ -0,0 +1,34 @@
+-- Escrow addresses for the event indexer (event_indexer.py). Filled by a
+-- trigger when a deploy is recorded on an order, so the indexer reads only the
+-- rows added since its last run instead of scanning orders every interval.
+
+create table if not exists escrows (
+    id bigint generated always as identity primary key,
+    contract_address text not null unique,
+    order_id bigint not null
+);
+
+create or replace function record_escrow() returns trigger
+language plpgsql as $$
+begin
+    if new.contract_address is not null then
+        insert into escrows (contract_address, order_id)
+        values (lower(new.contract_address), new.id)
+        on conflict (contract_address) do nothing;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists orders_record_escrow on orders;
+create trigger orders_record_escrow
+    after insert or update of contract_address on orders
+    for each row execute function record_escrow();
+
+-- Escrows deployed before this migration
+insert into escrows (contract_address, order_id)
+select lower(contract_address), id
+from orders
+where contract_address is not null
+order by id
+on conflict (contract_address) do nothing;
@@ -0,0 +1,30 @@
+-- Lets anchor.py resume an anchor whose transaction went out but whose proofs
+-- were never stored, instead of publishing a second root. The row is written
+-- before the broadcast with the signed tx hash and the (id, merkle_root) list
+-- the tree was built from; applied_at is set once the proofs are stored.
+
+alter table merkle_anchors add column if not exists orders jsonb;
+alter table merkle_anchors add column if not exists applied_at timestamptz;
+
+-- Anchors written before this migration were complete
+update merkle_anchors set applied_at = created_at where applied_at is null and orders is null;
+
+create index if not exists merkle_anchors_unapplied_idx
+    on merkle_anchors (id)
+    where applied_at is null;
+
+-- As in 001, plus marking the anchor applied in the same transaction
+create or replace function apply_anchor_proofs(p_anchor_id bigint, p_proofs jsonb)
+returns integer
+language sql as $$
+    with updated as (
+        update orders o
+        set anchor_id = p_anchor_id, anchor_proof = p.proof
+        from jsonb_to_recordset(p_proofs) as p (id bigint, merkle_root text, proof jsonb)
+        where o.id = p.id and o.merkle_root = p.merkle_root
+        returning 1
+    ), applied as (
+        update merkle_anchors set applied_at = now() where id = p_anchor_id
+    )
+    select count(*)::integer from updated;
+$$;
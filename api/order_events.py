@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, defaultdict
+
+# In-process fan-out of order state changes to SSE/WebSocket subscribers, so
+# the app no longer polls the filtered order lists. Events come either from the
+# order mutations in main.py (single worker) or, with ORDER_EVENTS_DATABASE_URL
+# set, from the orders trigger over Postgres LISTEN/NOTIFY
+# (migrations/009_order_events.sql), which reaches every API worker and also
+# sees writes made by worker.py.
+
+ORDER_EVENTS_DATABASE_URL = os.getenv('ORDER_EVENTS_DATABASE_URL')
+CHANNEL = 'order_events'
+HEARTBEAT_SECONDS = float(os.getenv('ORDER_EVENTS_HEARTBEAT_SECONDS', '15'))
+SUBSCRIBER_QUEUE_SIZE = 256
+# Last pushed state per order, used to send only the fields that changed
+KNOWN_ORDERS = 10000
+ROLES = {'buyer': 'buyer_id', 'seller': 'seller_id'}
+STATE_FIELDS = [
+    'accepted', 'shipped', 'delivered', 'received', 'paid', 'contract_address', 'tracking_id',
+    'shipment_company_name', 'shipment_expected_date', 'accepted_at', 'delivered_at', 'paid_at',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class OrderHub:
+    def __init__(self, max_orders: int = KNOWN_ORDERS):
+        self.max_orders = max_orders
+        self._subscribers = defaultdict(set)
+        self._last = OrderedDict()
+
+    def subscribe(self, role: str, user_id: int):
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[(role, user_id)].add(queue)
+        return queue
+
+    def unsubscribe(self, role: str, user_id: int, queue):
+        subscribers = self._subscribers.get((role, user_id))
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[(role, user_id)]
+
+    def _diff(self, order: dict):
+        state = {field: order[field] for field in STATE_FIELDS if field in order}
+        previous = self._last.pop(order['id'], {})
+        self._last[order['id']] = {**previous, **state}
+        if len(self._last) > self.max_orders:
+            self._last.popitem(last=False)
+        return {field: value for field, value in state.items() if field not in previous or previous[field] != value}
+
+    def _deliver(self, order: dict, event: dict):
+        for role, column in ROLES.items():
+            for queue in self._subscribers.get((role, order.get(column)), ()):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Slow consumer: drop its backlog and tell it to refetch once
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait({'type': 'resync'})
+
+    def publish(self, order: dict):
+        # order is a full or partial orders row; it must carry id, buyer_id and seller_id
+        changes = self._diff(order)
+        if changes:
+            self._deliver(order, {
+                'type': 'order', 'order_id': order['id'], 'buyer_id': order['buyer_id'],
+                'seller_id': order['seller_id'], 'changes': changes,
+            })
+
+    def remove(self, order: dict):
+        self._last.pop(order['id'], None)
+        self._deliver(order, {'type': 'removed', 'order_id': order['id']})
+
+    def subscriber_count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+hub = OrderHub()
+
+
+def publish(rows):
+    # Called after every orders write in this process. Skipped when the trigger
+    # feed is on, otherwise each change would be pushed twice.
+    if ORDER_EVENTS_DATABASE_URL:
+        return
+    for row in rows or ():
+        hub.publish(row)
+
+
+def publish_removed(rows):
+    if ORDER_EVENTS_DATABASE_URL:
+        return
+    for row in rows or ():
+        hub.remove(row)
+
+
+def handle_notification(payload: str):
+    event = json.loads(payload)
+    if event.pop('op') == 'delete':
+        hub.remove(event)
+    else:
+        hub.publish(event)
+
+
+async def snapshot(supabase, role: str, user_id: int):
+    # Open orders at connect time, so a client needs no initial list poll
+    orders = (
+        await supabase.table('orders')
+        .select(','.join(['id', 'buyer_id', 'seller_id', 'item_id', 'quantity', 'cost'] + STATE_FIELDS))
+        .eq(ROLES[role], user_id)
+        .eq('received', False)
+        .order('id')
+        .execute()
+    ).data
+    return {'type': 'snapshot', 'orders': orders}
+
+
+async def subscription(supabase, role: str, user_id: int, include_snapshot: bool = True):
+    # Yields events for one buyer or seller; None is a heartbeat
+    queue = hub.subscribe(role, user_id)
+    try:
+        if include_snapshot:
+            yield await snapshot(supabase, role, user_id)
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+    finally:
+        hub.unsubscribe(role, user_id, queue)
+
+
+async def listen(dsn: str = ORDER_EVENTS_DATABASE_URL):
+    # asyncpg is only needed when the LISTEN/NOTIFY feed is enabled
+    import asyncpg
+
+    delay = 1
+    while True:
+        try:
+            connection = await asyncpg.connect(dsn)
+        except (OSError, asyncpg.PostgresError):
+            logger.exception('Connecting order event listener failed, retrying in %ss', delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+            continue
+        delay = 1
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        await connection.add_listener(CHANNEL, lambda _connection, _pid, _channel, payload: handle_notification(payload))
+        try:
+            await closed.wait()
+            logger.warning('Order event listener connection lost, reconnecting')
+        finally:
+            await connection.close()
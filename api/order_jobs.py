@@ -0,0 +1,96 @@
+import anchor
+import chain_client
+import db
+import jobs
+import order_events
+import seller_stats
+import sus_detector
+from deploy_queue import get_queue
+from merkle import ORDER_FIELDS, build_merkle_tree, order_leaves
+
+# Handlers for the slow side effects of the order lifecycle. Each is keyed so
+# that enqueueing twice is harmless, and each checks for work already done,
+# because a job can run again after a crash or an expired lease.
+
+# Set by whoever starts the worker: the API's cache (embedded worker) or a
+# fresh create_cache() in worker.py, which needs CACHE_REDIS_URL to reach the API.
+cache = None
+explorer: sus_detector.ExplorerClient = None
+
+
+def configure(app_cache, app_explorer: sus_detector.ExplorerClient):
+    global cache, explorer
+    cache, explorer = app_cache, app_explorer
+
+
+async def record_deploy_tx(order_id: int, tx_hash: str):
+    await db.update_order(order_id, {"deploy_tx_hash": tx_hash})
+
+
+async def record_contract_address(order_id: int, contract_address: str):
+    rows = (await db.supabase.table("orders").update({"contract_address": contract_address}).eq("id", order_id).execute()).data
+    order_events.publish(rows)
+
+
+def deploy_key(order_id: int):
+    return f"deploy:{order_id}"
+
+
+async def refresh_merkle_root(order_id: int):
+    # The root covers accepted/delivered/paid, so it is rebuilt after every
+    # transition; the new root clears the order's anchor (orders_reset_anchor)
+    # and the next anchoring run publishes it. rerun coalesces bursts of
+    # transitions into at most one more run.
+    await jobs.enqueue("merkle", f"merkle:{order_id}", {"order_id": order_id}, order_id=order_id, rerun=True)
+
+
+@jobs.handler("deploy")
+async def deploy(payload: dict):
+    order = await db.get_order_with_parties(payload["order_id"])
+    if order["contract_address"]:
+        return {"contract_address": order["contract_address"]}
+    queue = get_queue()
+    # An earlier run that died after broadcasting left its tx hash behind;
+    # waiting on that transaction avoids deploying a second escrow
+    future = await queue.resume(order["id"], order["deploy_tx_hash"]) if order["deploy_tx_hash"] else None
+    if future is None:
+        # DeployQueue batches broadcasts across concurrent jobs, stores the tx
+        # hash through record_deploy_tx before sending and records the address
+        # through record_contract_address when the receipt arrives
+        future = queue.submit(order["id"], order["buyer"]["wallet_address"], order["seller"]["wallet_address"])
+    return {"contract_address": await future}
+
+
+@jobs.handler("merkle")
+async def merkle(payload: dict):
+    rows = (await db.supabase.table("orders").select(",".join(ORDER_FIELDS)).eq("id", payload["order_id"]).execute()).data
+    if not rows:
+        return None
+    merkle_root = build_merkle_tree(order_leaves(rows[0]))
+    await db.update_order(payload["order_id"], {"merkle_root": merkle_root})
+    return {"merkle_root": merkle_root}
+
+
+@jobs.handler("rescore")
+async def rescore(payload: dict):
+    # orders.late_penalized is set in the same statement, so running this again
+    # after a crash takes no second point
+    score = await db.penalize_late_delivery(payload["order_id"])
+    if cache is not None:
+        await cache.invalidate(f"seller_score:{payload['seller_id']}")
+    return {"score": score}
+
+
+@jobs.handler("anchor")
+async def anchor_roots(payload: dict):
+    return await anchor.anchor_pending_roots(db.supabase, chain_client.get_client(), get_queue().nonces)
+
+
+@jobs.handler("rebuild_seller_stats")
+async def rebuild_seller_stats(payload: dict):
+    return {"drifted": await seller_stats.rebuild(db.supabase)}
+
+
+@jobs.handler("scan")
+async def scan(payload: dict):
+    return {"indexed": await sus_detector.sweep_active_contracts(db.supabase, explorer)}
@@ -0,0 +1,84 @@
+import json
+import os
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '500'))
+NDJSON = 'application/x-ndjson'
+
+ORDER_COLUMNS = {
+    'id', 'buyer_id', 'seller_id', 'item_id', 'quantity', 'cost', 'accepted', 'delivered', 'paid', 'received',
+    'shipped', 'contract_address', 'merkle_root', 'created_at', 'accepted_at', 'paid_at', 'delivered_at',
+    'tracking_id', 'shipment_company_name', 'shipment_company_contact', 'shipment_expected_date',
+}
+ITEM_COLUMNS = {'id', 'seller_id', 'product_name', 'price', 'quantity', 'created_at'}
+
+
+def projection(fields: str, allowed, default: str = '*'):
+    # 'fields=id,cost' -> 'id,cost'; id is always kept because it is the cursor.
+    # allowed is a set of column names, or a dict mapping names to select
+    # expressions (e.g. embedded columns).
+    if not fields:
+        return default
+    columns = [column.strip() for column in fields.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    if isinstance(allowed, dict):
+        columns = [allowed[column] for column in columns]
+    return ','.join(columns)
+
+
+def page(query, cursor, limit: int, key: str = 'id'):
+    # Keyset pagination on id, which grows with created_at. Tables without an
+    # id page on another unique column.
+    query = query.order(key)
+    if cursor is not None:
+        query = query.gt(key, cursor)
+    return query.limit(limit)
+
+
+async def iter_pages(build_query, after=None, size: int = MAX_PAGE_SIZE, key: str = 'id'):
+    # Yields every row in keyset pages of at most size rows, which stays under
+    # PostgREST's max-rows cap (1000 by default) that would silently truncate
+    # a single unbounded select. build_query() returns a fresh select builder.
+    while True:
+        rows = (await page(build_query(), after, size, key).execute()).data
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after = rows[-1][key]
+
+
+def wants_ndjson(request: Request):
+    return NDJSON in request.headers.get('accept', '')
+
+
+async def paginated_response(request: Request, build_query, fields: str, allowed, cursor: int = None, limit: int = None, default: str = '*'):
+    # build_query(columns) must return a fresh PostgREST select builder each call.
+    # NDJSON walks every page and streams rows as they arrive. JSON with a
+    # cursor or limit returns one page with the next cursor in X-Next-Cursor;
+    # without either it returns every row, as these endpoints always did, so
+    # clients that don't page still get complete lists.
+    try:
+        columns = projection(fields, allowed, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if cursor is None and limit is None and not wants_ndjson(request):
+        return JSONResponse([row async for rows in iter_pages(lambda: build_query(columns)) for row in rows])
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    if wants_ndjson(request):
+        async def stream():
+            async for rows in iter_pages(lambda: build_query(columns), cursor):
+                for row in rows:
+                    yield json.dumps(row, default=str) + '\n'
+        return StreamingResponse(stream(), media_type=NDJSON)
+
+    rows = (await page(build_query(columns), cursor, limit).execute()).data
+    headers = {'X-Next-Cursor': str(rows[-1]['id'])} if len(rows) == limit else {}
+    return JSONResponse(rows, headers=headers)
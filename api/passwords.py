@@ -0,0 +1,59 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# Work factor for new hashes; stored hashes with another cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', str(os.cpu_count() or 2)))
+# Hash/verify calls allowed in flight (running + waiting) before rejecting
+PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', str(PASSWORD_WORKERS * 8)))
+
+# bcrypt releases the GIL while hashing, so threads run truly in parallel
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix='bcrypt')
+_in_flight = 0
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= PASSWORD_QUEUE_LIMIT:
+        raise PasswordPoolBusy('Too many password operations in flight')
+    _in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _in_flight -= 1
+
+
+def _hash(password: str, rounds: int):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password: str, stored: str):
+    return bcrypt.checkpw(password.encode('utf-8'), stored.encode('utf-8'))
+
+
+async def hash_password(password: str, rounds: int = BCRYPT_ROUNDS):
+    return await _run(_hash, password, rounds)
+
+
+async def verify_password(password: str, stored: str):
+    return await _run(_check, password, stored)
+
+
+def hash_rounds(stored: str):
+    # '$2b$12$...' -> 12
+    return int(stored.split('$')[2])
+
+
+def needs_rehash(stored: str):
+    return hash_rounds(stored) != BCRYPT_ROUNDS
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
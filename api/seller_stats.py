@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import os
+
+# Seller dashboard aggregates, maintained incrementally by the orders trigger
+# in migrations/010_seller_stats.sql. The periodic rebuild only reconciles
+# drift (e.g. rows changed with triggers disabled); 0 disables it and
+# /rebuild_seller_stats runs it on demand.
+SELLER_STATS_REBUILD_INTERVAL_SECONDS = float(os.getenv('SELLER_STATS_REBUILD_INTERVAL_SECONDS', '86400'))
+STATS_COLUMNS = [
+    'total_orders', 'pending_orders', 'in_progress_orders', 'delivered_orders', 'received_orders',
+    'paid_orders', 'on_time_deliveries', 'late_deliveries', 'revenue', 'updated_at',
+]
+
+logger = logging.getLogger(__name__)
+
+
+async def get_dashboard(supabase, seller_id: int):
+    # One primary-key read of users with its seller_stats row embedded
+    rows = (
+        await supabase.table('users')
+        .select(f"id, score, pseudo_balance, seller_stats({','.join(STATS_COLUMNS)})")
+        .eq('id', seller_id)
+        .execute()
+    ).data
+    if not rows:
+        return None
+    seller = rows[0]
+    stats = seller.pop('seller_stats')
+    if isinstance(stats, list):
+        # PostgREST before v11 embeds one-to-one relations as a list
+        stats = stats[0] if stats else None
+    # A seller without orders has no stats row yet
+    stats = stats or {**{column: 0 for column in STATS_COLUMNS}, 'updated_at': None}
+    deliveries = stats['on_time_deliveries'] + stats['late_deliveries']
+    return {
+        'seller_id': seller['id'], 'score': seller['score'], 'pseudo_balance': seller['pseudo_balance'],
+        **stats,
+        'on_time_rate': stats['on_time_deliveries'] / deliveries if deliveries else None,
+    }
+
+
+async def rebuild(supabase):
+    return (await supabase.rpc('rebuild_seller_stats', {}).execute()).data
+
+
+async def run_stats_rebuild(supabase, interval: float = SELLER_STATS_REBUILD_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            drifted = await rebuild(supabase)
+            if drifted:
+                logger.warning('Seller stats rebuild corrected %s rows', drifted)
+        except Exception:
+            logger.exception('Seller stats rebuild failed')
@@ -1,52 +1,171 @@
+import asyncio
+import logging
 import os
+import random
 from dotenv import load_dotenv
-import requests
+import httpx
+from pagination import iter_pages
+from tracing import TracingTransport
 
 load_dotenv()
 
 ARBITAR_ADRESS = os.getenv("ARBITAR_ADRESS")
 POLYGON_AMOY_API_KEY = os.getenv("POLYGON_SCAN_API_KEY")
+POLYGONSCAN_API_URL = os.getenv("POLYGONSCAN_API_URL", "https://api-amoy.polygonscan.com/api")
+SCAN_INTERVAL_SECONDS = float(os.getenv("SCAN_INTERVAL_SECONDS", "300"))
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "4"))
+TXLIST_PAGE_SIZE = 1000
+# The explorer refuses page * offset beyond this, so windows restart from the last block
+TXLIST_WINDOW = 10000
+MAX_RETRIES = 5
 
+logger = logging.getLogger(__name__)
 
-def detect_sus(contract_address: str, buyer_address: str, seller_address: str):
-    r = requests.get(f'https://api-amoy.polygonscan.com/api?module=account&action=txlist&address={contract_address}&startblock=0&endblock=latest&sort=asc&apikey={POLYGON_AMOY_API_KEY}')
-    transactions = r.json()['result']
-    
-    allowed_addresses = [
+
+class ExplorerClient:
+    def __init__(self, base_url: str = POLYGONSCAN_API_URL, api_key: str = POLYGON_AMOY_API_KEY):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.http = httpx.AsyncClient(
+            timeout=30,
+            transport=TracingTransport(
+                "explorer", name=lambda request: request.url.params.get("action", request.url.path),
+                limits=httpx.Limits(max_connections=SCAN_CONCURRENCY * 2),
+            ),
+        )
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def txlist(self, address: str, start_block: int, page: int):
+        params = {
+            "module": "account", "action": "txlist", "address": address,
+            "startblock": start_block, "endblock": "latest", "sort": "asc",
+            "page": page, "offset": TXLIST_PAGE_SIZE, "apikey": self.api_key,
+        }
+        for attempt in range(MAX_RETRIES):
+            try:
+                r = await self.http.get(self.base_url, params=params)
+                if r.status_code < 500 and r.status_code != 429:
+                    body = r.json()
+                    if body["status"] == "1":
+                        return body["result"]
+                    if body["message"].startswith("No transactions"):
+                        return []
+                    if "rate limit" not in str(body["result"]).lower():
+                        raise RuntimeError(f"Explorer error for {address}: {body['result']}")
+            except httpx.TransportError:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+            await asyncio.sleep(0.5 * 2 ** attempt + random.random() / 4)
+        raise RuntimeError(f"Explorer still rate limited after {MAX_RETRIES} attempts for {address}")
+
+
+def index_row(contract_address: str, transaction: dict):
+    return {
+        "hash": transaction["hash"],
+        "contract_address": contract_address,
+        "block_number": int(transaction["blockNumber"]),
+        "from_address": transaction["from"].lower(),
+        "to_address": transaction["to"].lower(),
+        "value": transaction["value"],
+        "timestamp": int(transaction["timeStamp"]),
+    }
+
+
+async def scan_contract(supabase, explorer: ExplorerClient, contract_address: str):
+    # Fetches only blocks after the stored checkpoint and appends them to the index
+    contract_address = contract_address.lower()
+    checkpoint = (await supabase.table("scanned_contracts").select("last_block").eq("contract_address", contract_address).execute()).data
+    # The checkpoint block is re-read in case the explorer indexed it late
+    start_block = checkpoint[0]["last_block"] if checkpoint else 0
+    last_block = start_block
+    fetched = 0
+    while True:
+        window_full = False
+        for page in range(1, TXLIST_WINDOW // TXLIST_PAGE_SIZE + 1):
+            transactions = await explorer.txlist(contract_address, start_block, page)
+            if transactions:
+                rows = [index_row(contract_address, tx) for tx in transactions]
+                await supabase.table("indexed_transactions").upsert(rows, ignore_duplicates=True).execute()
+                fetched += len(rows)
+                last_block = max(last_block, rows[-1]["block_number"])
+            if len(transactions) < TXLIST_PAGE_SIZE:
+                break
+        else:
+            window_full = True
+        if not window_full:
+            break
+        # Re-read the last block in the next window; duplicates are ignored on upsert
+        start_block = last_block
+
+    await supabase.table("scanned_contracts").upsert({
+        "contract_address": contract_address, "last_block": last_block, "scanned_at": "now()",
+    }).execute()
+    return fetched
+
+
+async def sweep_active_contracts(supabase, explorer: ExplorerClient):
+    # Batch mode: every escrow that is deployed and not yet received
+    orders = (await supabase.table("orders").select("contract_address").not_.is_("contract_address", "null").eq("received", False).execute()).data
+    addresses = {order["contract_address"].lower() for order in orders}
+    semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+
+    async def scan(address):
+        async with semaphore:
+            try:
+                return await scan_contract(supabase, explorer, address)
+            except Exception:
+                logger.exception("Scanning %s failed", address)
+                return 0
+
+    return sum(await asyncio.gather(*(scan(address) for address in addresses)))
+
+
+async def detect_sus(supabase, contract_address: str, buyer_address: str, seller_address: str, explorer: ExplorerClient = None):
+    contract_address = contract_address.lower()
+    if explorer is not None:
+        scanned = (await supabase.table("scanned_contracts").select("contract_address").eq("contract_address", contract_address).execute()).data
+        if not scanned:
+            await scan_contract(supabase, explorer, contract_address)
+
+    # Paged on hash, the table's key, so a busy contract is not cut off at
+    # PostgREST's max-rows; block order is restored once every page is read
+    transactions = []
+    pages = iter_pages(lambda: (
+        supabase.table("indexed_transactions")
+        .select("hash, block_number, from_address, to_address, value, timestamp")
+        .eq("contract_address", contract_address)
+    ), key="hash")
+    async for rows in pages:
+        transactions.extend(rows)
+    transactions.sort(key=lambda tx: tx["block_number"])
+
+    allowed_addresses = {
         ARBITAR_ADRESS.lower(),
         seller_address.lower(),
         buyer_address.lower(),
-        contract_address.lower()
-    ]
-    
-    suspicious_transactions = []
-    
-    for transaction in transactions:
-        from_address = transaction['from'].lower()
-        to_address = transaction['to'].lower()
-        
-        if (from_address not in allowed_addresses and from_address != '') or \
-           (to_address not in allowed_addresses and to_address != ''):
-            suspicious_transactions.append({
-                'hash': transaction['hash'],
-                'from': transaction['from'],
-                'to': transaction['to'],
-                'value': transaction['value'],
-                'timestamp': transaction['timeStamp']
-            })
-    
-    formatted_transactions = []
-    for tx in suspicious_transactions:
-        formatted_transactions.append({
+        contract_address,
+        '',
+    }
+
+    return [
+        {
             'Transaction Hash': tx['hash'],
-            'From Address': tx['from'],
-            'To Address': tx['to'],
-            'Value': int(tx['value']) / (10 ** 18), # Conversion to POL :))  
-            'Timestamp': tx['timestamp']
-        })
-    
-    return formatted_transactions
-        
-
-if __name__ == '__main__':
-    print(detect_sus('0x2b3de0499B3774A5D71c0909b7FA615A0aE72511','0x5f351FBf5Dea981A6C06DfcadA464b84b5e5F871','0xeba481C85a80CF3a6C335C4855E6716Cdb13D414'))
\ No newline at end of file
+            'From Address': tx['from_address'],
+            'To Address': tx['to_address'],
+            'Value': int(tx['value']) / (10 ** 18), # Conversion to POL :))
+            'Timestamp': str(tx['timestamp'])
+        }
+        for tx in transactions
+        if tx['from_address'] not in allowed_addresses or tx['to_address'] not in allowed_addresses
+    ]
+
+
+async def run_scanner(supabase, explorer: ExplorerClient, interval: float = SCAN_INTERVAL_SECONDS):
+    while True:
+        try:
+            await sweep_active_contracts(supabase, explorer)
+        except Exception:
+            logger.exception("Scanner sweep failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,187 @@
+import asyncio
+import time
+
+import pytest
+from starlette.requests import Request
+
+import main
+from cache import Cache, RedisBackend, etag_for
+
+
+class FakeRedis:
+    # The get/set/delete slice of redis.asyncio the cache uses
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at < time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+    async def set(self, key, value, px=None):
+        self.values[key] = (value, time.monotonic() + px / 1000 if px else None)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class CatalogueQuery:
+    # seller_items as the unfiltered catalogue reads it: ordered by id, keyset paged
+    def __init__(self, rows, reads):
+        self.rows = rows
+        self.reads = reads
+        self.after = None
+        self.count = None
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        return self
+
+    def gt(self, column, value):
+        self.after = value
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def execute(self):
+        self.reads.append(self.after)
+        rows = [row for row in self.rows if self.after is None or row['id'] > self.after]
+        return Result(rows[:self.count])
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = []
+
+    def table(self, name):
+        return CatalogueQuery(self.rows, self.reads)
+
+
+def request(headers=None):
+    headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': '/get_all_sellers_product', 'query_string': b'', 'headers': headers})
+
+
+def test_concurrent_misses_share_one_load():
+    async def check():
+        cache = Cache()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'rows': [1, 2, 3]}
+
+        values = await asyncio.gather(*(cache.get_or_load('catalogue', load) for _ in range(10)))
+        assert calls == [1]
+        assert all(value == {'rows': [1, 2, 3]} for value in values)
+        assert await cache.get_or_load('catalogue', load) == {'rows': [1, 2, 3]}
+        assert calls == [1]
+        assert cache.snapshot()['catalogue'] == {'hits': 1, 'misses': 10, 'invalidations': 0, 'hit_ratio': 0.091}
+
+    asyncio.run(check())
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_load():
+    async def check():
+        cache = Cache()
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return 'value'
+
+        first = asyncio.ensure_future(cache.get_or_load('seller_score:1', load))
+        second = asyncio.ensure_future(cache.get_or_load('seller_score:1', load))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == 'value'
+        assert await cache.backend.get('seller_score:1') == 'value'
+
+    asyncio.run(check())
+
+
+def test_failed_load_is_not_cached():
+    async def check():
+        cache = Cache()
+        attempts = []
+
+        async def load():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('database unavailable')
+            return 'value'
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load('seller_score:1', load)
+        assert await cache.get_or_load('seller_score:1', load) == 'value'
+        assert len(attempts) == 2
+
+    asyncio.run(check())
+
+
+@pytest.mark.parametrize('backend', [None, RedisBackend(FakeRedis())], ids=['memory', 'redis'])
+def test_entries_expire_and_invalidate(backend):
+    async def check():
+        cache = Cache(backend, ttl=0.05)
+        version = []
+
+        async def load():
+            version.append(1)
+            return len(version)
+
+        assert await cache.get_or_load('pseudo_balance:1', load) == 1
+        assert await cache.get_or_load('pseudo_balance:1', load) == 1
+        await asyncio.sleep(0.1)
+        assert await cache.get_or_load('pseudo_balance:1', load) == 2
+        await cache.invalidate('pseudo_balance:1')
+        assert await cache.get_or_load('pseudo_balance:1', load) == 3
+        assert cache.snapshot()['pseudo_balance']['invalidations'] == 1
+
+    asyncio.run(check())
+
+
+def test_etag_depends_on_content_not_key_order():
+    assert etag_for({'a': 1, 'b': 2}) == etag_for({'b': 2, 'a': 1})
+    assert etag_for([{'id': 1, 'price': 10}]) != etag_for([{'id': 1, 'price': 11}])
+    assert etag_for([]).startswith('"') and etag_for([]).endswith('"')
+
+
+def test_catalogue_answers_304_until_it_is_invalidated(monkeypatch):
+    rows = [{'id': 1, 'product_name': 'rice', 'price': 10}, {'id': 2, 'product_name': 'dal', 'price': 12}]
+    supabase = FakeSupabase(rows)
+    monkeypatch.setattr(main.db, 'supabase', supabase)
+    monkeypatch.setattr(main, 'cache', Cache())
+
+    async def check():
+        response = await main.get_all_sellers_product(request())
+        etag = response.headers['etag']
+        assert response.status_code == 200 and etag == etag_for(rows)
+
+        response = await main.get_all_sellers_product(request({'If-None-Match': etag}))
+        assert response.status_code == 304 and response.headers['etag'] == etag
+        assert response.body == b''
+        assert len(supabase.reads) == 1
+
+        rows[0]['price'] = 9
+        await main.invalidate_catalogue()
+        response = await main.get_all_sellers_product(request({'If-None-Match': etag}))
+        assert response.status_code == 200
+        assert response.headers['etag'] == etag_for(rows) != etag
+        assert len(supabase.reads) == 2
+
+    asyncio.run(check())
@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from web3.exceptions import TransactionNotFound
+
+import deploy_queue
+from deploy_queue import DeployQueue, NonceAllocator
+
+DEPLOYER = '0x00000000000000000000000000000000000000d0'
+
+
+class FakeEth:
+    # One account's view of a chain: a mempool keyed by nonce, mined in nonce
+    # order whenever a receipt is polled. Nonces in drop lose their first broadcast.
+
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.mempool = {}
+        self.transactions = {}
+        self.receipts = {}
+        self.mined_nonce = 0
+        self.sent = []
+        self.count_reads = 0
+
+    @property
+    async def gas_price(self):
+        return 10
+
+    def pending_nonce(self):
+        nonce = self.mined_nonce
+        while nonce in self.mempool:
+            nonce += 1
+        return nonce
+
+    async def get_transaction_count(self, address, block):
+        self.count_reads += 1
+        return self.pending_nonce() if block == 'pending' else self.mined_nonce
+
+    async def send_raw_transaction(self, transaction):
+        tx_hash = tx_hash_of(transaction)
+        nonce = transaction['nonce']
+        if nonce < self.mined_nonce:
+            raise ValueError('nonce too low')
+        current = self.mempool.get(nonce)
+        if current is not None and current['maxFeePerGas'] >= transaction['maxFeePerGas']:
+            raise ValueError('replacement transaction underpriced')
+        self.sent.append(transaction)
+        if nonce in self.drop:
+            self.drop.discard(nonce)
+            return tx_hash
+        self.mempool[nonce] = transaction
+        self.transactions[tx_hash] = transaction
+        return tx_hash
+
+    def mine(self):
+        while self.mined_nonce in self.mempool:
+            transaction = self.mempool.pop(self.mined_nonce)
+            tx_hash = tx_hash_of(transaction)
+            self.receipts[tx_hash] = SimpleNamespace(
+                status=1, contractAddress='0x' + tx_hash.hex()[:40] if 'data' in transaction else None,
+            )
+            self.mined_nonce += 1
+
+    async def get_transaction_receipt(self, tx_hash):
+        self.mine()
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(f'{tx_hash.hex()} not found')
+        return self.receipts[tx_hash]
+
+    async def get_transaction(self, tx_hash):
+        if tx_hash not in self.transactions:
+            raise TransactionNotFound(f'{tx_hash.hex()} not found')
+        return self.transactions[tx_hash]
+
+
+def tx_hash_of(transaction):
+    return hashlib.sha256(repr(sorted(transaction.items())).encode()).digest()
+
+
+def fake_client(eth):
+    account = SimpleNamespace(
+        address=DEPLOYER,
+        sign_transaction=lambda transaction: SimpleNamespace(raw_transaction=transaction, hash=tx_hash_of(transaction)),
+    )
+    return SimpleNamespace(w3=SimpleNamespace(eth=eth), account=account, chain_id=1)
+
+
+async def build_transaction(buyer_address, seller_address, nonce):
+    return {'from': DEPLOYER, 'nonce': nonce, 'data': f'{buyer_address}:{seller_address}', 'maxFeePerGas': 1}
+
+
+def test_nonce_allocator_reads_the_node_once_for_concurrent_callers():
+    async def check():
+        eth = FakeEth()
+        eth.mempool = {0: {}, 1: {}}
+        nonces = NonceAllocator(SimpleNamespace(eth=eth), DEPLOYER)
+        allocated = await asyncio.gather(*(nonces.allocate() for _ in range(20)))
+        assert sorted(allocated) == list(range(2, 22))
+        assert eth.count_reads == 1
+
+    asyncio.run(check())
+
+
+def test_nonce_allocator_resync_rereads_the_pending_count():
+    async def check():
+        eth = FakeEth()
+        nonces = NonceAllocator(SimpleNamespace(eth=eth), DEPLOYER)
+        assert [await nonces.allocate() for _ in range(3)] == [0, 1, 2]
+        # Only nonce 0 reached the node
+        eth.mempool = {0: {}}
+        await nonces.resync()
+        assert await nonces.allocate() == 1
+        assert eth.count_reads == 2
+
+    asyncio.run(check())
+
+
+def test_deploys_are_signed_before_broadcast_and_reported():
+    async def check():
+        eth = FakeEth()
+        signed, deployed = [], []
+
+        async def on_signed(order_id, tx_hash):
+            # The hash is recorded before the node has seen the transaction
+            assert not any(tx_hash == '0x' + tx_hash_of(transaction).hex() for transaction in eth.sent)
+            signed.append(order_id)
+
+        async def on_deployed(order_id, address):
+            deployed.append((order_id, address))
+
+        queue = DeployQueue(fake_client(eth), build_transaction, on_deployed, on_signed=on_signed, poll_interval=0.01).start()
+        try:
+            futures = [queue.submit(order_id, f'buyer{order_id}', f'seller{order_id}') for order_id in range(5)]
+            addresses = await asyncio.wait_for(asyncio.gather(*futures), 5)
+        finally:
+            await queue.stop()
+        assert [transaction['nonce'] for transaction in eth.sent] == list(range(5))
+        assert signed == list(range(5))
+        assert sorted(deployed) == list(enumerate(addresses))
+        assert eth.count_reads == 1
+
+    asyncio.run(check())
+
+
+def test_failed_broadcast_releases_its_nonce():
+    async def check():
+        eth = FakeEth()
+
+        async def build(buyer_address, seller_address, nonce):
+            if buyer_address == 'broken':
+                raise ValueError('gas estimation failed')
+            return await build_transaction(buyer_address, seller_address, nonce)
+
+        queue = DeployQueue(fake_client(eth), build, poll_interval=0.01).start()
+        try:
+            with pytest.raises(ValueError):
+                await asyncio.wait_for(queue.submit(1, 'broken', 'seller1'), 5)
+            assert await asyncio.wait_for(queue.submit(2, 'buyer2', 'seller2'), 5)
+        finally:
+            await queue.stop()
+        assert [transaction['nonce'] for transaction in eth.sent] == [0]
+        assert eth.mined_nonce == 1
+
+    asyncio.run(check())
+
+
+def test_resume_waits_for_a_deploy_sent_before_a_restart():
+    async def check():
+        eth = FakeEth()
+        client = fake_client(eth)
+        transaction = await build_transaction('buyer1', 'seller1', 0)
+        tx_hash = await eth.send_raw_transaction(transaction)
+        queue = DeployQueue(client, build_transaction, poll_interval=0.01).start()
+        try:
+            assert await queue.resume(2, '0x' + '11' * 32) is None
+            future = await queue.resume(1, '0x' + tx_hash.hex())
+            assert await asyncio.wait_for(future, 5) == '0x' + tx_hash.hex()[:40]
+        finally:
+            await queue.stop()
+
+    asyncio.run(check())
+
+
+def test_dropped_deploy_does_not_block_later_ones(monkeypatch):
+    monkeypatch.setattr(deploy_queue, 'RECEIPT_TIMEOUT', 0.2)
+
+    async def check():
+        eth = FakeEth(drop={0})
+        queue = DeployQueue(fake_client(eth), build_transaction, poll_interval=0.01).start()
+        try:
+            lost = queue.submit(1, 'buyer1', 'seller1')
+            await asyncio.sleep(0.1)
+            behind_gap = queue.submit(2, 'buyer2', 'seller2')
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(lost, 5)
+            # The lost nonce was filled by a self transaction, so the deploy
+            # waiting behind it is mined, and so is the next one
+            assert await asyncio.wait_for(behind_gap, 5)
+            assert await asyncio.wait_for(queue.submit(3, 'buyer3', 'seller3'), 5)
+            cancels = [transaction for transaction in eth.sent if 'data' not in transaction]
+            assert [(transaction['nonce'], transaction['to']) for transaction in cancels] == [(0, DEPLOYER)]
+            assert eth.mined_nonce == 3
+        finally:
+            await queue.stop()
+
+    asyncio.run(check())
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import jobs
+
+
+def run(fn):
+    async def main():
+        store = jobs.SQLiteJobStore(':memory:')
+        try:
+            await fn(store)
+        finally:
+            store.connection.close()
+    asyncio.run(main())
+
+
+def test_enqueue_is_idempotent_on_key():
+    async def check(store):
+        first = await store.enqueue('deploy', 'deploy:1', {'order_id': 1}, order_id=1)
+        second = await store.enqueue('deploy', 'deploy:1', {'order_id': 2}, order_id=1)
+        assert second['id'] == first['id']
+        assert second['payload'] == {'order_id': 1}
+        assert [job['key'] for job in await store.for_order(1)] == ['deploy:1']
+    run(check)
+
+
+def test_claim_and_complete():
+    async def check(store):
+        await store.enqueue('merkle', 'merkle:1', {'order_id': 1})
+        [job] = await store.claim('w1', 10, 60)
+        assert job['status'] == 'running' and job['attempts'] == 1 and job['locked_by'] == 'w1'
+        assert await store.claim('w2', 10, 60) == []
+        assert not await store.complete(job['id'], 'w2', {'merkle_root': 'x'})
+        assert await store.complete(job['id'], 'w1', {'merkle_root': 'ab'})
+        done = await store.get('merkle:1')
+        assert done['status'] == 'done' and done['result'] == {'merkle_root': 'ab'}
+        assert await store.claim('w1', 10, 60) == []
+    run(check)
+
+
+def test_fail_retries_later_or_gives_up():
+    async def check(store):
+        await store.enqueue('scan', 'scan')
+        [job] = await store.claim('w1', 10, 60)
+        assert await store.fail(job['id'], 'w1', 'RuntimeError: boom', retry_in=60)
+        retrying = await store.get('scan')
+        assert retrying['status'] == 'pending' and retrying['run_at'] > time.time() + 30
+        assert retrying['last_error'] == 'RuntimeError: boom'
+        assert await store.claim('w1', 10, 60) == []
+
+        await store.enqueue('anchor', 'anchor')
+        [job] = await store.claim('w1', 10, 60)
+        assert await store.fail(job['id'], 'w1', 'LookupError: no handler')
+        assert (await store.get('anchor'))['status'] == 'failed'
+    run(check)
+
+
+def test_expired_lease_is_reclaimed():
+    async def check(store):
+        await store.enqueue('deploy', 'deploy:1', {'order_id': 1})
+        [job] = await store.claim('w1', 10, -1)
+        [reclaimed] = await store.claim('w2', 10, 60)
+        assert reclaimed['id'] == job['id'] and reclaimed['locked_by'] == 'w2' and reclaimed['attempts'] == 2
+        # The first worker lost its lease, so its late result is ignored
+        assert not await store.complete(job['id'], 'w1', None)
+        assert await store.complete(job['id'], 'w2', None)
+    run(check)
+
+
+def test_rerun_of_finished_job_queues_it_again():
+    async def check(store):
+        await store.enqueue('scan', 'scan')
+        [job] = await store.claim('w1', 10, 60)
+        await store.complete(job['id'], 'w1', {'indexed': 3})
+        rerun = await store.enqueue('scan', 'scan', rerun=True)
+        assert rerun['status'] == 'pending' and rerun['attempts'] == 0 and rerun['result'] is None
+        assert [job['id'] for job in await store.claim('w1', 10, 60)] == [job['id']]
+    run(check)
+
+
+def test_rerun_of_running_job_waits_for_that_run():
+    async def check(store):
+        await store.enqueue('merkle', 'merkle:1', {'order_id': 1, 'version': 1})
+        [job] = await store.claim('w1', 10, 60)
+        requested = await store.enqueue('merkle', 'merkle:1', {'order_id': 1, 'version': 2}, rerun=True)
+        assert requested['status'] == 'running' and requested['rerun_requested']
+        # Never handed to a second worker while the first run is going
+        assert await store.claim('w2', 10, 60) == []
+        assert await store.complete(job['id'], 'w1', {'merkle_root': 'ab'})
+        assert (await store.get('merkle:1'))['status'] == 'pending'
+        [again] = await store.claim('w2', 10, 60)
+        assert again['payload'] == {'order_id': 1, 'version': 2} and again['attempts'] == 1
+        assert not again['rerun_requested']
+    run(check)
+
+
+def test_rerun_requested_survives_a_failed_run():
+    async def check(store):
+        await store.enqueue('anchor', 'anchor')
+        [job] = await store.claim('w1', 10, 60)
+        await store.enqueue('anchor', 'anchor', rerun=True)
+        assert await store.fail(job['id'], 'w1', 'RuntimeError: boom')
+        assert [job['id'] for job in await store.claim('w1', 10, 60)] == [job['id']]
+    run(check)
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from merkle import (
+    ORDER_FIELDS, MerkleStore, MerkleTree, build_merkle_roots, build_merkle_tree, legacy_build_merkle_tree,
+    order_leaves, verify_proof,
+)
+
+
+def order(order_id: int, **changes):
+    values = {
+        'id': order_id, 'buyer_id': 1, 'seller_id': 2, 'item_id': 3, 'quantity': 4, 'cost': 40.0,
+        'accepted': False, 'delivered': False, 'paid': False,
+    }
+    return {**values, **changes}
+
+
+@pytest.mark.parametrize('width', range(1, 10))
+def test_tree_root_matches_the_bulk_and_single_builders(width):
+    leaves = [f'leaf{i}' for i in range(width)]
+    root = MerkleTree(leaves).root_hex
+    assert root == build_merkle_tree(leaves)
+    assert build_merkle_roots([leaves, leaves[::-1]]) == [root, build_merkle_tree(leaves[::-1])]
+
+
+def test_empty_tree_has_an_empty_root():
+    assert MerkleTree([]).root_hex == build_merkle_tree([]) == ''
+    assert build_merkle_roots([[]]) == ['']
+
+
+@pytest.mark.parametrize('width', [1, 2, 5, 9])
+def test_every_leaf_proves_against_the_root(width):
+    tree = MerkleTree([f'leaf{i}' for i in range(width)])
+    for index, leaf in enumerate(tree.leaves):
+        proof = tree.proof(index)
+        assert verify_proof(leaf, proof, tree.root_hex)
+        assert not verify_proof(leaf + 'x', proof, tree.root_hex)
+
+
+def test_set_leaves_rehashes_only_changed_leaves():
+    tree = MerkleTree(order_leaves(order(1)))
+    assert tree.set_leaves(order_leaves(order(1, accepted=True, paid=True))) == 2
+    assert tree.root_hex == MerkleTree(order_leaves(order(1, accepted=True, paid=True))).root_hex
+    assert tree.set_leaves(order_leaves(order(1, accepted=True, paid=True))) == 0
+
+
+def test_store_reuses_trees_and_evicts_the_least_recent():
+    store = MerkleStore(max_size=2)
+    first = store.tree(1, order_leaves(order(1)))
+    store.tree(2, order_leaves(order(2)))
+    assert store.tree(1, order_leaves(order(1, paid=True))) is first
+    assert first.root_hex == build_merkle_tree(order_leaves(order(1, paid=True)))
+    store.tree(3, order_leaves(order(3)))
+    assert list(store._trees) == [1, 3]
+
+
+def test_discard_drops_a_cached_tree():
+    store = MerkleStore()
+    first = store.tree(1, order_leaves(order(1)))
+    store.discard(1)
+    store.discard(1)
+    assert store.tree(1, order_leaves(order(1))) is not first
+
+
+def test_legacy_roots_differ_from_binary_roots():
+    leaves = order_leaves(order(1))
+    assert len(leaves) == len(ORDER_FIELDS)
+    assert legacy_build_merkle_tree(leaves) != build_merkle_tree(leaves)
+    assert legacy_build_merkle_tree(['a']) == build_merkle_tree(['a'])
+
+
+def test_malformed_proofs_are_a_bad_request():
+    tree = MerkleTree(order_leaves(order(1)))
+    proof = tree.proof(0)
+    check = main.MerkleProofCheck(leaf=tree.leaves[0], proof=proof, root=tree.root_hex)
+    assert asyncio.run(main.verify_merkle_proof(check)) == {'valid': True}
+    for bad_proof in ([('zz', 'left')] + proof[1:], [(proof[0][0], 'up')] + proof[1:]):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(main.verify_merkle_proof(main.MerkleProofCheck(leaf=tree.leaves[0], proof=bad_proof, root=tree.root_hex)))
+        assert error.value.status_code == 400
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import pagination
+from pagination import NDJSON, paginated_response, projection
+
+COLUMNS = {'id', 'seller_id', 'price'}
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class Query:
+    # The select/order/gt/limit chain pagination builds, over a list of rows
+    def __init__(self, rows, reads, columns):
+        self.rows = rows
+        self.reads = reads
+        self.columns = columns.split(',')
+        self.order_by = None
+        self.after = None
+        self.count = None
+
+    def order(self, column):
+        self.order_by = column
+        return self
+
+    def gt(self, column, value):
+        self.after = value
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def execute(self):
+        assert self.order_by == 'id'
+        self.reads.append((self.after, self.count))
+        rows = [row for row in self.rows if self.after is None or row['id'] > self.after]
+        if self.columns == ['*']:
+            return Result(rows[:self.count])
+        return Result([{column: row[column] for column in self.columns} for row in rows[:self.count]])
+
+
+def table(count):
+    rows = [{'id': i, 'seller_id': i % 3, 'price': i * 10} for i in range(1, count + 1)]
+    reads = []
+    return rows, reads, lambda columns: Query(rows, reads, columns)
+
+
+def request(accept='application/json'):
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'', 'headers': [(b'accept', accept.encode())]})
+
+
+def respond(build_query, fields=None, cursor=None, limit=None, accept='application/json'):
+    return asyncio.run(paginated_response(request(accept), build_query, fields, COLUMNS, cursor, limit))
+
+
+def test_projection_keeps_the_cursor_column():
+    assert projection('price,seller_id', COLUMNS) == 'id,price,seller_id'
+    assert projection(None, COLUMNS, default='id,price') == 'id,price'
+    with pytest.raises(ValueError, match='password'):
+        projection('id,password', COLUMNS)
+
+
+def test_projection_maps_names_to_select_expressions():
+    allowed = {'id': 'id', 'seller_name': '...users(seller_name:name)'}
+    assert projection('seller_name', allowed) == 'id,...users(seller_name:name)'
+
+
+def test_unknown_fields_are_a_bad_request():
+    rows, reads, build_query = table(3)
+    with pytest.raises(HTTPException) as error:
+        respond(build_query, fields='price,password')
+    assert error.value.status_code == 400
+    assert 'password' in error.value.detail
+    assert reads == []
+
+
+def test_without_cursor_or_limit_every_row_is_returned():
+    rows, reads, build_query = table(pagination.MAX_PAGE_SIZE * 2 + 5)
+    response = respond(build_query)
+    assert json.loads(response.body) == rows
+    assert 'x-next-cursor' not in response.headers
+    assert len(reads) == 3
+
+
+def test_limit_returns_one_page_and_the_next_cursor():
+    rows, reads, build_query = table(25)
+    response = respond(build_query, fields='price', limit=10)
+    assert json.loads(response.body) == [{'id': i, 'price': i * 10} for i in range(1, 11)]
+    assert response.headers['x-next-cursor'] == '10'
+
+    response = respond(build_query, cursor=20, limit=10)
+    assert [row['id'] for row in json.loads(response.body)] == list(range(21, 26))
+    assert 'x-next-cursor' not in response.headers
+
+
+def test_limit_is_capped_at_the_max_page_size():
+    rows, reads, build_query = table(pagination.MAX_PAGE_SIZE + 1)
+    response = respond(build_query, limit=pagination.MAX_PAGE_SIZE * 10)
+    assert len(json.loads(response.body)) == pagination.MAX_PAGE_SIZE
+    assert reads == [(None, pagination.MAX_PAGE_SIZE)]
+
+
+def test_ndjson_streams_every_row_after_the_cursor():
+    rows, reads, build_query = table(pagination.MAX_PAGE_SIZE + 20)
+    response = respond(build_query, fields='price', cursor=10, accept=NDJSON)
+    assert response.media_type == NDJSON
+    # Nothing is read until the body is consumed
+    assert reads == []
+
+    async def body():
+        return ''.join([chunk async for chunk in response.body_iterator])
+
+    lines = asyncio.run(body()).splitlines()
+    assert [json.loads(line) for line in lines] == [{'id': row['id'], 'price': row['price']} for row in rows[10:]]
+    assert [after for after, _ in reads] == [10, 10 + pagination.MAX_PAGE_SIZE]
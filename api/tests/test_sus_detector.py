@@ -0,0 +1,235 @@
+import asyncio
+import functools
+
+import httpx
+import pytest
+
+import sus_detector
+
+CONTRACT = '0x00000000000000000000000000000000000000c0'
+BUYER = '0x00000000000000000000000000000000000000b1'
+SELLER = '0x00000000000000000000000000000000000000a5'
+ARBITER = '0x00000000000000000000000000000000000000ab'
+STRANGER = '0x0000000000000000000000000000000000000bad'
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.rows = None
+        self.order_by = None
+        self.after = None
+        self.count = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column):
+        self.order_by = column
+        return self
+
+    def gt(self, column, value):
+        self.after = (column, value)
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def upsert(self, rows, ignore_duplicates=False):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    async def execute(self):
+        key = self.db.keys[self.table]
+        table = self.db.tables.setdefault(self.table, {})
+        if self.rows is not None:
+            for row in self.rows:
+                if not (self.ignore_duplicates and row[key] in table):
+                    table[row[key]] = row
+            return Result(self.rows)
+        rows = [row for row in table.values() if all(row[column] == value for column, value in self.filters)]
+        if self.after is not None:
+            rows = [row for row in rows if row[self.after[0]] > self.after[1]]
+        if self.order_by is not None:
+            rows.sort(key=lambda row: row[self.order_by])
+        self.db.reads += 1
+        return Result(rows[:self.count])
+
+
+class FakeSupabase:
+    # The slice of the PostgREST builder sus_detector uses, over dicts keyed by primary key
+    keys = {'scanned_contracts': 'contract_address', 'indexed_transactions': 'hash'}
+
+    def __init__(self):
+        self.tables = {}
+        self.reads = 0
+
+    def table(self, name):
+        return Query(self, name)
+
+
+def transaction(block: int, sender: str = BUYER, to: str = CONTRACT, index: int = 0):
+    return {
+        'hash': f'0x{block:060x}{index:04x}', 'blockNumber': str(block), 'from': sender, 'to': to,
+        'value': str(10 ** 18), 'timeStamp': str(1700000000 + block),
+    }
+
+
+def explorer_for(handler):
+    explorer = sus_detector.ExplorerClient('https://explorer.test/api', 'test')
+    explorer.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return explorer
+
+
+def txlist_explorer(transactions, requests):
+    # Serves txlist like the real explorer, including its page * offset limit
+    def handler(request):
+        params = request.url.params
+        page, offset, start = int(params['page']), int(params['offset']), int(params['startblock'])
+        requests.append((start, page))
+        if page * offset > sus_detector.TXLIST_WINDOW:
+            return httpx.Response(200, json={'status': '0', 'message': 'NOTOK', 'result': 'Result window is too large'})
+        matching = [tx for tx in transactions if int(tx['blockNumber']) >= start]
+        result = matching[(page - 1) * offset:page * offset]
+        if not result:
+            return httpx.Response(200, json={'status': '0', 'message': 'No transactions found', 'result': []})
+        return httpx.Response(200, json={'status': '1', 'message': 'OK', 'result': result})
+    return explorer_for(handler)
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(sus_detector, 'TXLIST_PAGE_SIZE', 10)
+    monkeypatch.setattr(sus_detector, 'TXLIST_WINDOW', 30)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    recorded = []
+
+    async def sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(sus_detector.asyncio, 'sleep', sleep)
+    return recorded
+
+
+def test_scan_contract_pages_until_a_short_page(small_pages):
+    transactions = [transaction(block) for block in range(1, 26)]
+    requests = []
+    supabase = FakeSupabase()
+    fetched = asyncio.run(sus_detector.scan_contract(supabase, txlist_explorer(transactions, requests), CONTRACT))
+    assert fetched == 25
+    assert requests == [(0, 1), (0, 2), (0, 3)]
+    assert len(supabase.tables['indexed_transactions']) == 25
+    assert supabase.tables['scanned_contracts'][CONTRACT]['last_block'] == 25
+
+
+def test_scan_contract_restarts_full_windows_from_the_last_block(small_pages):
+    # Two transactions per block, so every window boundary falls inside a block
+    transactions = [transaction(block, index=i) for block in range(1, 41) for i in range(2)]
+    requests = []
+    supabase = FakeSupabase()
+    asyncio.run(sus_detector.scan_contract(supabase, txlist_explorer(transactions, requests), CONTRACT))
+    assert all(page * 10 <= 30 for _, page in requests)
+    assert [start for start, page in requests if page == 1] == [0, 15, 29]
+    assert set(supabase.tables['indexed_transactions']) == {tx['hash'] for tx in transactions}
+    assert supabase.tables['scanned_contracts'][CONTRACT]['last_block'] == 40
+
+
+def test_scan_contract_resumes_from_the_checkpoint(small_pages):
+    transactions = [transaction(block) for block in range(1, 6)]
+    requests = []
+    supabase = FakeSupabase()
+    asyncio.run(sus_detector.scan_contract(supabase, txlist_explorer(transactions, requests), CONTRACT))
+    transactions.append(transaction(6))
+    requests.clear()
+    fetched = asyncio.run(sus_detector.scan_contract(supabase, txlist_explorer(transactions, requests), CONTRACT))
+    assert requests == [(5, 1)]
+    assert fetched == 2
+    assert len(supabase.tables['indexed_transactions']) == 6
+    assert supabase.tables['scanned_contracts'][CONTRACT]['last_block'] == 6
+
+
+def test_txlist_backs_off_on_rate_limits_and_server_errors(delays):
+    responses = [
+        httpx.Response(429),
+        httpx.Response(503),
+        httpx.Response(200, json={'status': '0', 'message': 'NOTOK', 'result': 'Max rate limit reached'}),
+        httpx.Response(200, json={'status': '1', 'message': 'OK', 'result': [transaction(1)]}),
+    ]
+    explorer = explorer_for(lambda request: responses.pop(0))
+    assert asyncio.run(explorer.txlist(CONTRACT, 0, 1)) == [transaction(1)]
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0.5 * 2 ** attempt <= delay < 0.5 * 2 ** attempt + 0.25
+
+
+def test_txlist_gives_up_after_max_retries(delays):
+    explorer = explorer_for(lambda request: httpx.Response(429))
+    with pytest.raises(RuntimeError, match='rate limited'):
+        asyncio.run(explorer.txlist(CONTRACT, 0, 1))
+    assert len(delays) == sus_detector.MAX_RETRIES
+
+
+def test_txlist_retries_transport_errors_then_raises(delays):
+    def handler(request):
+        raise httpx.ConnectError('connection refused', request=request)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(explorer_for(handler).txlist(CONTRACT, 0, 1))
+    assert len(delays) == sus_detector.MAX_RETRIES - 1
+
+
+def test_txlist_does_not_retry_explorer_errors(delays):
+    explorer = explorer_for(lambda request: httpx.Response(200, json={'status': '0', 'message': 'NOTOK', 'result': 'Invalid address format'}))
+    with pytest.raises(RuntimeError, match='Invalid address format'):
+        asyncio.run(explorer.txlist(CONTRACT, 0, 1))
+    assert delays == []
+
+
+def test_txlist_treats_no_transactions_as_empty(delays):
+    explorer = explorer_for(lambda request: httpx.Response(200, json={'status': '0', 'message': 'No transactions found', 'result': []}))
+    assert asyncio.run(explorer.txlist(CONTRACT, 0, 1)) == []
+
+
+def test_detect_sus_flags_only_transactions_with_an_unknown_party(monkeypatch):
+    monkeypatch.setattr(sus_detector, 'ARBITAR_ADRESS', ARBITER.upper().replace('0X', '0x'))
+    supabase = FakeSupabase()
+    rows = [
+        sus_detector.index_row(CONTRACT, transaction(1, BUYER, CONTRACT)),
+        sus_detector.index_row(CONTRACT, transaction(2, CONTRACT, SELLER)),
+        sus_detector.index_row(CONTRACT, transaction(3, ARBITER, CONTRACT)),
+        sus_detector.index_row(CONTRACT, {**transaction(4, SELLER), 'to': ''}),
+        sus_detector.index_row(CONTRACT, transaction(5, CONTRACT, STRANGER)),
+        sus_detector.index_row(CONTRACT, transaction(6, STRANGER, CONTRACT)),
+    ]
+    supabase.tables['indexed_transactions'] = {row['hash']: row for row in rows}
+    flagged = asyncio.run(sus_detector.detect_sus(supabase, CONTRACT.upper().replace('0X', '0x'), BUYER.upper(), SELLER))
+    assert [tx['Transaction Hash'] for tx in flagged] == [rows[4]['hash'], rows[5]['hash']]
+    assert flagged[0]['Value'] == 1
+
+
+def test_detect_sus_reads_every_page_in_block_order(monkeypatch):
+    monkeypatch.setattr(sus_detector, 'ARBITAR_ADRESS', ARBITER)
+    monkeypatch.setattr(sus_detector, 'iter_pages', functools.partial(sus_detector.iter_pages, size=10))
+    supabase = FakeSupabase()
+    # Hashes run opposite to blocks, so page order is not block order
+    rows = [sus_detector.index_row(CONTRACT, {**transaction(block, STRANGER), 'hash': f'0x{100 - block:064x}'}) for block in range(1, 26)]
+    supabase.tables['indexed_transactions'] = {row['hash']: row for row in rows}
+    flagged = asyncio.run(sus_detector.detect_sus(supabase, CONTRACT, BUYER, SELLER))
+    assert [tx['Transaction Hash'] for tx in flagged] == [row['hash'] for row in rows]
+    assert supabase.reads == 3
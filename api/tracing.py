@@ -0,0 +1,159 @@
+import bisect
+import cProfile
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+SLOW_SPAN_MS = float(os.getenv('SLOW_SPAN_MS', '500'))
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '2000'))
+# Comma separated route templates to profile, e.g. '/accept_order,/login'
+PROFILE_ROUTES = {route for route in os.getenv('PROFILE_ROUTES', '').split(',') if route}
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.01'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.profiles'))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+logger = logging.getLogger(__name__)
+
+# Spans of the request being served: [(kind, name, seconds, error)]
+current_spans: ContextVar[list] = ContextVar('current_spans', default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+# metric name -> label tuple -> Histogram
+histograms = defaultdict(lambda: defaultdict(Histogram))
+errors = defaultdict(int)
+HISTOGRAM_LABELS = {
+    'http_request_duration_seconds': ('route', 'method', 'status'),
+    'span_duration_seconds': ('kind', 'name'),
+}
+
+
+def record_span(kind: str, name: str, seconds: float, error: bool = False):
+    histograms['span_duration_seconds'][(kind, name)].observe(seconds)
+    if error:
+        errors[(kind, name)] += 1
+    spans = current_spans.get()
+    if spans is not None:
+        spans.append((kind, name, seconds, error))
+    if seconds * 1000 >= SLOW_SPAN_MS:
+        logger.warning('Slow %s call %s took %.1f ms', kind, name, seconds * 1000)
+
+
+@contextmanager
+def span(kind: str, name: str):
+    start = time.perf_counter()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        record_span(kind, name, time.perf_counter() - start, error)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    # Wraps an httpx transport so every outgoing call becomes a span
+
+    def __init__(self, kind: str, transport: httpx.AsyncBaseTransport = None, name=None, **transport_options):
+        self.kind = kind
+        self.transport = transport or httpx.AsyncHTTPTransport(**transport_options)
+        self.name = name or (lambda request: f'{request.method} {request.url.path}')
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        error = True
+        try:
+            response = await self.transport.handle_async_request(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            record_span(self.kind, self.name(request), time.perf_counter() - start, error)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def route_name(request):
+    route = request.scope.get('route')
+    return getattr(route, 'path', 'unmatched')
+
+
+async def trace_requests(request, call_next):
+    spans = []
+    token = current_spans.set(spans)
+    profiler = None
+    if PROFILE_ROUTES and request.url.path in PROFILE_ROUTES and random.random() < PROFILE_SAMPLE_RATE:
+        # Profiles the whole event loop thread while this request runs, so
+        # concurrent requests show up too; sample on a quiet instance
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        current_spans.reset(token)
+        route = route_name(request)
+        histograms['http_request_duration_seconds'][(route, request.method, str(status))].observe(elapsed)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{route.strip('/').replace('/', '_') or 'root'}-{int(time.time() * 1000)}.prof"))
+        if elapsed * 1000 >= SLOW_REQUEST_MS:
+            breakdown = ', '.join(f'{kind}:{name} {seconds * 1000:.0f}ms' for kind, name, seconds, _ in spans)
+            logger.warning('Slow request %s %s took %.1f ms [%s]', request.method, route, elapsed * 1000, breakdown)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def render_prometheus():
+    lines = []
+    for metric, series in sorted(histograms.items()):
+        names = HISTOGRAM_LABELS[metric]
+        lines.append(f'# TYPE {metric} histogram')
+        for values, histogram in sorted(series.items()):
+            labels = _labels(names, values)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {histogram.total}')
+            lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+    lines.append('# TYPE span_errors_total counter')
+    for (kind, name), count in sorted(errors.items()):
+        lines.append(f'span_errors_total{{{_labels(("kind", "name"), (kind, name))}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def render_counters(metric: str, label: str, values: dict):
+    # {'catalogue': {'hits': 3, 'misses': 1}} -> metric_hits{label="catalogue"} 3 ...
+    lines = []
+    for key, counters in sorted(values.items()):
+        for counter, value in counters.items():
+            lines.append(f'{metric}_{counter}{{{label}="{_escape(key)}"}} {value}')
+    return '\n'.join(lines) + '\n' if lines else ''
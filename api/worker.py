@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import signal
+
+from dotenv import load_dotenv
+
+import anchor
+import balances
+import chain_client
+import db
+import event_indexer
+import jobs
+import order_jobs
+import seller_stats
+import sus_detector
+from cache import create_cache
+from contract_artifact import load_contracts
+from deploy_contract import build_deploy_transaction, deployed_address
+from deploy_queue import start_queue, stop_queue
+
+# Background worker: runs queued jobs plus the periodic anchoring, scanning,
+# balance and indexing loops. The API starts it in-process by default; with
+# JOB_WORKER=external on the API, run it separately:
+#   python worker.py
+# It owns the deployer account's nonces, so run one per deployer key and scale
+# with JOB_CONCURRENCY instead.
+
+load_dotenv()
+
+
+def start_worker(client, app_cache, explorer: sus_detector.ExplorerClient):
+    queue = start_queue(
+        client, build_deploy_transaction, on_deployed=order_jobs.record_contract_address,
+        address_from_receipt=deployed_address, on_signed=order_jobs.record_deploy_tx,
+    )
+    order_jobs.configure(app_cache, explorer)
+    tasks = [jobs.Worker(jobs.get_store()).start()]
+    if anchor.ANCHOR_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(anchor.run_anchoring()))
+    if sus_detector.SCAN_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(sus_detector.run_scanner(db.supabase, explorer)))
+    if balances.BALANCE_RECOMPUTE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(balances.run_balance_recompute(db.supabase, app_cache)))
+    if event_indexer.INDEXER_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(event_indexer.run_indexer(db.supabase, client)))
+    if seller_stats.SELLER_STATS_REBUILD_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(seller_stats.run_stats_rebuild(db.supabase)))
+    return tasks
+
+
+async def main():
+    load_contracts()
+    await db.open_client()
+    client = await chain_client.open_client()
+    jobs.open_store(db.supabase)
+    explorer = sus_detector.ExplorerClient()
+    tasks = start_worker(client, create_cache(), explorer)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await explorer.close()
+        await stop_queue()
+        jobs.close_store()
+        await chain_client.close_client()
+        await db.close_client()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass